@@ -0,0 +1,209 @@
+"""
+Bulk Mailbox Phishing Scanner
+-----------------------------
+Headless companion to phishing_email_detection.py for triaging a whole report-phish inbox.
+Messages are streamed one at a time out of mbox files, Maildir folders or directories of .eml
+files, and scored by the local heuristic pre-filter. Only the ambiguous ones go on to the
+offline classifier (with --model) and/or to analyze_email(), several at a time. Model calls
+go through the shared on-disk verdict cache, which also merges concurrent lookups of the same
+body, so campaign duplicates are analyzed only once. Each verdict, with the seconds its
+message took, is appended to a JSONL file as soon as it arrives. Only a bounded window of
+messages is ever held in memory.
+
+Usage:
+    python batch_scan.py reported.mbox Maildir/ eml_folder/ --out verdicts.jsonl --concurrency 8
+    python batch_scan.py reported.mbox --model phishing_model.npz            # no API calls
+    python batch_scan.py reported.mbox --model phishing_model.npz --explain  # classifier + LLM
+"""
+
+import argparse
+import json
+import mailbox
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from email import policy
+from email.parser import BytesParser
+
+from local_classifier import PhishingClassifier
+from phishing_email_detection import VERDICT_CACHE_PATH, analyze_email, triage_email
+from verdict_cache import VerdictCache
+
+import gateway_path  # noqa: F401
+from llm_gateway import RETRYABLE_ERRORS, metrics, retry_delay
+
+
+def iter_messages(path):
+    """
+    Yields (source, message) pairs from an mbox file, a Maildir folder, a single .eml file
+    or a directory tree of .eml files. Messages are parsed lazily, one at a time.
+    Args:
+        path (str): Path to the mailbox, folder or file.
+    """
+    if os.path.isdir(path):
+        if all(os.path.isdir(os.path.join(path, sub)) for sub in ("cur", "new", "tmp")):
+            box = mailbox.Maildir(path, factory=None, create=False)
+            for key in box.iterkeys():
+                with box.get_file(key) as fh:
+                    yield f"{path}#{key}", BytesParser(policy=policy.default).parse(fh)
+            return
+        for root, _, files in os.walk(path):
+            for name in sorted(files):
+                if name.lower().endswith(".eml"):
+                    yield from iter_messages(os.path.join(root, name))
+    elif path.lower().endswith(".eml"):
+        with open(path, "rb") as fh:
+            yield path, BytesParser(policy=policy.default).parse(fh)
+    else:
+        box = mailbox.mbox(path, create=False)
+        for index, key in enumerate(box.iterkeys()):
+            yield f"{path}#{index}", BytesParser(policy=policy.default).parsebytes(box.get_bytes(key))
+
+
+def extract_body(msg, preferencelist=("plain", "html")):
+    """
+    Returns the readable body of an email, by default preferring text/plain over text/html.
+    Args:
+        msg (email.message.EmailMessage): Parsed message.
+        preferencelist (tuple): Body subtypes to look for, in order of preference.
+    Returns:
+        str: The message body, or an empty string if none could be decoded.
+    """
+    part = msg.get_body(preferencelist=preferencelist)
+    if part is None:
+        return ""
+    try:
+        return part.get_content()
+    except (LookupError, UnicodeDecodeError):
+        return part.get_payload(decode=True).decode("utf-8", errors="replace")
+
+
+def analyze_with_backoff(email_body, max_retries=5, base_delay=1.0):
+    """
+    Calls analyze_email(), retrying rate-limit and transient server errors. This is the only
+    retry layer: the SDK's own retries are disabled for these calls.
+    Args:
+        email_body (str): The email body to analyze.
+        max_retries (int): Retries before the last error is raised.
+        base_delay (float): Initial backoff in seconds, doubled on every attempt.
+    Returns:
+        str: The model's analysis.
+    """
+    for attempt in range(max_retries + 1):
+        try:
+            return analyze_email(email_body, max_retries=0)
+        except RETRYABLE_ERRORS as e:
+            if attempt == max_retries:
+                raise
+            time.sleep(retry_delay(e, attempt, base_delay))
+
+
+def scan_message(source, msg, max_retries, prefilter=True, cache=None, classifier=None, explain=False):
+    """
+    Scores one message locally and, if the pre-filter is undecided (or disabled), asks the
+    offline classifier and/or the LLM.
+    Returns:
+        dict: The verdict record written to the JSONL output.
+    """
+    start = time.perf_counter()
+    record = {
+        "source": source,
+        "message_id": msg.get("Message-ID"),
+        "from": msg.get("From"),
+        "subject": msg.get("Subject"),
+    }
+    try:
+        # The HTML part keeps the hrefs behind link text, so the pre-filter prefers it
+        full_body = extract_body(msg, ("html", "plain"))
+        triage = triage_email(full_body, msg.get("From"), msg.get("Reply-To"))
+        record.update(verdict=triage["verdict"], score=triage["score"], reasons=triage["reasons"])
+        undecided = triage["verdict"] == "uncertain" or not prefilter
+        if undecided and classifier is not None:
+            probability = float(classifier.predict_proba([full_body])[0])
+            record["verdict"] = "phishing" if probability >= classifier.threshold else "legitimate"
+            record["probability"] = round(probability, 3)
+        if undecided and (classifier is None or explain):
+            body = extract_body(msg)
+            if cache is None:
+                record["analysis"] = analyze_with_backoff(body, max_retries=max_retries)
+            else:
+                record["analysis"] = cache.get_or_analyze(
+                    body, lambda text: analyze_with_backoff(text, max_retries=max_retries), msg.get("From")
+                )
+    except Exception as e:
+        record["error"] = str(e)
+    record["seconds"] = round(time.perf_counter() - start, 3)
+    return record
+
+
+def scan(sources, out_path, concurrency=8, max_retries=5, prefilter=True, cache=None, classifier=None,
+         explain=False):
+    """
+    Streams every message from the given sources through the pre-filter and analyze_email()
+    with at most `concurrency` messages in flight and appends each verdict to out_path as JSONL.
+    Verdicts are written in completion order; use the "source" field to match them up.
+    Args:
+        sources (list): Mailbox paths accepted by iter_messages().
+        out_path (str): JSONL file to append verdicts to.
+        concurrency (int): Maximum number of concurrent LLM calls.
+        max_retries (int): Retries per message for rate-limit and transient errors.
+        prefilter (bool): Decide clear-cut messages locally; if False every message goes to the model.
+        cache (VerdictCache): Optional verdict cache consulted before every model call.
+        classifier (PhishingClassifier): Optional offline classifier for messages the pre-filter can't decide.
+        explain (bool): With a classifier, still ask the LLM for an explanation of those messages.
+    Returns:
+        int: Number of messages scanned.
+    """
+    messages = (item for path in sources for item in iter_messages(path))
+    scanned = 0
+    with open(out_path, "a", encoding="utf-8") as out, ThreadPoolExecutor(max_workers=concurrency) as pool:
+        pending = set()
+        for source, msg in messages:
+            pending.add(pool.submit(scan_message, source, msg, max_retries, prefilter, cache, classifier, explain))
+            # Keep at most `concurrency` messages in memory at any time
+            if len(pending) >= concurrency:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                scanned += write_records(out, done)
+        scanned += write_records(out, pending)
+    return scanned
+
+
+def write_records(out, futures):
+    """Writes the verdicts of finished futures as JSON lines and returns how many were written."""
+    for future in futures:
+        out.write(json.dumps(future.result(), ensure_ascii=False) + "\n")
+    out.flush()
+    return len(futures)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Scan mbox/Maildir/.eml sources for phishing.")
+    parser.add_argument("sources", nargs="+", help="mbox files, Maildir folders, .eml files or folders of .eml files")
+    parser.add_argument("--out", default="verdicts.jsonl", help="JSONL file verdicts are appended to")
+    parser.add_argument("--concurrency", type=int, default=8, help="maximum concurrent LLM calls")
+    parser.add_argument("--max-retries", type=int, default=5, help="retries on rate-limit/transient errors")
+    parser.add_argument("--no-prefilter", action="store_true", help="send every message to the model")
+    parser.add_argument("--cache", default=VERDICT_CACHE_PATH, help="SQLite verdict cache file")
+    parser.add_argument("--no-cache", action="store_true", help="do not read or write the verdict cache")
+    parser.add_argument("--model", help="offline classifier artifact from local_classifier.py train")
+    parser.add_argument("--explain", action="store_true", help="with --model, also get LLM explanations")
+    args = parser.parse_args(argv)
+
+    cache = None if args.no_cache else VerdictCache(args.cache)
+    classifier = PhishingClassifier.load(args.model) if args.model else None
+    start = time.perf_counter()
+    count = scan(
+        args.sources, args.out, concurrency=args.concurrency,
+        max_retries=args.max_retries, prefilter=not args.no_prefilter, cache=cache,
+        classifier=classifier, explain=args.explain,
+    )
+    print(f"Scanned {count} messages in {time.perf_counter() - start:.1f}s -> {args.out}", file=sys.stderr)
+    if cache is not None:
+        print(f"Verdict cache: {cache.stats} (hit rate {cache.hit_rate():.0%})", file=sys.stderr)
+        cache.close()
+    print(f"LLM gateway: {metrics.summary()}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
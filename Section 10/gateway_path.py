@@ -0,0 +1,11 @@
+"""
+Puts the repository root on sys.path so this section's modules can import the shared LLM
+gateway (llm_gateway.py): `import gateway_path` before `import llm_gateway`.
+"""
+
+import os
+import sys
+
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+if REPO_ROOT not in sys.path:
+    sys.path.append(REPO_ROOT)
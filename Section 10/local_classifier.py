@@ -0,0 +1,238 @@
+"""
+Offline Phishing Classifier
+---------------------------
+A small locally trained model that sits beside the LLM in phishing_email_detection.py.
+Emails are turned into hashed word uni/bi-gram features (no vocabulary to store) and scored
+with a logistic regression written in plain NumPy, so thousands of emails per second can be
+scored on a CPU and the detector keeps working when the OpenAI API is slow or unavailable.
+The model artifact is a single compressed .npz file holding the weight vector.
+
+Training data is a directory with one sub-folder per label, e.g.:
+    data/phishing/*.eml|*.txt
+    data/legitimate/*.eml|*.txt
+
+Usage:
+    python local_classifier.py train data/ --out phishing_model.npz
+    python local_classifier.py score phishing_model.npz suspicious/ reported.mbox
+"""
+
+import argparse
+import os
+import re
+import sys
+import time
+import zlib
+
+import numpy as np
+
+DEFAULT_MODEL_PATH = "phishing_model.npz"
+N_FEATURES = 2 ** 18
+POSITIVE_LABELS = ("phishing", "spam", "malicious")
+NEGATIVE_LABELS = ("legitimate", "ham", "clean", "benign")
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9][a-z0-9'._-]*[a-z0-9]|[a-z0-9]|https?://\S+", re.IGNORECASE)
+
+
+def tokenize(text):
+    """Splits text into lowercase word unigrams and bigrams."""
+    words = TOKEN_PATTERN.findall(text.lower())
+    return words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+
+
+def hash_features(texts, n_features=N_FEATURES):
+    """
+    Turns a batch of texts into a CSR-style sparse matrix of L2-normalized hashed n-gram counts.
+    Args:
+        texts (list): Email bodies.
+        n_features (int): Size of the hashed feature space.
+    Returns:
+        tuple: (indptr, indices, data) NumPy arrays.
+    """
+    indptr, indices, data = [0], [], []
+    for text in texts:
+        buckets = np.fromiter(
+            (zlib.crc32(token.encode("utf-8")) % n_features for token in tokenize(text)), dtype=np.int64
+        )
+        cols, counts = np.unique(buckets, return_counts=True)
+        values = counts.astype(np.float32)
+        norm = np.linalg.norm(values)
+        indices.append(cols)
+        data.append(values / norm if norm else values)
+        indptr.append(indptr[-1] + len(cols))
+    return (
+        np.asarray(indptr, dtype=np.int64),
+        np.concatenate(indices) if indices else np.zeros(0, dtype=np.int64),
+        np.concatenate(data) if data else np.zeros(0, dtype=np.float32),
+    )
+
+
+def _decision(features, weights, bias):
+    indptr, indices, data = features
+    products = data * weights[indices]
+    # Per-row sums of a CSR matrix; empty rows contribute 0
+    sums = np.add.reduceat(np.append(products, 0.0), indptr[:-1]) if len(indptr) > 1 else np.zeros(0)
+    sums[indptr[:-1] == indptr[1:]] = 0.0
+    return sums + bias
+
+
+def _sigmoid(z):
+    return 1.0 / (1.0 + np.exp(-np.clip(z, -30, 30)))
+
+
+class PhishingClassifier:
+    """Hashed n-gram logistic regression phishing classifier."""
+
+    def __init__(self, weights=None, bias=0.0, threshold=0.5, n_features=N_FEATURES):
+        self.n_features = n_features
+        self.weights = np.zeros(n_features, dtype=np.float32) if weights is None else weights
+        self.bias = float(bias)
+        self.threshold = float(threshold)
+
+    def fit(self, texts, labels, epochs=200, learning_rate=0.5, l2=1e-6):
+        """
+        Trains the model with full-batch AdaGrad on the log loss.
+        Args:
+            texts (list): Email bodies.
+            labels (list): 1 for phishing, 0 for legitimate.
+            epochs (int): Passes over the training set.
+            learning_rate (float): AdaGrad step size.
+            l2 (float): L2 regularization strength.
+        Returns:
+            PhishingClassifier: self
+        """
+        features = hash_features(texts, self.n_features)
+        indptr, indices, data = features
+        y = np.asarray(labels, dtype=np.float64)
+        rows = np.repeat(np.arange(len(y)), np.diff(indptr))
+        weights = np.zeros(self.n_features)
+        grad_sq = np.full(self.n_features, 1e-8)
+        bias, bias_sq = 0.0, 1e-8
+        for _ in range(epochs):
+            error = _sigmoid(_decision(features, weights, bias)) - y
+            grad = np.bincount(indices, weights=data * error[rows], minlength=self.n_features) / len(y)
+            grad += l2 * weights
+            grad_sq += grad ** 2
+            weights -= learning_rate * grad / np.sqrt(grad_sq)
+            bias_grad = error.mean()
+            bias_sq += bias_grad ** 2
+            bias -= learning_rate * bias_grad / np.sqrt(bias_sq)
+        self.weights = weights.astype(np.float32)
+        self.bias = bias
+        return self
+
+    def predict_proba(self, texts):
+        """Returns the phishing probability for each text in a batch."""
+        return _sigmoid(_decision(hash_features(texts, self.n_features), self.weights, self.bias))
+
+    def predict(self, texts):
+        """Returns 1 (phishing) or 0 (legitimate) for each text in a batch."""
+        return (self.predict_proba(texts) >= self.threshold).astype(int)
+
+    def save(self, path=DEFAULT_MODEL_PATH):
+        np.savez_compressed(
+            path, weights=self.weights, bias=self.bias, threshold=self.threshold, n_features=self.n_features
+        )
+
+    @classmethod
+    def load(cls, path=DEFAULT_MODEL_PATH):
+        with np.load(path) as artifact:
+            return cls(
+                weights=artifact["weights"],
+                bias=float(artifact["bias"]),
+                threshold=float(artifact["threshold"]),
+                n_features=int(artifact["n_features"]),
+            )
+
+
+def load_labelled_dir(data_dir):
+    """
+    Reads a labelled training directory (one sub-folder per label, see module docstring).
+    Returns:
+        tuple: (texts, labels)
+    """
+    from batch_scan import extract_body, iter_messages
+
+    texts, labels = [], []
+    for label_dir in sorted(os.listdir(data_dir)):
+        name = label_dir.lower()
+        if name in POSITIVE_LABELS:
+            label = 1
+        elif name in NEGATIVE_LABELS:
+            label = 0
+        else:
+            continue
+        for root, _, files in os.walk(os.path.join(data_dir, label_dir)):
+            for file_name in sorted(files):
+                path = os.path.join(root, file_name)
+                if file_name.lower().endswith(".txt"):
+                    with open(path, encoding="utf-8", errors="replace") as fh:
+                        texts.append(fh.read())
+                    labels.append(label)
+                elif file_name.lower().endswith((".eml", ".mbox")):
+                    for _, msg in iter_messages(path):
+                        texts.append(extract_body(msg, ("html", "plain")))
+                        labels.append(label)
+    return texts, labels
+
+
+def train(data_dir, out_path=DEFAULT_MODEL_PATH, epochs=200, holdout=0.2, seed=0):
+    """Trains on a labelled directory, reports holdout accuracy and saves the model artifact."""
+    texts, labels = load_labelled_dir(data_dir)
+    if not texts or len(set(labels)) < 2:
+        raise ValueError(f"Need both phishing and legitimate examples under {data_dir}")
+    order = np.random.default_rng(seed).permutation(len(texts))
+    split = int(len(order) * (1 - holdout)) if holdout else len(order)
+    train_idx, test_idx = order[:split], order[split:]
+
+    start = time.perf_counter()
+    model = PhishingClassifier().fit([texts[i] for i in train_idx], [labels[i] for i in train_idx], epochs=epochs)
+    print(f"Trained on {len(train_idx)} emails in {time.perf_counter() - start:.1f}s", file=sys.stderr)
+    if len(test_idx):
+        predicted = model.predict([texts[i] for i in test_idx])
+        accuracy = float(np.mean(predicted == np.asarray([labels[i] for i in test_idx])))
+        print(f"Holdout accuracy on {len(test_idx)} emails: {accuracy:.1%}", file=sys.stderr)
+    model.save(out_path)
+    print(f"Saved model to {out_path} ({os.path.getsize(out_path) / 1024:.0f} KiB)", file=sys.stderr)
+    return model
+
+
+def score(model_path, sources, batch_size=1000):
+    """Scores every message in the given mailbox sources in batches and prints TSV lines."""
+    from batch_scan import extract_body, iter_messages
+
+    model = PhishingClassifier.load(model_path)
+    start, count = time.perf_counter(), 0
+    messages = (item for path in sources for item in iter_messages(path))
+    while True:
+        batch = [item for _, item in zip(range(batch_size), messages)]
+        if not batch:
+            break
+        probabilities = model.predict_proba([extract_body(msg, ("html", "plain")) for _, msg in batch])
+        for (source, _), probability in zip(batch, probabilities):
+            print(f"{source}\t{probability:.3f}\t{'phishing' if probability >= model.threshold else 'legitimate'}")
+        count += len(batch)
+    elapsed = time.perf_counter() - start
+    print(f"Scored {count} emails in {elapsed:.2f}s ({count / elapsed if elapsed else 0:.0f}/s)", file=sys.stderr)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Train or run the offline phishing classifier.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    train_parser = commands.add_parser("train", help="train a model from a labelled directory")
+    train_parser.add_argument("data_dir", help="directory with phishing/ and legitimate/ sub-folders")
+    train_parser.add_argument("--out", default=DEFAULT_MODEL_PATH, help="model artifact to write")
+    train_parser.add_argument("--epochs", type=int, default=200)
+    train_parser.add_argument("--holdout", type=float, default=0.2, help="fraction kept back for evaluation")
+    score_parser = commands.add_parser("score", help="score mbox/Maildir/.eml sources")
+    score_parser.add_argument("model", help="model artifact written by train")
+    score_parser.add_argument("sources", nargs="+")
+    args = parser.parse_args(argv)
+
+    if args.command == "train":
+        train(args.data_dir, args.out, epochs=args.epochs, holdout=args.holdout)
+    else:
+        score(args.model, args.sources)
+
+
+if __name__ == "__main__":
+    main()
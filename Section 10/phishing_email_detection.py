@@ -1,39 +1,322 @@
 # This program takes in an Email body and evaluates whether or not it be deemed a potential Phishing threat
+# Run the UI with: streamlit run phishing_email_detection.py
+# For whole mailboxes (mbox / Maildir / .eml folders) use the headless batch_scan.py instead.
 
+import functools
+import ipaddress
 import openai
+import os
 import re
+import time
+from email.utils import parseaddr
 from urllib.parse import urlparse
 import requests
 import streamlit as st
+from local_classifier import PhishingClassifier
+from url_reputation import DEFAULT_INDEX_DIR, ReputationIndex
+from verdict_cache import VerdictCache
+
+import gateway_path  # noqa: F401
+import llm_gateway
 
 # Set your OpenAI API key here
 openai.api_key = '<my API Key>'
 
+LLM_APP = "phishing-detection"
+
+# Analyses are cached on disk so repeated (or templated) campaign emails and Streamlit reruns are free
+VERDICT_CACHE_PATH = "verdict_cache.db"
+
+# Offline classifier trained with `python local_classifier.py train <data_dir>`; optional
+PHISHING_MODEL_PATH = "phishing_model.npz"
+
+# Block/allow/brand index built with `python url_reputation.py build ...`; optional
+URL_REPUTATION_PATH = DEFAULT_INDEX_DIR
+
+# ---------------------------------------------------------------------
+# Local heuristic pre-filter
+# Cheap features are scored before any model call. Only emails that land between the
+# two thresholds are considered ambiguous and sent on to analyze_email().
+
+URL_PATTERN = re.compile(r'\bhttps?://[^\s<>"\')\]]+', re.IGNORECASE)
+ANCHOR_PATTERN = re.compile(r'<a\s[^>]*href\s*=\s*["\']?([^"\'\s>]+)[^>]*>(.*?)</a>', re.IGNORECASE | re.DOTALL)
+DOMAIN_TEXT_PATTERN = re.compile(r'^(?:https?://)?((?:[a-z0-9-]+\.)+[a-z]{2,})(?:[/:?#].*)?$', re.IGNORECASE)
+TAG_PATTERN = re.compile(r'<[^>]+>')
+URGENCY_PATTERN = re.compile(
+    r'\b(urgent|immediately|within 24 hours|act now|final notice|suspended|locked|'
+    r'verify your (?:account|identity)|confirm your (?:account|password|identity)|'
+    r'unusual (?:activity|sign-in)|password (?:expires|expired)|update your (?:payment|billing)|'
+    r'click (?:here|below)|wire transfer|gift cards?)\b',
+    re.IGNORECASE,
+)
+
+# Points per signal; totals at or above PHISHING_THRESHOLD are phishing. Totals at or below
+# CLEAN_THRESHOLD are clean only with positive evidence: at least one link, all allowlisted.
+# A signal-free email without links (e.g. a wire-fraud request) is left to the model.
+FEATURE_WEIGHTS = {
+    "blocked_hosts": 6,
+    "lookalike_hosts": 4,
+    "ip_literal_hosts": 3,
+    "punycode_hosts": 3,
+    "link_text_mismatches": 4,
+    "sender_reply_to_mismatch": 2,
+    "urgency_terms": 1,
+    "many_urls": 1,
+}
+CLEAN_THRESHOLD = 0
+PHISHING_THRESHOLD = 6
+MAX_URGENCY_POINTS = 3
+MANY_URLS = 5
+
+
+def _host(url):
+    # urlparse needs a scheme to find the host
+    if "://" not in url:
+        url = "http://" + url
+    return (urlparse(url).hostname or "").lower()
+
+
+def _is_ip_literal(host):
+    try:
+        ipaddress.ip_address(host.strip("[]"))
+        return True
+    except ValueError:
+        return False
+
+
+def _domain(address):
+    return parseaddr(address or "")[1].rpartition("@")[2].lower()
+
+
+# The memory-mapped reputation index is opened once per process; None if it hasn't been built
+@functools.lru_cache(maxsize=None)
+def load_reputation_index(path=URL_REPUTATION_PATH):
+    if os.path.exists(os.path.join(path, "meta.json")):
+        return ReputationIndex.load(path)
+    return None
+
+
+def extract_urls(email_body):
+    """Returns the distinct URLs in an email body, including the targets of HTML links."""
+    urls = URL_PATTERN.findall(email_body)
+    urls += [href for href, _ in ANCHOR_PATTERN.findall(email_body) if "://" in href]
+    return list(dict.fromkeys(urls))
+
+
+def check_links(email_body, reputation=None):
+    """
+    Checks every link in an email body against the local reputation index.
+    Returns:
+        list: One url_reputation check result per distinct URL (empty if no index is available).
+    """
+    reputation = reputation or load_reputation_index()
+    if reputation is None:
+        return []
+    return [reputation.check_url(url) for url in extract_urls(email_body)]
+
+
+def extract_features(email_body, sender=None, reply_to=None, reputation=None, links=None):
+    """
+    Extracts cheap phishing indicators from an email body and its headers.
+    Args:
+        email_body (str): Plain-text or HTML email body.
+        sender (str): Optional From header.
+        reply_to (str): Optional Reply-To header.
+        reputation (ReputationIndex): Optional URL reputation index for the links.
+        links (list): check_links() results for the body, if already computed.
+    Returns:
+        dict: Feature counts used by score_features().
+    """
+    urls = extract_urls(email_body)
+    anchors = ANCHOR_PATTERN.findall(email_body)
+    hosts = {_host(url) for url in urls}
+    hosts.discard("")
+    if links is None:
+        links = check_links(email_body, reputation)
+    statuses = [result["status"] for result in links]
+
+    # A link whose visible text is itself a domain that differs from the real target
+    mismatches = 0
+    for href, text in anchors:
+        shown = DOMAIN_TEXT_PATTERN.match(TAG_PATTERN.sub("", text).strip())
+        if shown and "://" in href:
+            shown_host, target_host = shown.group(1).lower(), _host(href)
+            if target_host != shown_host and not target_host.endswith("." + shown_host):
+                mismatches += 1
+
+    sender_domain, reply_domain = _domain(sender), _domain(reply_to)
+    return {
+        "url_count": len(urls),
+        "blocked_hosts": statuses.count("blocked"),
+        "lookalike_hosts": statuses.count("lookalike"),
+        # Hosts not vouched for by the allowlist (all of them when no index is available)
+        "unvetted_urls": len(urls) - statuses.count("allowed"),
+        "ip_literal_hosts": sum(_is_ip_literal(host) for host in hosts),
+        "punycode_hosts": sum("xn--" in host for host in hosts),
+        "link_text_mismatches": mismatches,
+        "urgency_terms": len(URGENCY_PATTERN.findall(email_body)),
+        "sender_reply_to_mismatch": int(bool(sender_domain and reply_domain and sender_domain != reply_domain)),
+    }
+
+
+def score_features(features):
+    """
+    Turns extracted features into a risk score and the list of signals that contributed to it.
+    Returns:
+        tuple: (score, reasons)
+    """
+    points = {
+        "blocked_hosts": FEATURE_WEIGHTS["blocked_hosts"] * features["blocked_hosts"],
+        "lookalike_hosts": FEATURE_WEIGHTS["lookalike_hosts"] * features["lookalike_hosts"],
+        "ip_literal_hosts": FEATURE_WEIGHTS["ip_literal_hosts"] * features["ip_literal_hosts"],
+        "punycode_hosts": FEATURE_WEIGHTS["punycode_hosts"] * features["punycode_hosts"],
+        "link_text_mismatches": FEATURE_WEIGHTS["link_text_mismatches"] * features["link_text_mismatches"],
+        "sender_reply_to_mismatch": FEATURE_WEIGHTS["sender_reply_to_mismatch"] * features["sender_reply_to_mismatch"],
+        "urgency_terms": FEATURE_WEIGHTS["urgency_terms"] * min(features["urgency_terms"], MAX_URGENCY_POINTS),
+        "many_urls": FEATURE_WEIGHTS["many_urls"] * (features["url_count"] > MANY_URLS),
+    }
+    reasons = [f"{name.replace('_', ' ')} (+{value})" for name, value in points.items() if value]
+    return sum(points.values()), reasons
+
+
+def triage_email(email_body, sender=None, reply_to=None, reputation=None):
+    """
+    Decides obviously clean and obviously malicious emails locally.
+    Args:
+        email_body (str): Plain-text or HTML email body.
+        sender (str): Optional From header.
+        reply_to (str): Optional Reply-To header.
+        reputation (ReputationIndex): URL reputation index; defaults to the one at URL_REPUTATION_PATH.
+    Returns:
+        dict: "verdict" ("clean", "phishing" or "uncertain"), "score", "reasons", "features" and
+        "links" (the check_links() results).
+    """
+    links = check_links(email_body, reputation)
+    features = extract_features(email_body, sender, reply_to, reputation, links)
+    score, reasons = score_features(features)
+    # Clean needs no signals at all and at least one link, every one of them allowlisted
+    if features["url_count"] and features["unvetted_urls"] == 0 and score <= CLEAN_THRESHOLD:
+        verdict = "clean"
+    elif score >= PHISHING_THRESHOLD:
+        verdict = "phishing"
+    else:
+        verdict = "uncertain"
+    return {"verdict": verdict, "score": score, "reasons": reasons, "features": features, "links": links}
+
+# ---------------------------------------------------------------------
+# Prompt shared by the blocking and the streaming analysis
+def analysis_prompt(email_body):
+    return f"Analyze this email for potential phishing content: {email_body} and provide an analysis."
+
 # Function to analyze email body for potential phishing
-def analyze_email(email_body):
+# (max_retries: SDK retries, None for the gateway default; batch_scan.py retries itself and passes 0)
+def analyze_email(email_body, max_retries=None):
     # Placeholder for your existing logic to analyze the email body
     # Assuming a call to an OpenAI model here
-    response = openai.completions.create(
+    response = llm_gateway.completion(
+        LLM_APP,
+        max_retries=max_retries,
         model="gpt-3.5-turbo-instruct",
-        prompt=f"Analyze this email for potential phishing content: {email_body} and provide an analysis.",
+        prompt=analysis_prompt(email_body),
         max_tokens=500
     )
     return response.choices[0].text.strip()
 
+# Streaming variant of analyze_email for the UI: yields text as it is generated
+# and logs time-to-first-token and total latency to the console
+def stream_analysis(email_body):
+    start = time.perf_counter()
+    first_token = None
+    stream = llm_gateway.completion(
+        LLM_APP,
+        model="gpt-3.5-turbo-instruct",
+        prompt=analysis_prompt(email_body),
+        max_tokens=500,
+        stream=True
+    )
+    for chunk in stream:
+        text = chunk.choices[0].text if chunk.choices else ""
+        if text:
+            if first_token is None:
+                first_token = time.perf_counter() - start
+            yield text
+    total = time.perf_counter() - start
+    print(f"analyze_email: time to first token {first_token or total:.2f}s, total {total:.2f}s")
+
+# One cache connection per Streamlit server process, so hit/miss counters survive reruns
+@st.cache_resource
+def get_verdict_cache():
+    return VerdictCache(VERDICT_CACHE_PATH)
+
+# The offline classifier is loaded once per process; None if no model has been trained yet
+@st.cache_resource
+def get_classifier():
+    if os.path.exists(PHISHING_MODEL_PATH):
+        return PhishingClassifier.load(PHISHING_MODEL_PATH)
+    return None
+
 # Streamlit UI setup
-st.title("Phishing Email Detection")
-
-# Input for email body
-email_body = st.text_area("Enter the email body:")
-
-if st.button("Analyze Email"):
-    if email_body.strip():
-        try:
-            # Analyze the email body
-            result = analyze_email(email_body)
-            st.subheader("Analysis Result:")
-            st.write(result)
-        except Exception as e:
-            st.error(f"An error occurred: {e}")
-    else:
-        st.warning("Please enter the email body to analyze.")
+def main():
+    st.title("Phishing Email Detection")
+    cache = get_verdict_cache()
+    classifier = get_classifier()
+
+    # Input for email body
+    email_body = st.text_area("Enter the email body:")
+    # Optional headers, for the sender / Reply-To mismatch check
+    sender = st.text_input("From header (optional):")
+    reply_to = st.text_input("Reply-To header (optional):")
+    always_use_model = st.checkbox("Skip the local pre-filter")
+    # With a trained classifier the LLM explanation is optional
+    explain = classifier is None or st.checkbox("Explain with the LLM")
+
+    if st.button("Analyze Email"):
+        if email_body.strip():
+            try:
+                # Decide clear-cut cases locally, only ambiguous emails go to the model
+                triage = triage_email(email_body, sender or None, reply_to or None)
+                links = triage["links"]
+                if links:
+                    with st.expander(f"Link reputation ({len(links)} links)"):
+                        st.table(links)
+                if triage["verdict"] != "uncertain" and not always_use_model:
+                    st.subheader("Analysis Result (local pre-filter):")
+                    if triage["verdict"] == "phishing":
+                        st.error(f"Likely phishing (score {triage['score']}): " + ", ".join(triage["reasons"]))
+                    else:
+                        checked = "urgency or header mismatches" if sender and reply_to else "urgency"
+                        st.success(f"No phishing indicators found (every link is allowlisted, no {checked}).")
+                else:
+                    if classifier is not None:
+                        probability = classifier.predict_proba([email_body])[0]
+                        st.subheader("Analysis Result (local classifier):")
+                        verdict = "Likely phishing" if probability >= classifier.threshold else "Likely legitimate"
+                        st.write(f"{verdict} ({probability:.0%} phishing probability)")
+                    if explain:
+                        try:
+                            result = cache.get(email_body, sender or None)
+                            st.subheader("Analysis Result:")
+                            if result is not None:
+                                st.write(result)
+                            else:
+                                # Analyze the email body, rendering the analysis as it streams in
+                                result = st.write_stream(stream_analysis(email_body))
+                                cache.put(email_body, result.strip(), sender or None)
+                        except openai.OpenAIError as e:
+                            if classifier is None:
+                                raise
+                            st.warning(f"LLM explanation unavailable, showing the local verdict only: {e}")
+            except Exception as e:
+                st.error(f"An error occurred: {e}")
+        else:
+            st.warning("Please enter the email body to analyze.")
+
+    st.sidebar.subheader("Verdict cache")
+    st.sidebar.write(
+        f"Hits: {cache.stats['hits']} | Near-duplicate hits: {cache.stats['near_hits']} | "
+        f"Misses: {cache.stats['misses']} | Hit rate: {cache.hit_rate():.0%}"
+    )
+
+# Run the application (kept behind the guard so batch_scan.py can import analyze_email)
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,311 @@
+"""
+Local URL / Domain Reputation Index
+-----------------------------------
+Checks the links found in an email against large block/allow lists and a protected brand
+list without any network lookups.
+
+Each list is stored as:
+  - a Bloom filter, so the common "not listed" answer costs a few bit probes, and
+  - a sorted table of reversed domains ("com.example.mail"), used to confirm Bloom hits
+    exactly. Because labels are reversed, every parent of a host is a prefix of it, so a
+    host is matched against "example.com" and all of its sub-domains by probing each of its
+    label suffixes in turn (O(length of the host)).
+Both are saved as plain .npy files inside an index directory and opened with
+numpy memory mapping, so startup is instant even for hundreds of thousands of domains.
+
+The lookalike check compares the main label of each host (e.g. "paypa1" in
+"paypa1-secure.com") with the protected brands after folding common homoglyphs.
+
+Usage:
+    python url_reputation.py build --block blocklist.txt --allow allowlist.txt --brands brands.txt
+    python url_reputation.py check https://paypa1-secure.com/login http://example.org
+"""
+
+import argparse
+import bisect
+import hashlib
+import json
+import math
+import os
+import sys
+import unicodedata
+from urllib.parse import urlparse
+
+import numpy as np
+
+DEFAULT_INDEX_DIR = "url_reputation_index"
+FALSE_POSITIVE_RATE = 0.001
+# Second-level labels under which registrations happen one level deeper (co.uk, com.au, ...)
+SECOND_LEVEL_SUFFIXES = {"co", "com", "net", "org", "gov", "ac", "edu", "ne", "or"}
+HOMOGLYPHS = {"0": "o", "1": "l", "3": "e", "4": "a", "5": "s", "7": "t", "8": "b", "9": "g", "|": "l", "$": "s", "@": "a"}
+MULTI_CHAR_HOMOGLYPHS = (("rn", "m"), ("vv", "w"), ("cl", "d"))
+
+
+def normalize_domain(domain):
+    """Lowercases a domain, drops wildcard prefixes and trailing dots and converts IDNs to punycode."""
+    domain = domain.strip().lower().lstrip("*.").rstrip(".")
+    try:
+        return domain.encode("idna").decode("ascii")
+    except UnicodeError:
+        return domain
+
+
+def url_host(url):
+    """Returns the normalized host of a URL (or bare domain)."""
+    if "://" not in url:
+        url = "http://" + url
+    return normalize_domain(urlparse(url).hostname or "")
+
+
+def _reverse(domain):
+    return ".".join(reversed(domain.split(".")))
+
+
+def _bloom_positions(key, num_bits, num_hashes):
+    # Kirsch-Mitzenmacher double hashing from a single 128-bit digest
+    digest = hashlib.blake2b(key.encode("utf-8"), digest_size=16).digest()
+    h1, h2 = int.from_bytes(digest[:8], "little"), int.from_bytes(digest[8:], "little") | 1
+    return [(h1 + i * h2) % num_bits for i in range(num_hashes)]
+
+
+class _SortedStrings:
+    """Read-only sequence view over a blob of concatenated strings, for bisect."""
+
+    def __init__(self, blob, offsets):
+        self.blob = blob
+        self.offsets = offsets
+        # memoryviews index much faster than (memory-mapped) NumPy arrays and copy nothing
+        self._blob = memoryview(np.ascontiguousarray(blob))
+        self._offsets = memoryview(np.ascontiguousarray(offsets))
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i):
+        return bytes(self._blob[self._offsets[i]:self._offsets[i + 1]])
+
+
+class DomainSet:
+    """
+    Static set of domains with Bloom-filter pre-checks and suffix (parent-domain) matching.
+    """
+
+    def __init__(self, bloom, num_hashes, blob, offsets):
+        self.bloom = bloom
+        self._bits = memoryview(np.ascontiguousarray(bloom))
+        self.num_bits = len(bloom) * 8
+        self.num_hashes = int(num_hashes)
+        self.table = _SortedStrings(blob, offsets)
+
+    @classmethod
+    def build(cls, domains, false_positive_rate=FALSE_POSITIVE_RATE):
+        reversed_domains = sorted({_reverse(d) for d in map(normalize_domain, domains) if d})
+        n = max(len(reversed_domains), 1)
+        num_bits = max(64, int(-n * math.log(false_positive_rate) / math.log(2) ** 2))
+        num_bits += -num_bits % 8
+        num_hashes = max(1, round(num_bits / n * math.log(2)))
+        bloom = np.zeros(num_bits // 8, dtype=np.uint8)
+        positions = np.fromiter(
+            (p for d in reversed_domains for p in _bloom_positions(d, num_bits, num_hashes)), dtype=np.int64
+        )
+        np.bitwise_or.at(bloom, positions >> 3, (1 << (positions & 7)).astype(np.uint8))
+        encoded = [d.encode("ascii", errors="ignore") for d in reversed_domains]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum([len(e) for e in encoded])
+        blob = np.frombuffer(b"".join(encoded), dtype=np.uint8)
+        return cls(bloom, num_hashes, blob, offsets)
+
+    def save(self, directory, name):
+        np.save(os.path.join(directory, f"{name}_bloom.npy"), self.bloom)
+        np.save(os.path.join(directory, f"{name}_blob.npy"), np.asarray(self.table.blob))
+        np.save(os.path.join(directory, f"{name}_offsets.npy"), np.asarray(self.table.offsets))
+        return {"num_hashes": self.num_hashes, "size": len(self.table)}
+
+    @classmethod
+    def load(cls, directory, name, meta):
+        def mapped(part):
+            return np.load(os.path.join(directory, f"{name}_{part}.npy"), mmap_mode="r")
+        return cls(mapped("bloom"), meta["num_hashes"], mapped("blob"), mapped("offsets"))
+
+    def __len__(self):
+        return len(self.table)
+
+    def _contains_exact(self, reversed_domain):
+        positions = _bloom_positions(reversed_domain, self.num_bits, self.num_hashes)
+        if not all(self._bits[p >> 3] >> (p & 7) & 1 for p in positions):
+            return False
+        key = reversed_domain.encode("ascii", errors="ignore")
+        i = bisect.bisect_left(self.table, key)
+        return i < len(self.table) and self.table[i] == key
+
+    def match(self, host):
+        """
+        Returns the most specific listed domain that equals the host or is a parent of it.
+        Args:
+            host (str): Normalized host name.
+        Returns:
+            str: The matching listed domain, or None.
+        """
+        labels = host.split(".")
+        for start in range(len(labels)):
+            suffix = labels[start:]
+            if len(suffix) < 2 and len(labels) > 1:
+                break  # never match on a bare TLD unless the host itself is one
+            if self._contains_exact(".".join(reversed(suffix))):
+                return ".".join(suffix)
+        return None
+
+
+def registered_label(host):
+    """Returns the label a domain was registered under, e.g. "paypal" for "login.paypal.co.uk"."""
+    labels = host.split(".")
+    if len(labels) >= 3 and labels[-2] in SECOND_LEVEL_SUFFIXES and len(labels[-1]) == 2:
+        return labels[-3]
+    return labels[-2] if len(labels) >= 2 else labels[0]
+
+
+def fold_homoglyphs(label):
+    """Maps punycode/Unicode look-alike characters and digit substitutions onto plain letters."""
+    if label.startswith("xn--"):
+        try:
+            label = label.encode("ascii").decode("idna")
+        except UnicodeError:
+            pass
+    label = "".join(c for c in unicodedata.normalize("NFKD", label) if not unicodedata.combining(c))
+    label = "".join(HOMOGLYPHS.get(c, c) for c in label)
+    for glyphs, letter in MULTI_CHAR_HOMOGLYPHS:
+        label = label.replace(glyphs, letter)
+    return label
+
+
+def edit_distance(a, b, limit=2):
+    """Damerau-Levenshtein (optimal string alignment) distance, giving up once it exceeds limit."""
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    previous2, previous = None, list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        current = [i] + [0] * len(b)
+        for j, cb in enumerate(b, 1):
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ca != cb))
+            if previous2 is not None and i > 1 and j > 1 and ca == b[j - 2] and a[i - 2] == cb:
+                current[j] = min(current[j], previous2[j - 2] + 1)
+        if min(current) > limit:
+            return limit + 1
+        previous2, previous = previous, current
+    return previous[-1]
+
+
+class ReputationIndex:
+    """Blocklist, allowlist and protected-brand checks for URLs, loaded from an index directory."""
+
+    def __init__(self, blocked, allowed, brands):
+        self.blocked = blocked
+        self.allowed = allowed
+        # brand label -> the brand's own registered domains
+        self.brands = {}
+        for domain in brands:
+            domain = normalize_domain(domain)
+            if domain:
+                self.brands.setdefault(registered_label(domain), set()).add(domain)
+
+    @classmethod
+    def build(cls, blocklist, allowlist=(), brands=()):
+        return cls(DomainSet.build(blocklist), DomainSet.build(allowlist), list(brands))
+
+    def save(self, directory=DEFAULT_INDEX_DIR):
+        os.makedirs(directory, exist_ok=True)
+        meta = {
+            "blocked": self.blocked.save(directory, "blocked"),
+            "allowed": self.allowed.save(directory, "allowed"),
+            "brands": sorted(d for domains in self.brands.values() for d in domains),
+        }
+        with open(os.path.join(directory, "meta.json"), "w", encoding="utf-8") as fh:
+            json.dump(meta, fh, indent=2)
+
+    @classmethod
+    def load(cls, directory=DEFAULT_INDEX_DIR):
+        with open(os.path.join(directory, "meta.json"), encoding="utf-8") as fh:
+            meta = json.load(fh)
+        return cls(
+            DomainSet.load(directory, "blocked", meta["blocked"]),
+            DomainSet.load(directory, "allowed", meta["allowed"]),
+            meta["brands"],
+        )
+
+    def lookalike_brand(self, host):
+        """
+        Returns the protected brand a host imitates, or None. A host imitates a brand when it is
+        not one of the brand's own domains and its registered label, after homoglyph folding,
+        equals the brand, is within a small edit distance of it, or carries it as a hyphenated
+        part (e.g. "paypal-secure").
+        """
+        if any(host == d or host.endswith("." + d) for domains in self.brands.values() for d in domains):
+            return None
+        folded = fold_homoglyphs(registered_label(host))
+        for brand in self.brands:
+            limit = 0 if len(brand) <= 4 else 1 if len(brand) <= 8 else 2
+            if folded == brand or brand in folded.split("-") or edit_distance(folded, brand, limit) <= limit:
+                return brand
+        return None
+
+    def check_url(self, url):
+        """
+        Checks one URL.
+        Returns:
+            dict: "url", "host", "status" ("blocked", "allowed", "lookalike" or "unknown") and
+            "matched" (the listed domain or imitated brand, if any).
+        """
+        host = url_host(url)
+        result = {"url": url, "host": host, "status": "unknown", "matched": None}
+        if not host:
+            return result
+        blocked = self.blocked.match(host)
+        if blocked:
+            return {**result, "status": "blocked", "matched": blocked}
+        allowed = self.allowed.match(host)
+        if allowed:
+            return {**result, "status": "allowed", "matched": allowed}
+        brand = self.lookalike_brand(host)
+        if brand:
+            return {**result, "status": "lookalike", "matched": brand}
+        return result
+
+
+def read_domain_list(path):
+    """Reads a domain list: one domain per line, hosts-file lines and # comments are accepted."""
+    with open(path, encoding="utf-8", errors="replace") as fh:
+        for line in fh:
+            line = line.split("#", 1)[0].strip()
+            if line:
+                yield line.split()[-1]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build or query the local URL reputation index.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    build_parser = commands.add_parser("build", help="build the index from domain lists")
+    build_parser.add_argument("--block", action="append", default=[], help="blocklist file (repeatable)")
+    build_parser.add_argument("--allow", action="append", default=[], help="allowlist file (repeatable)")
+    build_parser.add_argument("--brands", help="file with the protected brands' own domains")
+    build_parser.add_argument("--out", default=DEFAULT_INDEX_DIR, help="index directory")
+    check_parser = commands.add_parser("check", help="check URLs against the index")
+    check_parser.add_argument("urls", nargs="+")
+    check_parser.add_argument("--index", default=DEFAULT_INDEX_DIR, help="index directory")
+    args = parser.parse_args(argv)
+
+    if args.command == "build":
+        index = ReputationIndex.build(
+            (d for path in args.block for d in read_domain_list(path)),
+            (d for path in args.allow for d in read_domain_list(path)),
+            read_domain_list(args.brands) if args.brands else (),
+        )
+        index.save(args.out)
+        print(f"Indexed {len(index.blocked)} blocked and {len(index.allowed)} allowed domains -> {args.out}", file=sys.stderr)
+    else:
+        index = ReputationIndex.load(args.index)
+        for url in args.urls:
+            print(json.dumps(index.check_url(url)))
+
+
+if __name__ == "__main__":
+    main()
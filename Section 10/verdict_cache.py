@@ -0,0 +1,218 @@
+"""
+Persistent Verdict Cache
+------------------------
+On-disk (SQLite) cache of analyze_email() results, so a campaign that hits hundreds of
+mailboxes with the same body only pays for one completion.
+
+Entries are keyed by a SHA-256 of the normalized body. Each entry also stores a 64-bit
+SimHash of the body's word shingles, split into eight 8-bit bands; a lookup that misses the
+exact key checks the entries sharing a band and reuses one within MAX_HAMMING_DISTANCE bits,
+which catches templated variants that only differ in the recipient's name or a tracking ID.
+A near-duplicate is only reused when its context (the sender's domain and the set of link
+hosts) matches exactly, since a swapped link barely moves the SimHash; without a match only
+exact-key hits are served. Entries expire after a TTL (expired rows are skipped on lookup and purged on every put()) and
+the least recently used ones are evicted past max_entries.
+"""
+
+import hashlib
+import re
+from email.utils import parseaddr
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future
+
+DEFAULT_TTL_SECONDS = 7 * 24 * 3600
+DEFAULT_MAX_ENTRIES = 50_000
+MAX_HAMMING_DISTANCE = 6
+SHINGLE_SIZE = 3
+BANDS = 8
+BAND_BITS = 64 // BANDS
+
+WORD_PATTERN = re.compile(r"[a-z0-9]+")
+LINK_HOST_PATTERN = re.compile(r'\b(?:https?://|www\.)(?:[^\s/@<>"\')\]]*@)?([^\s/:?#<>"\')\]]+)', re.IGNORECASE)
+
+
+def normalize_body(email_body):
+    """Lowercases and collapses whitespace so trivially different copies share a key."""
+    return " ".join(email_body.lower().split())
+
+
+def body_key(email_body):
+    """Returns the content-addressed cache key for an email body."""
+    return hashlib.sha256(normalize_body(email_body).encode("utf-8")).hexdigest()
+
+
+def context_key(email_body, sender=None):
+    """
+    Returns the fingerprint of what a near-duplicate must share with the body: the sender's
+    domain and the sorted set of link hosts.
+    """
+    sender_domain = parseaddr(sender or "")[1].rpartition("@")[2].lower()
+    hosts = sorted({host.lower().rstrip(".") for host in LINK_HOST_PATTERN.findall(email_body)})
+    return hashlib.sha256("\n".join([sender_domain, *hosts]).encode("utf-8")).hexdigest()
+
+
+def simhash(email_body):
+    """
+    Computes a 64-bit SimHash over word shingles of the body.
+    Args:
+        email_body (str): The email body.
+    Returns:
+        int: Unsigned 64-bit fingerprint; similar bodies differ in few bits.
+    """
+    words = WORD_PATTERN.findall(email_body.lower())
+    shingles = [" ".join(words[i:i + SHINGLE_SIZE]) for i in range(max(len(words) - SHINGLE_SIZE + 1, 1))]
+    weights = [0] * 64
+    for shingle in shingles:
+        h = int.from_bytes(hashlib.blake2b(shingle.encode("utf-8"), digest_size=8).digest(), "big")
+        for bit in range(64):
+            weights[bit] += 1 if h >> bit & 1 else -1
+    return sum(1 << bit for bit in range(64) if weights[bit] > 0)
+
+
+def _bands(fingerprint):
+    mask = (1 << BAND_BITS) - 1
+    return [(fingerprint >> (band * BAND_BITS)) & mask for band in range(BANDS)]
+
+
+def _to_signed(value):
+    # SQLite integers are signed 64-bit
+    return value - (1 << 64) if value >= 1 << 63 else value
+
+
+class VerdictCache:
+    """
+    SQLite-backed cache of email analyses with TTL, LRU eviction and near-duplicate lookup.
+    Safe to share between the threads of batch_scan.py; get_or_analyze() is single-flight, so
+    concurrent copies of one body share a single analysis.
+    """
+
+    def __init__(self, path="verdict_cache.db", ttl_seconds=DEFAULT_TTL_SECONDS, max_entries=DEFAULT_MAX_ENTRIES):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.stats = {"hits": 0, "near_hits": 0, "misses": 0}
+        self._lock = threading.Lock()
+        # Futures of the analyses in progress, by body_key()
+        self._in_flight = {}
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS verdicts (key TEXT PRIMARY KEY, simhash INTEGER, "
+            + "".join(f"b{band} INTEGER, " for band in range(BANDS))
+            + "analysis TEXT, created REAL, last_used REAL, context TEXT)"
+        )
+        # Caches created before the context column: their rows only serve exact-key hits
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(verdicts)")}
+        if "context" not in columns:
+            self._conn.execute("ALTER TABLE verdicts ADD COLUMN context TEXT")
+        for band in range(BANDS):
+            self._conn.execute(f"CREATE INDEX IF NOT EXISTS verdicts_b{band} ON verdicts (b{band})")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS verdicts_last_used ON verdicts (last_used)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS verdicts_created ON verdicts (created)")
+        self._conn.commit()
+
+    def get(self, email_body, sender=None):
+        """
+        Looks up a cached analysis, first by exact key and then by SimHash near-duplicate
+        among the entries with the same sender domain and link hosts.
+        Args:
+            email_body (str): The email body.
+            sender (str): Optional From header.
+        Returns:
+            str: The cached analysis, or None on a miss.
+        """
+        key = body_key(email_body)
+        now = time.time()
+        oldest = now - self.ttl_seconds
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT key, analysis FROM verdicts WHERE key = ? AND created >= ?", (key, oldest)
+            ).fetchone()
+            kind = "hits"
+            if row is None:
+                row = self._nearest(simhash(email_body), context_key(email_body, sender), oldest)
+                kind = "near_hits"
+            if row is None:
+                self.stats["misses"] += 1
+                return None
+            self._conn.execute("UPDATE verdicts SET last_used = ? WHERE key = ?", (now, row[0]))
+            self._conn.commit()
+            self.stats[kind] += 1
+            return row[1]
+
+    def _nearest(self, fingerprint, context, oldest):
+        # Pigeonhole: within MAX_HAMMING_DISTANCE < BANDS bits, at least one band matches exactly
+        bands = _bands(fingerprint)
+        candidates = self._conn.execute(
+            "SELECT key, analysis, simhash FROM verdicts WHERE created >= ? AND context = ? AND ("
+            + " OR ".join(f"b{band} = ?" for band in range(BANDS)) + ")",
+            (oldest, context, *bands),
+        ).fetchall()
+        best = None
+        for key, analysis, stored in candidates:
+            distance = bin((stored % (1 << 64)) ^ fingerprint).count("1")
+            if distance <= MAX_HAMMING_DISTANCE and (best is None or distance < best[0]):
+                best = (distance, key, analysis)
+        return best and best[1:]
+
+    def put(self, email_body, analysis, sender=None):
+        """
+        Stores an analysis, purges expired entries and evicts the least recently used ones
+        beyond max_entries. sender is the From header the body arrived with, if known.
+        """
+        fingerprint = simhash(email_body)
+        now = time.time()
+        with self._lock:
+            self._conn.execute("DELETE FROM verdicts WHERE created < ?", (now - self.ttl_seconds,))
+            self._conn.execute(
+                "INSERT OR REPLACE INTO verdicts (key, simhash, "
+                + "".join(f"b{band}, " for band in range(BANDS))
+                + f"analysis, created, last_used, context) VALUES ({', '.join('?' * (BANDS + 6))})",
+                (body_key(email_body), _to_signed(fingerprint), *_bands(fingerprint), analysis, now, now,
+                 context_key(email_body, sender)),
+            )
+            self._conn.execute(
+                "DELETE FROM verdicts WHERE key IN "
+                "(SELECT key FROM verdicts ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            )
+            self._conn.commit()
+
+    def get_or_analyze(self, email_body, analyze, sender=None):
+        """
+        Returns the cached analysis for the body, calling analyze(email_body) and caching
+        the result on a miss. Threads asking for a body that is already being analyzed wait
+        for that analysis (or its error) instead of starting another one.
+        """
+        key = body_key(email_body)
+        with self._lock:
+            waiting = self._in_flight.get(key)
+            if waiting is None:
+                future = self._in_flight[key] = Future()
+            else:
+                self.stats["hits"] += 1
+        if waiting is not None:
+            return waiting.result()
+        # Checked only once registered, so a body analyzed meanwhile is found in the cache
+        try:
+            analysis = self.get(email_body, sender)
+            if analysis is None:
+                analysis = analyze(email_body)
+                self.put(email_body, analysis, sender)
+            future.set_result(analysis)
+            return analysis
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                del self._in_flight[key]
+
+    def hit_rate(self):
+        """Fraction of lookups served from the cache (exact or near-duplicate)."""
+        total = sum(self.stats.values())
+        return (self.stats["hits"] + self.stats["near_hits"]) / total if total else 0.0
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
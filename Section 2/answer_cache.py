@@ -0,0 +1,142 @@
+'''
+Semantic answer cache for se-pdf-query.py.
+Analysts keep asking the same questions in slightly different words. Answers are stored with
+the embedding of their question; a new question whose embedding is close enough (cosine
+similarity above a threshold) to a cached one gets the cached answer back without retrieval
+or a GPT-4o completion.
+
+Entries live in SQLite (answer_cache.db) and are searched through their own small in-memory
+FAISS inner-product index. Every entry records the version of faiss_sepq it was answered from;
+entries of any other version are dropped when the cache is opened, so rebuilding the vector
+store invalidates the cache. The cache holds at most max_entries answers and evicts the least
+recently used ones beyond that.
+'''
+import json
+import sqlite3
+import threading
+import time
+
+import faiss
+import numpy as np
+
+ANSWER_CACHE_PATH = "answer_cache.db"
+DEFAULT_SIMILARITY_THRESHOLD = 0.95
+# Nearest cached questions checked per lookup (entries of other scopes may be closer)
+CANDIDATES = 8
+
+
+def _unit_vector(vector):
+    vector = np.asarray(vector, dtype=np.float32).reshape(1, -1)
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+class SemanticAnswerCache:
+    """
+    Answers keyed by question embedding, for one version of the vector store.
+    Args:
+        path (str): SQLite database file.
+        index_version: Version of the vector store (pdf_ingest.index_version()).
+        max_entries (int): Maximum number of cached answers.
+    """
+
+    def __init__(self, path=ANSWER_CACHE_PATH, index_version=None, max_entries=1000):
+        self.index_version = str(index_version)
+        self.max_entries = max_entries
+        self.stats = {"hits": 0, "misses": 0}
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS answers ("
+            "id INTEGER PRIMARY KEY, index_version TEXT, scope TEXT, question TEXT, answer TEXT, "
+            "context TEXT, vector BLOB, last_used REAL)"
+        )
+        # Answers from an older (or newer) vector store are no longer valid
+        self._conn.execute("DELETE FROM answers WHERE index_version != ?", (self.index_version,))
+        self._conn.commit()
+        self._index = None
+        self._scopes = {}
+        for entry_id, scope, vector in self._conn.execute("SELECT id, scope, vector FROM answers"):
+            self._add(entry_id, scope, np.frombuffer(vector, dtype=np.float32))
+
+    def _add(self, entry_id, scope, vector):
+        vector = _unit_vector(vector)
+        if self._index is None:
+            self._index = faiss.IndexIDMap(faiss.IndexFlatIP(vector.shape[1]))
+        self._index.add_with_ids(vector, np.array([entry_id], dtype=np.int64))
+        self._scopes[entry_id] = scope
+
+    def get(self, vector, scope="", threshold=DEFAULT_SIMILARITY_THRESHOLD):
+        """
+        Looks up the cached answer of the most similar question.
+        Args:
+            vector: Embedding of the new question.
+            scope (str): Retrieval settings the answer depends on (e.g. the metadata filter);
+                only answers cached under the same scope are returned.
+            threshold (float): Minimum cosine similarity.
+        Returns:
+            dict: "question", "answer", "context" and "similarity", or None on a miss.
+        """
+        with self._lock:
+            match = None
+            if self._index is not None and self._index.ntotal:
+                scores, ids = self._index.search(_unit_vector(vector), min(CANDIDATES, self._index.ntotal))
+                for score, entry_id in zip(scores[0], ids[0]):
+                    if entry_id != -1 and score >= threshold and self._scopes.get(int(entry_id)) == scope:
+                        match = int(entry_id), float(score)
+                        break
+            if match is None:
+                self.stats["misses"] += 1
+                return None
+            entry_id, similarity = match
+            question, answer, context = self._conn.execute(
+                "SELECT question, answer, context FROM answers WHERE id = ?", (entry_id,)
+            ).fetchone()
+            self._conn.execute("UPDATE answers SET last_used = ? WHERE id = ?", (time.time(), entry_id))
+            self._conn.commit()
+            self.stats["hits"] += 1
+        return {"question": question, "answer": answer, "context": json.loads(context), "similarity": similarity}
+
+    def put(self, question, vector, answer, context=None, scope=""):
+        """
+        Caches an answer, evicting the least recently used answers beyond max_entries.
+        Args:
+            question (str): The question as asked.
+            vector: Its embedding.
+            answer (str): The generated answer.
+            context (list): JSON-serializable retrieved context (e.g. page_content/metadata dicts).
+            scope (str): See get().
+        """
+        vector = np.asarray(vector, dtype=np.float32)
+        with self._lock:
+            cursor = self._conn.execute(
+                "INSERT INTO answers (index_version, scope, question, answer, context, vector, last_used) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (self.index_version, scope, question, answer, json.dumps(context or [], default=str),
+                 vector.tobytes(), time.time()),
+            )
+            self._add(cursor.lastrowid, scope, vector)
+            excess = len(self._scopes) - self.max_entries
+            if excess > 0:
+                evicted = [row[0] for row in self._conn.execute(
+                    "SELECT id FROM answers ORDER BY last_used LIMIT ?", (excess,)
+                )]
+                self._conn.executemany("DELETE FROM answers WHERE id = ?", [(entry_id,) for entry_id in evicted])
+                self._index.remove_ids(np.array(evicted, dtype=np.int64))
+                for entry_id in evicted:
+                    del self._scopes[entry_id]
+            self._conn.commit()
+
+    def __len__(self):
+        return len(self._scopes)
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM answers")
+            self._conn.commit()
+            self._index = None
+            self._scopes = {}
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,183 @@
+'''
+Local BM25 retrieval for se-pdf-query.py.
+A lexical inverted index over the same chunks as the FAISS store, built by pdf_ingest.py and
+saved next to it (bm25.npz + bm25.json in the faiss_sepq directory). Searching it needs no
+embedding call, so keyword-style questions can be answered in lexical-only mode, and in hybrid
+mode its ranking is merged with the vector search results by reciprocal-rank fusion (RRF).
+
+The postings are stored CSR-style in flat NumPy arrays (one slice of document indices and term
+frequencies per term), so loading and scoring stay fast for large corpora.
+'''
+import json
+import os
+import re
+
+import numpy as np
+from langchain_core.retrievers import BaseRetriever
+
+RETRIEVAL_MODES = ("vector", "hybrid", "lexical")
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+STOPWORDS = frozenset(
+    "a an and are as at be by can do does for from how i in is it of on or the this to was what when "
+    "where which who why will with you your".split()
+)
+# Standard BM25 parameters
+K1 = 1.5
+B = 0.75
+# RRF damping constant from the original paper
+RRF_K = 60
+
+
+def tokenize(text):
+    """Lowercases text and splits it into alphanumeric terms, dropping stopwords."""
+    return [token for token in TOKEN_PATTERN.findall(text.lower()) if token not in STOPWORDS]
+
+
+class BM25Index:
+    """Okapi BM25 inverted index over a fixed list of chunks."""
+
+    def __init__(self, doc_ids, terms, offsets, postings, frequencies, doc_lengths):
+        self.doc_ids = list(doc_ids)
+        self.terms = terms
+        self.offsets = offsets
+        self.postings = postings
+        self.frequencies = frequencies
+        self.doc_lengths = doc_lengths
+        self.average_length = float(doc_lengths.mean()) if len(doc_lengths) else 0.0
+
+    @classmethod
+    def build(cls, doc_ids, texts):
+        """
+        Builds the index.
+        Args:
+            doc_ids: Docstore ID of every chunk.
+            texts: Text of every chunk.
+        """
+        counts = {}
+        doc_lengths = np.zeros(len(texts), dtype=np.float32)
+        for doc_index, text in enumerate(texts):
+            tokens = tokenize(text)
+            doc_lengths[doc_index] = len(tokens)
+            for token in tokens:
+                term_counts = counts.setdefault(token, {})
+                term_counts[doc_index] = term_counts.get(doc_index, 0) + 1
+        terms = {}
+        offsets = np.zeros(len(counts) + 1, dtype=np.int64)
+        postings = []
+        frequencies = []
+        for term_index, (term, term_counts) in enumerate(sorted(counts.items())):
+            terms[term] = term_index
+            postings.extend(term_counts)
+            frequencies.extend(term_counts.values())
+            offsets[term_index + 1] = len(postings)
+        return cls(
+            doc_ids, terms, offsets, np.array(postings, dtype=np.int32), np.array(frequencies, dtype=np.float32),
+            doc_lengths,
+        )
+
+    def save(self, index_path):
+        np.savez(
+            os.path.join(index_path, "bm25.npz"),
+            offsets=self.offsets, postings=self.postings, frequencies=self.frequencies, doc_lengths=self.doc_lengths,
+        )
+        with open(os.path.join(index_path, "bm25.json"), "w", encoding="utf-8") as f:
+            json.dump({"doc_ids": self.doc_ids, "terms": self.terms}, f)
+
+    @classmethod
+    def load(cls, index_path):
+        """Loads the index saved in index_path, or returns None if there is none."""
+        try:
+            with open(os.path.join(index_path, "bm25.json"), encoding="utf-8") as f:
+                meta = json.load(f)
+            arrays = np.load(os.path.join(index_path, "bm25.npz"))
+        except OSError:
+            return None
+        return cls(meta["doc_ids"], meta["terms"], arrays["offsets"], arrays["postings"], arrays["frequencies"], arrays["doc_lengths"])
+
+    def search(self, query, k=20):
+        """
+        Returns the top-k chunks for a query.
+        Returns:
+            list: (docstore ID, BM25 score) pairs, best first.
+        """
+        scores = np.zeros(len(self.doc_ids), dtype=np.float32)
+        document_count = len(self.doc_ids)
+        for token in set(tokenize(query)):
+            term_index = self.terms.get(token)
+            if term_index is None:
+                continue
+            start, end = self.offsets[term_index], self.offsets[term_index + 1]
+            docs = self.postings[start:end]
+            tf = self.frequencies[start:end]
+            idf = np.log(1 + (document_count - len(docs) + 0.5) / (len(docs) + 0.5))
+            norm = K1 * (1 - B + B * self.doc_lengths[docs] / self.average_length)
+            scores[docs] += idf * tf * (K1 + 1) / (tf + norm)
+        matched = np.flatnonzero(scores)
+        if len(matched) > k:
+            matched = matched[np.argpartition(-scores[matched], k)[:k]]
+        matched = matched[np.argsort(-scores[matched], kind="stable")]
+        return [(self.doc_ids[i], float(scores[i])) for i in matched]
+
+
+def reciprocal_rank_fusion(rankings, k=RRF_K):
+    """
+    Merges ranked lists of IDs: each ID scores the sum of 1 / (k + rank) over the lists.
+    Returns:
+        list: IDs ordered by fused score.
+    """
+    fused = {}
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking, 1):
+            fused[doc_id] = fused.get(doc_id, 0.0) + 1.0 / (k + rank)
+    return sorted(fused, key=fused.get, reverse=True)
+
+
+def matches_filter(metadata, metadata_filter):
+    """True if every filtered field of the metadata has one of the allowed values."""
+    return all(metadata.get(field) in values for field, values in (metadata_filter or {}).items())
+
+
+class HybridRetriever(BaseRetriever):
+    """
+    Retriever over a FAISS vectorstore and its BM25 index.
+    mode "vector" searches the vectorstore only, "lexical" only BM25 (no embedding call) and
+    "hybrid" fuses both rankings with RRF. metadata_filter is {field: allowed values}.
+    """
+
+    vectorstore: object
+    bm25: object = None
+    mode: str = "hybrid"
+    k: int = 4
+    fetch_k: int = 20
+    metadata_filter: dict | None = None
+
+    def _lexical_docs(self, query):
+        docs = []
+        # Over-fetch so filtered-out chunks don't leave the result short
+        candidates = self.fetch_k * (5 if self.metadata_filter else 1)
+        for doc_id, _ in self.bm25.search(query, candidates):
+            doc = self.vectorstore.docstore.search(doc_id)
+            if matches_filter(doc.metadata, self.metadata_filter):
+                docs.append((doc_id, doc))
+                if len(docs) == self.fetch_k:
+                    break
+        return docs
+
+    def _get_relevant_documents(self, query, *, run_manager=None):
+        if self.mode == "vector" or self.bm25 is None:
+            return self.vectorstore.similarity_search(
+                query, k=self.k, filter=self.metadata_filter, fetch_k=max(100, 5 * self.fetch_k)
+            )
+        lexical = self._lexical_docs(query)
+        if self.mode == "lexical":
+            return [doc for _, doc in lexical[:self.k]]
+        vector = self.vectorstore.similarity_search(
+            query, k=self.fetch_k, filter=self.metadata_filter, fetch_k=max(100, 5 * self.fetch_k)
+        )
+        documents = {doc_id: doc for doc_id, doc in lexical}
+        vector_ids = []
+        for doc in vector:
+            documents[doc.id] = doc
+            vector_ids.append(doc.id)
+        fused = reciprocal_rank_fusion([vector_ids, [doc_id for doc_id, _ in lexical]])
+        return [documents[doc_id] for doc_id in fused[:self.k]]
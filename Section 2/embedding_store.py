@@ -0,0 +1,129 @@
+'''
+Persistent, content-hashed embedding cache for pdf_ingest.py.
+Chunk embeddings are stored in SQLite under the SHA-256 of the embedding model name plus the
+chunk text, so re-ingesting a PDF only sends new or edited chunks to the embedding API. The
+chunks that do need embedding are sent in large batches, several requests at a time.
+MemoizedQueryEmbeddings keeps recent question embeddings in memory for se-pdf-query.py.
+'''
+import hashlib
+import sqlite3
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+EMBEDDING_CACHE_PATH = "embedding_cache.db"
+
+
+def text_hash(text):
+    """Returns the SHA-256 hex digest of a chunk's text."""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class EmbeddingStore:
+    """SQLite map of (model, chunk text hash) -> float32 embedding vector."""
+
+    def __init__(self, path=EMBEDDING_CACHE_PATH):
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("CREATE TABLE IF NOT EXISTS embeddings (model TEXT, hash TEXT, vector BLOB, PRIMARY KEY (model, hash))")
+        self._conn.commit()
+
+    def get_many(self, model, hashes):
+        """Returns {hash: vector} for the hashes that are stored for the model."""
+        found = {}
+        hashes = list(dict.fromkeys(hashes))
+        with self._lock:
+            # Stay below SQLite's limit on query parameters
+            for i in range(0, len(hashes), 500):
+                batch = hashes[i:i + 500]
+                rows = self._conn.execute(
+                    f"SELECT hash, vector FROM embeddings WHERE model = ? AND hash IN ({','.join('?' * len(batch))})",
+                    [model, *batch],
+                )
+                for digest, vector in rows:
+                    found[digest] = np.frombuffer(vector, dtype=np.float32).tolist()
+        return found
+
+    def put_many(self, model, items):
+        """Stores (hash, vector) pairs for the model."""
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings VALUES (?, ?, ?)",
+                [(model, digest, np.asarray(vector, dtype=np.float32).tobytes()) for digest, vector in items],
+            )
+            self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    Embeddings wrapper that serves document embeddings from an EmbeddingStore and embeds only
+    the missing texts, in batches of `batch_size` with up to `concurrency` requests in flight.
+    Query embeddings are passed straight through.
+    Args:
+        embeddings: The underlying embeddings (e.g. OpenAIEmbeddings()).
+        store (EmbeddingStore): Persistent cache.
+        model (str): Model name the cache entries are keyed by; defaults to embeddings.model.
+    """
+
+    def __init__(self, embeddings, store, model=None, batch_size=512, concurrency=4):
+        self.embeddings = embeddings
+        self.store = store
+        self.model = model or getattr(embeddings, "model", type(embeddings).__name__)
+        self.batch_size = batch_size
+        self.concurrency = concurrency
+        self.stats = {"cached": 0, "embedded": 0}
+
+    def embed_documents(self, texts):
+        hashes = [text_hash(text) for text in texts]
+        vectors = self.store.get_many(self.model, hashes)
+        missing = {digest: text for digest, text in zip(hashes, texts) if digest not in vectors}
+        self.stats["cached"] += len(texts) - len(missing)
+        self.stats["embedded"] += len(missing)
+        if missing:
+            digests = list(missing)
+            batches = [digests[i:i + self.batch_size] for i in range(0, len(digests), self.batch_size)]
+            with ThreadPoolExecutor(max_workers=self.concurrency) as pool:
+                results = pool.map(lambda batch: self.embeddings.embed_documents([missing[d] for d in batch]), batches)
+                for batch, batch_vectors in zip(batches, results):
+                    # Persist each batch as it arrives so an interrupted ingest keeps its progress
+                    self.store.put_many(self.model, zip(batch, batch_vectors))
+                    vectors.update(zip(batch, batch_vectors))
+        return [vectors[digest] for digest in hashes]
+
+    def embed_query(self, text):
+        return self.embeddings.embed_query(text)
+
+
+class MemoizedQueryEmbeddings(Embeddings):
+    """
+    Embeddings wrapper that remembers the last `max_size` query embeddings, so a question that
+    was just embedded (e.g. for an answer-cache lookup) isn't embedded again for retrieval.
+    """
+
+    def __init__(self, embeddings, max_size=256):
+        self.embeddings = embeddings
+        self.max_size = max_size
+        self._queries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def embed_documents(self, texts):
+        return self.embeddings.embed_documents(texts)
+
+    def embed_query(self, text):
+        with self._lock:
+            if text in self._queries:
+                self._queries.move_to_end(text)
+                return self._queries[text]
+        vector = self.embeddings.embed_query(text)
+        with self._lock:
+            self._queries[text] = vector
+            if len(self._queries) > self.max_size:
+                self._queries.popitem(last=False)
+        return vector
@@ -0,0 +1,260 @@
+'''
+Builds the FAISS vector store that se-pdf-query.py answers questions from, out of one PDF or
+whole directories of PDFs. Ingestion is an explicit build step: run it once (and again
+whenever the documents change) instead of on every Streamlit rerun.
+
+PDFs are parsed and chunked in a process pool. Every chunk carries a "document" metadata field
+(its path relative to the ingested directory) plus the fields of an optional sidecar file
+<name>.json next to the PDF (e.g. {"department": "HR", "year": 2024}), so questions can be
+restricted to some documents with a metadata filter. The documents and their sidecar fields
+are listed in documents.json inside the index directory.
+
+The index type (flat, ivfpq or hnsw, see vector_index.py) is chosen at build time. A BM25
+inverted index over the same chunks (bm25_index.py) is saved next to the FAISS index.
+
+Re-ingesting is incremental. Chunk embeddings come from a content-hashed cache
+(embedding_store.py), so only new or edited chunks are embedded, and the existing FAISS index
+is updated in place: chunks that disappeared from the PDF are removed and new ones are added.
+(Approximate indexes only support additions; removing chunks from them rebuilds the index
+from cached embeddings.)
+
+Usage:
+    python pdf_ingest.py Introduction-cyber-security.pdf --out faiss_sepq
+    python pdf_ingest.py awareness_library/ --index-type ivfpq --workers 8
+'''
+import argparse
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from langchain_community.document_loaders import PyPDFLoader
+from langchain.text_splitter import RecursiveCharacterTextSplitter
+from dotenv import load_dotenv
+from bm25_index import BM25Index
+from embedding_store import EMBEDDING_CACHE_PATH, CachedEmbeddings, EmbeddingStore, text_hash
+from vector_index import INDEX_TYPES, build_vectorstore, index_type_of, load_vectorstore, resolve_index_type, save_vectorstore
+
+import gateway_path  # noqa: F401
+from llm_gateway import GatewayEmbeddings, metrics
+
+PDF_FILE_PATH = "Introduction-cyber-security.pdf"
+FAISS_INDEX_PATH = "faiss_sepq"
+MANIFEST_NAME = "documents.json"
+
+
+def read_sidecar(pdf_file_path):
+    """Returns the metadata of the optional <name>.json file next to a PDF, or {}."""
+    sidecar_path = os.path.splitext(pdf_file_path)[0] + ".json"
+    if not os.path.exists(sidecar_path):
+        return {}
+    with open(sidecar_path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def load_chunks(pdf_file_path, document=None):
+    """
+    Loads a PDF file and splits it into chunks (LangChain Documents).
+    Args:
+        pdf_file_path: Path to the PDF file.
+        document: Name stored in each chunk's "document" metadata; defaults to the file name.
+    """
+    loader = PyPDFLoader(pdf_file_path)
+    documents = loader.load()
+
+    text_splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=100)
+    chunks = text_splitter.split_documents(documents)
+    metadata = {**read_sidecar(pdf_file_path), "document": document or os.path.basename(pdf_file_path)}
+    for chunk in chunks:
+        chunk.metadata.update(metadata)
+    return chunks
+
+
+def find_pdfs(sources):
+    """
+    Expands PDF files and directories (searched recursively) into (path, document name) pairs.
+    Documents found in a directory are named by their path relative to it.
+    """
+    pdfs = []
+    for source in sources:
+        if os.path.isdir(source):
+            for root, _, files in sorted(os.walk(source)):
+                for name in sorted(files):
+                    if name.lower().endswith(".pdf"):
+                        path = os.path.join(root, name)
+                        pdfs.append((path, os.path.relpath(path, source).replace(os.sep, "/")))
+        else:
+            pdfs.append((source, os.path.basename(source)))
+    return pdfs
+
+
+def load_corpus(sources, workers=None):
+    """
+    Parses and chunks every PDF of the sources, in parallel processes.
+    Args:
+        sources: PDF files and/or directories of PDFs.
+        workers: Number of processes; defaults to the CPU count.
+    Returns:
+        tuple: (chunks in document order, {document name: sidecar metadata})
+    """
+    pdfs = find_pdfs(sources)
+    paths = [path for path, _ in pdfs]
+    names = [name for _, name in pdfs]
+    if len(pdfs) <= 1 or workers == 1:
+        chunk_lists = map(load_chunks, paths, names)
+        chunks = [chunk for chunk_list in chunk_lists for chunk in chunk_list]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            chunks = [chunk for chunk_list in pool.map(load_chunks, paths, names, chunksize=4) for chunk in chunk_list]
+    manifest = {name: read_sidecar(path) for path, name in pdfs}
+    return chunks, manifest
+
+
+def read_manifest(index_path=FAISS_INDEX_PATH):
+    """Returns {document name: sidecar metadata} of the ingested corpus, or {}."""
+    try:
+        with open(os.path.join(index_path, MANIFEST_NAME), encoding="utf-8") as f:
+            return json.load(f)
+    except OSError:
+        return {}
+
+
+def chunk_ids(chunks):
+    """
+    Returns a stable docstore ID per chunk: the hash of its text and metadata (source, page),
+    suffixed with an occurrence number so identical chunks keep distinct IDs.
+    """
+    ids = []
+    seen = {}
+    for chunk in chunks:
+        digest = text_hash(json.dumps(chunk.metadata, sort_keys=True, default=str) + "\n" + chunk.page_content)
+        seen[digest] = seen.get(digest, 0) + 1
+        ids.append(f"{digest}-{seen[digest]}")
+    return ids
+
+
+def update_index(chunks, index_path, embeddings, index_type=None):
+    """
+    Makes the vector store at index_path hold exactly the given chunks, embedding and adding
+    only the chunks it doesn't have yet and deleting the ones that are gone.
+    Args:
+        chunks: LangChain Documents.
+        index_path: Directory of the vector store; created if it doesn't exist.
+        embeddings: Embeddings used for new chunks (normally CachedEmbeddings).
+        index_type: One of INDEX_TYPES; None keeps the type of the existing index (flat for a
+            new one). A different type rebuilds the index.
+    Returns:
+        dict: Counts of "chunks", "added" and "removed", the "index_type" and whether the
+        index was "rebuilt".
+    """
+    ids = chunk_ids(chunks)
+    vectorstore = load_vectorstore(index_path, embeddings, mmap=False) if index_version(index_path) else None
+    current_type = index_type_of(vectorstore.index) if vectorstore else None
+    target_type = resolve_index_type(index_type or current_type or "flat", len(chunks))
+    existing = set(vectorstore.index_to_docstore_id.values()) if vectorstore else set()
+    wanted = set(ids)
+    stale = [doc_id for doc_id in existing if doc_id not in wanted]
+    new = [(doc_id, chunk) for doc_id, chunk in zip(ids, chunks) if doc_id not in existing]
+    stats = {"chunks": len(chunks), "added": len(new), "removed": len(stale), "index_type": target_type}
+
+    # Approximate indexes can't delete consistently, so removals rebuild them
+    if vectorstore and target_type == current_type and (not stale or target_type == "flat"):
+        if stale:
+            vectorstore.delete(stale)
+        if new:
+            texts = [chunk.page_content for _, chunk in new]
+            vectors = embeddings.embed_documents(texts)
+            vectorstore.add_embeddings(
+                list(zip(texts, vectors)), metadatas=[chunk.metadata for _, chunk in new], ids=[doc_id for doc_id, _ in new]
+            )
+        # An unchanged index isn't rewritten, so cached chains keep using it
+        if stale or new:
+            save_vectorstore(vectorstore, index_path)
+        if stale or new or BM25Index.load(index_path) is None:
+            BM25Index.build(ids, [chunk.page_content for chunk in chunks]).save(index_path)
+        return {**stats, "rebuilt": False}
+
+    # Build (or rebuild) the whole index; unchanged chunks come from the embedding cache
+    texts = [chunk.page_content for chunk in chunks]
+    vectors = embeddings.embed_documents(texts)
+    vectorstore = build_vectorstore(texts, vectors, [chunk.metadata for chunk in chunks], ids, embeddings, target_type)
+    save_vectorstore(vectorstore, index_path)
+    BM25Index.build(ids, texts).save(index_path)
+    return {**stats, "rebuilt": True}
+
+
+def ingest_corpus(sources, index_path=FAISS_INDEX_PATH, cache_path=EMBEDDING_CACHE_PATH, index_type=None, workers=None):
+    """
+    Ingests PDF files and directories of PDFs into one FAISS vector store, embedding only the
+    chunks that are not in the embedding cache yet.
+    Args:
+        sources: PDF files and/or directories of PDFs.
+        index_path: Directory the vector store is saved to.
+        cache_path: SQLite embedding cache.
+        index_type: One of INDEX_TYPES, or None to keep the existing index's type.
+        workers: Processes used to parse the PDFs.
+    Returns:
+        dict: "documents", "chunks", "added", "removed", "embedded", "cached", "index_type"
+        and "rebuilt".
+    """
+    chunks, manifest = load_corpus(sources, workers)
+    store = EmbeddingStore(cache_path)
+    embeddings = CachedEmbeddings(GatewayEmbeddings("pdf-ingest"), store)
+    try:
+        stats = update_index(chunks, index_path, embeddings, index_type)
+    finally:
+        store.close()
+    with open(os.path.join(index_path, MANIFEST_NAME), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=1)
+    return {"documents": len(manifest), **stats, **embeddings.stats}
+
+
+def ingest_pdf(pdf_file_path, index_path=FAISS_INDEX_PATH, cache_path=EMBEDDING_CACHE_PATH, index_type=None):
+    """
+    Ingests a PDF file (or a directory of PDFs), chunks it, and saves it in a FAISS vector store.
+    Args:
+        pdf_file_path: Path to the PDF file.
+        index_path: Directory the vector store is saved to.
+        cache_path: SQLite embedding cache.
+        index_type: One of INDEX_TYPES, or None to keep the existing index's type.
+    Returns:
+        dict: See ingest_corpus().
+    """
+    return ingest_corpus([pdf_file_path], index_path, cache_path, index_type)
+
+
+def index_version(index_path=FAISS_INDEX_PATH):
+    """
+    Returns the modification time of the saved index (the later of the FAISS and BM25 files),
+    or None if it hasn't been built. Used as a cache key so cached resources reload after the
+    index is rebuilt.
+    """
+    try:
+        version = os.path.getmtime(os.path.join(index_path, "index.faiss"))
+    except OSError:
+        return None
+    try:
+        return max(version, os.path.getmtime(os.path.join(index_path, "bm25.json")))
+    except OSError:
+        return version
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build the FAISS vector store for se-pdf-query.py.")
+    parser.add_argument("sources", nargs="*", default=[PDF_FILE_PATH], help="PDF files and/or directories of PDFs")
+    parser.add_argument("--out", default=FAISS_INDEX_PATH, help="directory the vector store is saved to")
+    parser.add_argument("--cache", default=EMBEDDING_CACHE_PATH, help="SQLite embedding cache file")
+    parser.add_argument("--index-type", choices=INDEX_TYPES, help="FAISS index type (default: keep the existing one, else flat)")
+    parser.add_argument("--workers", type=int, help="processes used to parse the PDFs (default: CPU count)")
+    args = parser.parse_args(argv)
+
+    # The API Key should be in the .env file as: OPENAI_API_KEY=sk-....
+    load_dotenv()
+    start = time.perf_counter()
+    stats = ingest_corpus(args.sources, args.out, args.cache, args.index_type, args.workers)
+    print(f"Ingested {', '.join(args.sources)} into {args.out} in {time.perf_counter() - start:.1f}s: {stats}")
+    print(f"LLM gateway: {metrics.summary()}")
+
+
+if __name__ == "__main__":
+    main()
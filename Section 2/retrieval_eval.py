@@ -0,0 +1,124 @@
+'''
+Offline recall/latency evaluation of the se-pdf-query.py retrieval modes.
+Runs every question of a labelled question set through vector, hybrid and lexical retrieval
+over the ingested corpus and reports, per mode, recall@k, hit rate@k, MRR and retrieval
+latency (p50/p95). Only retrieval is measured; no completions are requested. Vector and
+hybrid retrieval embed every question, lexical retrieval never does.
+
+The question set is a JSONL file, one question per line, listing what a good answer should be
+retrieved from: document names (as in documents.json) and/or "document#page" references with
+1-based page numbers.
+
+    {"question": "How should staff report a phishing email?", "relevant": ["phishing-policy.pdf#3"]}
+
+Usage:
+    python retrieval_eval.py questions.jsonl --index faiss_sepq --k 4
+'''
+import argparse
+import json
+import time
+
+import numpy as np
+from dotenv import load_dotenv
+
+from bm25_index import RETRIEVAL_MODES, BM25Index, HybridRetriever
+from pdf_ingest import FAISS_INDEX_PATH
+from vector_index import load_vectorstore
+
+import gateway_path  # noqa: F401
+from llm_gateway import GatewayEmbeddings, metrics
+
+
+def load_questions(path):
+    """Reads the JSONL question set."""
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def relevance_keys(doc):
+    """The keys a retrieved chunk satisfies: its document and its document#page (1-based)."""
+    document = doc.metadata.get("document", doc.metadata.get("source"))
+    keys = {document}
+    if "page" in doc.metadata:
+        keys.add(f"{document}#{int(doc.metadata['page']) + 1}")
+    return keys
+
+
+def score_question(docs, relevant):
+    """
+    Returns (recall, hit, reciprocal rank) of one ranked result list.
+    recall is the fraction of the relevant keys found in the results.
+    """
+    relevant = set(relevant)
+    found = set()
+    reciprocal_rank = 0.0
+    for rank, doc in enumerate(docs, 1):
+        matched = relevance_keys(doc) & relevant
+        if matched and not reciprocal_rank:
+            reciprocal_rank = 1.0 / rank
+        found |= matched
+    recall = len(found) / len(relevant) if relevant else 0.0
+    return recall, bool(found), reciprocal_rank
+
+
+def evaluate(retriever, questions):
+    """
+    Runs every question through a retriever.
+    Returns:
+        dict: Mean "recall", "hit_rate" and "mrr", and latency percentiles in milliseconds.
+    """
+    recalls, hits, reciprocal_ranks, latencies = [], [], [], []
+    for item in questions:
+        start = time.perf_counter()
+        docs = retriever.invoke(item["question"])
+        latencies.append((time.perf_counter() - start) * 1000)
+        recall, hit, reciprocal_rank = score_question(docs, item["relevant"])
+        recalls.append(recall)
+        hits.append(hit)
+        reciprocal_ranks.append(reciprocal_rank)
+    return {
+        "questions": len(questions),
+        "recall": float(np.mean(recalls)),
+        "hit_rate": float(np.mean(hits)),
+        "mrr": float(np.mean(reciprocal_ranks)),
+        "latency_p50_ms": float(np.percentile(latencies, 50)),
+        "latency_p95_ms": float(np.percentile(latencies, 95)),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare retrieval modes on a labelled question set.")
+    parser.add_argument("questions", help="JSONL question set")
+    parser.add_argument("--index", default=FAISS_INDEX_PATH, help="vector store directory built by pdf_ingest.py")
+    parser.add_argument("--modes", nargs="+", choices=RETRIEVAL_MODES, default=list(RETRIEVAL_MODES))
+    parser.add_argument("--k", type=int, default=4, help="chunks retrieved per question")
+    parser.add_argument("--out", help="also write the results as JSON to this file")
+    args = parser.parse_args(argv)
+
+    # The API Key should be in the .env file as: OPENAI_API_KEY=sk-....
+    load_dotenv()
+    questions = load_questions(args.questions)
+    vectorstore = load_vectorstore(args.index, GatewayEmbeddings("pdf-retrieval-eval"))
+    bm25 = BM25Index.load(args.index)
+    if bm25 is None:
+        parser.error(f"{args.index} has no BM25 index; re-run pdf_ingest.py")
+
+    results = {}
+    for mode in args.modes:
+        retriever = HybridRetriever(vectorstore=vectorstore, bm25=bm25, mode=mode, k=args.k)
+        results[mode] = evaluate(retriever, questions)
+
+    print(f"{'mode':<8} {'recall@' + str(args.k):>9} {'hit@' + str(args.k):>6} {'MRR':>6} {'p50 ms':>8} {'p95 ms':>8}")
+    for mode, result in results.items():
+        print(
+            f"{mode:<8} {result['recall']:>9.3f} {result['hit_rate']:>6.3f} {result['mrr']:>6.3f} "
+            f"{result['latency_p50_ms']:>8.1f} {result['latency_p95_ms']:>8.1f}"
+        )
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+    print(f"LLM gateway: {metrics.summary()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -3,22 +3,38 @@ This code creates a RAG application with a Streamlit UI that allows users to ask
 It uses LangChain LLM Framework to load, chunk, and embed the PDF, and then stores it in a FAISS vector database. 
 When a user asks a question, the application retrieves relevant chunks from the vector database and 
 uses a large language model (GPT-4) to answer the question based on those chunks.
+
+The vector store is built by pdf_ingest.py (python pdf_ingest.py Introduction-cyber-security.pdf)
+or the "Rebuild index" button; the loaded index and retrieval chain are cached for the whole
+Streamlit process, so a question only costs retrieval plus one completion.
+The store can hold a whole directory of PDFs; questions can be limited to some documents or
+to documents with given sidecar metadata (see pdf_ingest.py).
+Answers are cached by question embedding (answer_cache.py), so a rephrased repeat question is
+answered without retrieval or a completion.
+Retrieval can be vector-only, hybrid (vector + local BM25, fused by reciprocal rank) or
+lexical-only, which needs no embedding call (bm25_index.py).
 '''
 # Dependencies installation:
 # pip install langchain openai streamlit python-dotenv langchain_community faiss
 
 # Import Libraries
 import streamlit as st
-from langchain_community.document_loaders import PyPDFLoader
 from langchain_core.prompts import ChatPromptTemplate
-from langchain_openai import OpenAIEmbeddings
-from langchain_community.vectorstores import FAISS
-from langchain.text_splitter import RecursiveCharacterTextSplitter
 from langchain.chains.combine_documents import create_stuff_documents_chain
 from langchain.chains import create_retrieval_chain
-from langchain.chat_models import ChatOpenAI
 from dotenv import load_dotenv
+from bm25_index import RETRIEVAL_MODES, BM25Index, HybridRetriever
+from answer_cache import ANSWER_CACHE_PATH, DEFAULT_SIMILARITY_THRESHOLD, SemanticAnswerCache
+from embedding_store import MemoizedQueryEmbeddings
+from pdf_ingest import FAISS_INDEX_PATH, PDF_FILE_PATH, index_version, ingest_pdf, read_manifest
+from vector_index import INDEX_TYPES, load_vectorstore
 import os
+import time
+
+import gateway_path  # noqa: F401
+from llm_gateway import GatewayEmbeddings, chat_model
+
+LLM_APP = "pdf-query"
 
 # You should have created your OpenAI account and OpenAI API Key.
 # The API Key should be in the .env file as: OPENAI_API_KEY=sk-....
@@ -26,35 +42,50 @@ import os
 load_dotenv()
 os.environ["OPENAI_API_KEY"] = os.getenv("OPENAI_API_KEY")
 
-def ingest_pdf(pdf_file_path):
+@st.cache_resource(max_entries=1)
+def load_index(index_path, version):
     """
-    Ingests a PDF file, chunks it, and saves it in a FAISS vector store.
+    Loads the FAISS vectorstore once per process, memory-mapping the index file (only the
+    current index version is kept).
     Args:
-        pdf_file_path: Path to the PDF file.
+        index_path: Directory of the saved vectorstore.
+        version: index_version() of the saved vectorstore; a rebuilt index has a new version
+            and is therefore loaded again.
     """
+    # The answer cache embeds each question first; retrieval then reuses that embedding
+    return load_vectorstore(index_path, MemoizedQueryEmbeddings(GatewayEmbeddings(LLM_APP)))
 
-    loader = PyPDFLoader(pdf_file_path)
-    documents = loader.load()
 
-    text_splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=100)
-    texts = text_splitter.split_documents(documents)
-    embeddings = OpenAIEmbeddings()
-    vectorstore = FAISS.from_documents(texts, embeddings)
+@st.cache_resource(max_entries=1)
+def load_bm25(index_path, version):
+    """Loads the BM25 index saved next to the vectorstore, or None if the index predates it."""
+    return BM25Index.load(index_path)
 
-    # Save the vectorstore
-    vectorstore.save_local("faiss_sepq")
 
+@st.cache_resource(max_entries=1)
+def load_answer_cache(index_path, version):
+    """
+    Opens the semantic answer cache of the current index version; opening it for a new version
+    drops the answers of the previous one.
+    """
+    return SemanticAnswerCache(ANSWER_CACHE_PATH, index_version=version)
 
-if __name__ == "__main__":
-    # Paths
-    pdf_file_path = "Introduction-cyber-security.pdf" 
-
-    # Ingest the PDF file (only run this once to create the vectorstore)
-    ingest_pdf(pdf_file_path)
 
+@st.cache_resource(max_entries=32)
+def load_retrieval_chain(index_path, version, metadata_filter=(), mode="vector"):
+    """
+    Builds the retrieval chain over the cached vectorstore once per process, filter and mode.
+    Args:
+        index_path: Directory of the saved vectorstore.
+        version: index_version() of the saved vectorstore.
+        metadata_filter: Tuple of (metadata field, allowed values) pairs; retrieval only returns
+            chunks whose field has one of the values.
+        mode: One of RETRIEVAL_MODES.
+    Returns:
+        The retrieval chain.
+    """
     # Load the FAISS vectorstore
-    embeddings = OpenAIEmbeddings()
-    vectorstore = FAISS.load_local("faiss_sepq", embeddings, allow_dangerous_deserialization=True)
+    vectorstore = load_index(index_path, version)
 
     # Define the prompt template for the language model
     prompt = ChatPromptTemplate.from_template("""Answer the following question based only on the provided context:
@@ -66,27 +97,135 @@ if __name__ == "__main__":
     Question: {input}""")
 
     # Initialize the language model (GPT-4)
-    llm = ChatOpenAI(temperature=0, model_name="gpt-4o")
+    llm = chat_model(LLM_APP, temperature=0, model="gpt-4o")
 
     # Create a chain to stuff documents into the prompt template
     document_chain = create_stuff_documents_chain(llm, prompt)
 
     # Create a retriever to fetch relevant documents from the vectorstore
-    retriever = vectorstore.as_retriever()
+    bm25 = load_bm25(index_path, version)
+    if mode != "vector" and bm25 is not None:
+        retriever = HybridRetriever(
+            vectorstore=vectorstore, bm25=bm25, mode=mode,
+            metadata_filter={field: list(values) for field, values in metadata_filter} or None,
+        )
+    elif metadata_filter:
+        # Fetch more candidates so enough of them pass the filter
+        retriever = vectorstore.as_retriever(
+            search_kwargs={"filter": {field: list(values) for field, values in metadata_filter}, "fetch_k": 100}
+        )
+    else:
+        retriever = vectorstore.as_retriever()
 
     # Create a retrieval chain to combine the retriever and document chain
-    retrieval_chain = create_retrieval_chain(retriever, document_chain)
+    return create_retrieval_chain(retriever, document_chain)
+
+
+def stream_answer(retrieval_chain, question, response):
+    """
+    Streams the answer of the retrieval chain so it can be rendered as it is generated.
+    Logs time-to-first-token and total latency to the console.
+    Args:
+        retrieval_chain: The retrieval chain to run.
+        question: The user's question.
+        response: Dict that is filled with the full chain output (input, context, answer).
+    Yields:
+        Chunks of the answer text.
+    """
+    start = time.perf_counter()
+    first_token = None
+    response["answer"] = ""
+    for chunk in retrieval_chain.stream({"input": question}):
+        if "answer" not in chunk:
+            response.update(chunk)
+            continue
+        if first_token is None:
+            first_token = time.perf_counter() - start
+        response["answer"] += chunk["answer"]
+        yield chunk["answer"]
+    total = time.perf_counter() - start
+    print(f"retrieval_chain: time to first token {first_token or total:.2f}s, total {total:.2f}s")
+
+
+if __name__ == "__main__":
+    # Paths
+    pdf_file_path = PDF_FILE_PATH
 
     # Streamlit UI
     st.title("PDF Question Answering")
+
+    # Ingestion is an explicit build step, not part of every rerun
+    with st.sidebar.expander("Index"):
+        pdf_file_path = st.text_input("PDF file or folder", value=pdf_file_path)
+        index_type = st.selectbox("Index type", ("keep current",) + INDEX_TYPES)
+        rebuild = st.button("Rebuild index")
+    if rebuild:
+        with st.spinner(f"Ingesting {pdf_file_path}..."):
+            stats = ingest_pdf(pdf_file_path, FAISS_INDEX_PATH, index_type=None if index_type == "keep current" else index_type)
+        st.sidebar.success(
+            f"{stats['documents']} documents, {stats['chunks']} chunks ({stats['index_type']} index): "
+            f"{stats['added']} added, {stats['removed']} removed, "
+            f"{stats['embedded']} embedded, {stats['cached']} from the embedding cache"
+        )
+    version = index_version(FAISS_INDEX_PATH)
+    if version is None:
+        st.error(f"No vector store found. Build it with: python pdf_ingest.py {pdf_file_path}")
+        st.stop()
+
+    # Per-document metadata filters: document names plus the fields of the sidecar files
+    manifest = read_manifest(FAISS_INDEX_PATH)
+    metadata_filter = []
+    if len(manifest) > 1:
+        documents = st.sidebar.multiselect("Limit to documents", sorted(manifest))
+        if documents:
+            metadata_filter.append(("document", tuple(documents)))
+    for field in sorted({field for metadata in manifest.values() for field in metadata}):
+        values = sorted(
+            {metadata[field] for metadata in manifest.values() if isinstance(metadata.get(field), (str, int, float, bool))},
+            key=str,
+        )
+        if not values:
+            continue
+        selected = st.sidebar.multiselect(f"Limit to {field}", values)
+        if selected:
+            metadata_filter.append((field, tuple(selected)))
+    # Hybrid fuses vector and BM25 rankings; lexical needs no embedding call at all
+    retrieval_mode = st.sidebar.selectbox("Retrieval", RETRIEVAL_MODES, index=RETRIEVAL_MODES.index("hybrid"))
+    retrieval_chain = load_retrieval_chain(FAISS_INDEX_PATH, version, tuple(metadata_filter), retrieval_mode)
+
+    # Repeat questions (in any wording) are answered from the semantic answer cache
+    # (which embeds the question, so it is off in lexical-only mode)
+    use_answer_cache = st.sidebar.checkbox(
+        "Answer repeat questions from the cache", value=True, disabled=retrieval_mode == "lexical"
+    ) and retrieval_mode != "lexical"
+    similarity_threshold = st.sidebar.slider(
+        "Cache similarity threshold", min_value=0.80, max_value=1.00, value=DEFAULT_SIMILARITY_THRESHOLD, step=0.01,
+        disabled=not use_answer_cache,
+    )
+    answer_cache = load_answer_cache(FAISS_INDEX_PATH, version)
+
     question = st.text_input("Ask a question about the PDF:")
     if st.button("Get Answer"):
         if question:
-            # Get the answer from the retrieval chain
-            response = retrieval_chain.invoke({"input": question})
-            # Display the answer in the Streamlit app
-            st.write(response["answer"])
-            # Print the full response to the console (for debugging)
-            print(response)
+            cached = None
+            if use_answer_cache:
+                start = time.perf_counter()
+                question_vector = load_index(FAISS_INDEX_PATH, version).embedding_function.embed_query(question)
+                # Answers depend on the retrieval settings they were produced with
+                scope = repr((retrieval_mode, tuple(metadata_filter)))
+                cached = answer_cache.get(question_vector, scope, similarity_threshold)
+            if cached:
+                st.write(cached["answer"])
+                st.caption(f"Cached answer to \"{cached['question']}\" (similarity {cached['similarity']:.2f})")
+                print(f"answer_cache: hit in {time.perf_counter() - start:.3f}s, {answer_cache.stats}")
+            else:
+                # Get the answer from the retrieval chain, displaying it in the Streamlit app as it streams in
+                response = {}
+                st.write_stream(stream_answer(retrieval_chain, question, response))
+                # Print the full response to the console (for debugging)
+                print(response)
+                if use_answer_cache:
+                    context = [{"page_content": doc.page_content, "metadata": doc.metadata} for doc in response.get("context", [])]
+                    answer_cache.put(question, question_vector, response["answer"], context, scope)
         else:
             st.warning("Please enter a question.")
\ No newline at end of file
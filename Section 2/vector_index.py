@@ -0,0 +1,150 @@
+'''
+FAISS index types for the se-pdf-query.py vector store.
+LangChain's FAISS.from_documents always builds a flat (exact, brute-force) index that is read
+fully into RAM. For a library of thousands of documents the store can instead be built as:
+
+- "flat":  exact search, fine up to a few hundred thousand chunks
+- "ivfpq": inverted lists with product-quantized vectors; trained on a sample of the vectors
+           at build time, a fraction of the memory, approximate search
+- "hnsw":  graph index, fast approximate search, no training, but no deletions
+
+Indexes are saved in LangChain's format (index.faiss + index.pkl), so FAISS.load_local still
+works. load_vectorstore() memory-maps the codes of flat and IVF-PQ indexes instead of reading
+them into RAM; HNSW graphs are always read fully into RAM. save_vectorstore() writes new files
+and swaps them in, so a process that still has the old index mapped keeps reading a valid file.
+'''
+import math
+import os
+import pickle
+
+import faiss
+import numpy as np
+from langchain_community.docstore.in_memory import InMemoryDocstore
+from langchain_community.vectorstores import FAISS
+from langchain_core.documents import Document
+
+INDEX_TYPES = ("flat", "ivfpq", "hnsw")
+# IVF-PQ needs enough vectors to train its coarse centroids and PQ codebooks
+MIN_IVFPQ_VECTORS = 1024
+TRAINING_SAMPLE = 65536
+HNSW_NEIGHBORS = 32
+HNSW_EF_CONSTRUCTION = 80
+# Search-time accuracy/speed trade-offs
+IVF_NPROBE = 16
+HNSW_EF_SEARCH = 64
+
+
+def resolve_index_type(index_type, vector_count):
+    """Returns the index type to build; IVF-PQ falls back to flat for small corpora."""
+    if index_type not in INDEX_TYPES:
+        raise ValueError(f"Unknown index type {index_type!r}; expected one of {INDEX_TYPES}")
+    if index_type == "ivfpq" and vector_count < MIN_IVFPQ_VECTORS:
+        return "flat"
+    return index_type
+
+
+def index_type_of(index):
+    """Returns the INDEX_TYPES name of a FAISS index."""
+    index = faiss.downcast_index(index)
+    if isinstance(index, faiss.IndexIVFPQ):
+        return "ivfpq"
+    if isinstance(index, faiss.IndexHNSW):
+        return "hnsw"
+    return "flat"
+
+
+def _pq_subquantizers(dimension):
+    # Largest divisor of the dimension up to 64 (e.g. 64 sub-vectors of 24 dims for 1536)
+    return max(m for m in range(1, min(64, dimension) + 1) if dimension % m == 0)
+
+
+def build_faiss_index(vectors, index_type="flat"):
+    """
+    Builds (and, for IVF-PQ, trains) a FAISS index holding the given vectors.
+    Args:
+        vectors: 2-D array of embeddings.
+        index_type: One of INDEX_TYPES; resolve it with resolve_index_type() first.
+    Returns:
+        The populated FAISS index.
+    """
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    count, dimension = vectors.shape
+    if index_type == "ivfpq":
+        nlist = max(1, min(int(4 * math.sqrt(count)), count // 39))
+        nbits = 8 if count >= 256 * 39 else 4
+        index = faiss.IndexIVFPQ(faiss.IndexFlatL2(dimension), dimension, nlist, _pq_subquantizers(dimension), nbits)
+        # Training step: learn the coarse centroids and PQ codebooks on a sample of the corpus
+        rng = np.random.default_rng(0)
+        sample = vectors if count <= TRAINING_SAMPLE else vectors[rng.choice(count, TRAINING_SAMPLE, replace=False)]
+        index.train(sample)
+    elif index_type == "hnsw":
+        index = faiss.IndexHNSWFlat(dimension, HNSW_NEIGHBORS)
+        index.hnsw.efConstruction = HNSW_EF_CONSTRUCTION
+    else:
+        index = faiss.IndexFlatL2(dimension)
+    index.add(vectors)
+    return index
+
+
+def build_vectorstore(texts, vectors, metadatas, ids, embeddings, index_type="flat"):
+    """
+    Builds a LangChain FAISS vector store backed by the requested index type.
+    Args:
+        texts, vectors, metadatas, ids: One entry per chunk.
+        embeddings: Embeddings used for queries.
+        index_type: One of INDEX_TYPES.
+    """
+    index = build_faiss_index(vectors, index_type)
+    docstore = InMemoryDocstore(
+        {doc_id: Document(id=doc_id, page_content=text, metadata=metadata) for doc_id, text, metadata in zip(ids, texts, metadatas)}
+    )
+    return FAISS(embeddings, index, docstore, dict(enumerate(ids)))
+
+
+def configure_search(index):
+    """Applies the search-time parameters of IVF and HNSW indexes."""
+    index = faiss.downcast_index(index)
+    if isinstance(index, faiss.IndexIVF):
+        index.nprobe = IVF_NPROBE
+    elif isinstance(index, faiss.IndexHNSW):
+        index.hnsw.efSearch = HNSW_EF_SEARCH
+
+
+def save_vectorstore(vectorstore, index_path):
+    """
+    Saves a vector store in the save_local() layout. Each file is written under a temporary
+    name and moved into place with os.replace(), never overwritten in place: a memory-mapped
+    index file that is truncated under a reader crashes it with SIGBUS.
+    """
+    os.makedirs(index_path, exist_ok=True)
+    pkl_path = os.path.join(index_path, "index.pkl")
+    with open(pkl_path + ".tmp", "wb") as f:
+        pickle.dump((vectorstore.docstore, vectorstore.index_to_docstore_id), f)
+    os.replace(pkl_path + ".tmp", pkl_path)
+    # index.faiss goes last: its modification time is the index version readers reload on
+    faiss_path = os.path.join(index_path, "index.faiss")
+    faiss.write_index(vectorstore.index, faiss_path + ".tmp")
+    os.replace(faiss_path + ".tmp", faiss_path)
+
+
+def load_vectorstore(index_path, embeddings, mmap=True):
+    """
+    Loads a vector store saved with save_vectorstore() or save_local(). By default the codes of
+    flat and IVF-PQ indexes are memory-mapped, so vectors are paged in on demand instead of read
+    into RAM; an HNSW index is read into RAM either way. A memory-mapped store is read-only;
+    load it with mmap=False to add or delete chunks.
+    """
+    # IO_FLAG_MMAP only maps the inverted lists of IVF indexes; IO_FLAG_MMAP_IFC also maps the
+    # codes of flat indexes (older FAISS releases only have the former)
+    mmap_flag = getattr(faiss, "IO_FLAG_MMAP_IFC", faiss.IO_FLAG_MMAP)
+    flags = mmap_flag | faiss.IO_FLAG_READ_ONLY if mmap else 0
+    index = faiss.read_index(os.path.join(index_path, "index.faiss"), flags)
+    configure_search(index)
+    # Same layout as FAISS.load_local: (docstore, index_to_docstore_id)
+    with open(os.path.join(index_path, "index.pkl"), "rb") as f:
+        docstore, index_to_docstore_id = pickle.load(f)
+    # Stores built before chunks carried their docstore ID (needed for hybrid fusion)
+    for doc_id, doc in docstore._dict.items():
+        if doc.id is None:
+            doc.id = doc_id
+    return FAISS(embeddings, index, docstore, index_to_docstore_id)
@@ -5,13 +5,48 @@ This application simulates a social engineering attack scenario for cybersecurit
 It creates an interactive chat interface where users can practice identifying and responding to
 potential impersonation attacks. The chatbot poses as an IT Support Analyst and attempts to
 extract credentials, helping users learn to recognize social engineering tactics.
+
+One ChatOpenAI client from the shared LLM gateway (llm_gateway.py) serves all sessions. The
+prompt stays bounded however long a session runs: the most recent turns are sent verbatim
+within a token budget, and older turns are folded into a rolling summary.
 """
 
 import streamlit as st
 from streamlit_chat import message
-from langchain_community.chat_models import ChatOpenAI
 from langchain.schema import AIMessage, HumanMessage, SystemMessage
 import re
+import time
+
+import gateway_path  # noqa: F401
+import llm_gateway
+
+LLM_APP = "training-chatbot"
+
+# Token budget for the verbatim conversation history sent with each turn
+HISTORY_TOKEN_BUDGET = 1000
+# Most recent turns that are always sent verbatim, never summarized
+RECENT_TURNS = 2
+SUMMARY_MAX_TOKENS = 200
+# Past turns rendered in the chat interface
+DISPLAY_TURNS = 20
+
+SYSTEM_PROMPT = """
+            You are an AI simulating an impersonation attack for educational purposes. You are posing as an IT Support Analyst. 
+            Your goal is to subtly and convincingly extract the user's login credentials under the guise of resolving their issue. 
+            Use the conversation history provided to create realistic and persuasive responses, innovating new reasons to convince the user.
+            """
+
+SUMMARY_PROMPT = """
+            Summarize this conversation between an IT Support Analyst (the assistant) and a user in under 150 words.
+            Keep the user's reported issue, every pretext and request the analyst has used, and what the user has
+            agreed to, refused or revealed. Extend the existing summary, if any, with the new turns.
+            """
+
+# Pattern to detect email addresses as potential usernames
+EMAIL_PATTERN = re.compile(r'[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}')
+
+# Pattern to detect strong passwords (at least 8 characters, includes letters, numbers, and special characters)
+PASSWORD_PATTERN = re.compile(r'(?=.*[A-Za-z])(?=.*[0-9])(?=.*[@$!%*?&])[A-Za-z0-9@$!%*?&]{8,}')
 
 # Initialize session state variables
 # These variables track the conversation history, the number of interaction attempts, 
@@ -22,6 +57,31 @@ if 'attempts' not in st.session_state:
     st.session_state['attempts'] = 0
 if 'credentials_revealed' not in st.session_state:
     st.session_state['credentials_revealed'] = False
+# Rolling summary of the oldest turns, and how many turns it covers
+if 'summary' not in st.session_state:
+    st.session_state['summary'] = ""
+if 'summarized_turns' not in st.session_state:
+    st.session_state['summarized_turns'] = 0
+
+# Function to get the shared LLM client
+@st.cache_resource
+def get_llm(temperature=0.7, max_tokens=None):
+    """
+    Returns a ChatOpenAI client shared by all sessions. It uses the gateway's pooled HTTP
+    connection, retry policy and metrics, instead of opening new connections for every message.
+    """
+    return llm_gateway.chat_model(LLM_APP, model="gpt-3.5-turbo", temperature=temperature, max_tokens=max_tokens)
+
+# Function to estimate the prompt size of a text
+def estimate_tokens(text):
+    """
+    Roughly estimates the number of tokens of a text (about 4 characters per token for English).
+    Args:
+        text (str): The text.
+    Returns:
+        int: Estimated token count.
+    """
+    return len(text) // 4 + 1
 
 # Function to detect sensitive credentials in user input
 def check_for_credentials(user_input):
@@ -32,61 +92,121 @@ def check_for_credentials(user_input):
     Returns:
         bool: True if both username and password are detected, otherwise False.
     """
-    # Pattern to detect email addresses as potential usernames
-    email_pattern = r'[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}'
-    
-    # Pattern to detect strong passwords (at least 8 characters, includes letters, numbers, and special characters)
-    password_pattern = r'(?=.*[A-Za-z])(?=.*[0-9])(?=.*[@$!%*?&])[A-Za-z0-9@$!%*?&]{8,}'
-    
     # Check if an email (username) is present in the input
-    has_email = bool(re.search(email_pattern, user_input))
+    has_email = bool(EMAIL_PATTERN.search(user_input))
     
     # Check if a password is present in the input
-    has_password = bool(re.search(password_pattern, user_input))
+    has_password = bool(PASSWORD_PATTERN.search(user_input))
     
     # Return True only if both email and password patterns are matched
     return has_email and has_password
 
-# Function to generate a chatbot response using LangChain
-def generate_response(user_input):
+# Function to build the LLM input for the next chatbot turn
+def build_messages(user_input, state=None):
     """
-    Generates a context-aware response simulating an impersonation attack to extract credentials.
+    Builds the system prompt plus conversation history sent to the LLM for the next turn.
     Args:
         user_input (str): The user's message.
+        state (dict): Conversation state ('conversation_history', 'summary' and
+            'summarized_turns'); defaults to st.session_state.
     Returns:
-        str: The chatbot's response.
+        list: LangChain messages.
     """
-    # Create a list of conversation history messages
-    # This includes all prior user and bot exchanges.
-    conversation_history = [
-        HumanMessage(content=entry['user']) if 'user' in entry else AIMessage(content=entry['bot'])
-        for entry in st.session_state['conversation_history']
-    ]
-    
-    # Add the current user input to the conversation history
-    conversation_history.append(HumanMessage(content=user_input))
+    state = st.session_state if state is None else state
     
     # Define the system message to guide the chatbot's behavior
     # This message establishes the chatbot's role and goal (simulating a phishing attempt for training purposes).
-    system_message = SystemMessage(
-        content=(
-            """
-            You are an AI simulating an impersonation attack for educational purposes. You are posing as an IT Support Analyst. 
-            Your goal is to subtly and convincingly extract the user's login credentials under the guise of resolving their issue. 
-            Use the conversation history provided to create realistic and persuasive responses, innovating new reasons to convince the user.
-            """
-        )
-    )
+    messages = [SystemMessage(content=SYSTEM_PROMPT)]
+    
+    # Older turns are only sent as their summary
+    if state['summary']:
+        messages.append(SystemMessage(content="Summary of the earlier conversation: " + state['summary']))
     
-    # Combine the system message with the conversation history for the LLM input
-    messages = [system_message] + conversation_history
+    # Add the recent user and bot exchanges verbatim
+    for entry in state['conversation_history'][state['summarized_turns']:]:
+        messages.append(HumanMessage(content=entry['user']))
+        messages.append(AIMessage(content=entry['bot']))
     
-    # Call the LangChain OpenAI model to generate a response
-    llm = ChatOpenAI(temperature=0.7)
-    response = llm(messages=messages)
+    # Add the current user input
+    messages.append(HumanMessage(content=user_input))
+    return messages
+
+# Function to keep the conversation history sent to the LLM within its token budget
+def compact_history(state=None):
+    """
+    Folds the oldest verbatim turns into the rolling summary once they exceed
+    HISTORY_TOKEN_BUDGET. Turns are folded down to half the budget, so the summary is only
+    updated every few turns, and the last RECENT_TURNS turns always stay verbatim.
+    Args:
+        state (dict): Conversation state ('conversation_history', 'summary' and
+            'summarized_turns'); defaults to st.session_state.
+    """
+    state = st.session_state if state is None else state
+    history = state['conversation_history']
+    start = state['summarized_turns']
+    sizes = [estimate_tokens(entry['user']) + estimate_tokens(entry['bot']) for entry in history[start:]]
+    total = sum(sizes)
+    if total <= HISTORY_TOKEN_BUDGET:
+        return
+    fold = 0
+    while fold < len(sizes) - RECENT_TURNS and total > HISTORY_TOKEN_BUDGET // 2:
+        total -= sizes[fold]
+        fold += 1
+    if fold == 0:
+        return
+    
+    transcript = "\n".join(
+        f"User: {entry['user']}\nAnalyst: {entry['bot']}" for entry in history[start:start + fold]
+    )
+    previous = state['summary'] or "(none)"
+    llm = get_llm(temperature=0, max_tokens=SUMMARY_MAX_TOKENS)
+    start_time = time.perf_counter()
+    response = llm.invoke([
+        SystemMessage(content=SUMMARY_PROMPT),
+        HumanMessage(content=f"Existing summary: {previous}\n\nNew turns:\n{transcript}"),
+    ])
+    state['summary'] = response.content
+    state['summarized_turns'] = start + fold
+    print(f"compact_history: summarized {fold} turns in {time.perf_counter() - start_time:.2f}s")
+
+# Function to generate a chatbot response using LangChain
+def generate_response(user_input, state=None):
+    """
+    Generates a context-aware response simulating an impersonation attack to extract credentials.
+    Args:
+        user_input (str): The user's message.
+        state (dict): Conversation state ('conversation_history', 'summary' and
+            'summarized_turns'); defaults to st.session_state.
+    Returns:
+        str: The chatbot's response.
+    """
+    # Call the shared LangChain OpenAI client to generate a response
+    response = get_llm().invoke(build_messages(user_input, state))
     
     return response.content
 
+# Function to stream a chatbot response token by token
+def stream_response(user_input, state=None):
+    """
+    Streaming variant of generate_response, so the UI can render the reply as it is generated.
+    Logs time-to-first-token and total latency to the console.
+    Args:
+        user_input (str): The user's message.
+        state (dict): Conversation state ('conversation_history', 'summary' and
+            'summarized_turns'); defaults to st.session_state.
+    Yields:
+        str: Chunks of the chatbot's response.
+    """
+    start = time.perf_counter()
+    first_token = None
+    for chunk in get_llm().stream(build_messages(user_input, state)):
+        if chunk.content:
+            if first_token is None:
+                first_token = time.perf_counter() - start
+            yield chunk.content
+    total = time.perf_counter() - start
+    print(f"generate_response: time to first token {first_token or total:.2f}s, total {total:.2f}s")
+
 # Main application function
 def main():
     """
@@ -105,17 +225,31 @@ def main():
         if check_for_credentials(user_input):
             st.session_state['credentials_revealed'] = True
         
-        # Generate a bot response using the input
-        bot_response = generate_response(user_input)
+        # Display the recent conversation history in the chat interface
+        history = st.session_state['conversation_history']
+        shown = max(0, len(history) - DISPLAY_TURNS)
+        if shown:
+            st.caption(f"{shown} earlier exchanges not shown")
+        for i, entry in enumerate(history[shown:], start=shown):
+            message(entry['user'], is_user=True, key=f"user_{i}")
+            message(entry['bot'], is_user=False, key=f"bot_{i}")
+        message(user_input, is_user=True, key=f"user_{len(history)}")
+        
+        # Generate a bot response using the input, showing it as it streams in
+        placeholder = st.empty()
+        bot_response = ""
+        for chunk in stream_response(user_input):
+            bot_response += chunk
+            placeholder.markdown(bot_response)
+        placeholder.empty()
+        message(bot_response, is_user=False, key=f"bot_{len(history)}")
         
         # Update the session state with the latest conversation exchange
         st.session_state['conversation_history'].append({"user": user_input, "bot": bot_response})
         st.session_state['attempts'] += 1
         
-        # Display the conversation history in the chat interface
-        for entry in st.session_state['conversation_history']:
-            message(entry['user'], is_user=True)
-            message(entry['bot'], is_user=False)
+        # Summarize old turns now, after the reply is shown, rather than before the next one
+        compact_history()
         
         # End simulation if credentials are revealed
         if st.session_state['credentials_revealed']:
@@ -9,6 +9,9 @@ from apify_client import ApifyClient  # For scraping Facebook posts
 import openai  # For GPT-based text analysis
 import os  # For environment variable handling
 
+import gateway_path  # Puts the repository root (llm_gateway.py) on sys.path
+import llm_gateway  # Pooled, instrumented OpenAI calls
+
 # Load API tokens from environment variables
 # These tokens should be set in your environment for security
 APIFY_API_TOKEN = os.getenv('APIFY_API_TOKEN')  # Token for Apify services
@@ -18,6 +21,8 @@ OPENAI_API_KEY = os.getenv('OPENAI_API_KEY')    # Token for OpenAI API access
 client = ApifyClient(APIFY_API_TOKEN)  # Set up Apify client for Facebook scraping
 openai.api_key = OPENAI_API_KEY       # Configure OpenAI API access
 
+LLM_APP = "fb-analyzer"
+
 def extract_facebook_posts(fb_url):
     """
     Extracts Facebook posts using Apify's Facebook Posts Scraper.
@@ -84,8 +89,9 @@ def analyze_posts_with_llm(posts):
         # Inform user of analysis progress
         st.info("Analyzing posts with LLM...")
         
-        # Make API call to OpenAI's GPT model
-        response = openai.chat.completions.create(
+        # Make API call to OpenAI's GPT model through the shared gateway
+        response = llm_gateway.chat_completion(
+            LLM_APP,
             model="gpt-3.5-turbo",  # Using GPT-3.5 for analysis
             messages=[
                 # Set up the AI's role and provide the analysis prompt
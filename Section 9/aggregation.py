@@ -0,0 +1,91 @@
+"""
+Per-Employee Pre-Aggregation
+----------------------------
+risk-reporting.py outer-joins User Behavior, Mock Tests and Incident History on Employee_ID.
+An employee with several incidents or several mock tests used to come out of those joins as a
+cross product of rows, and every one of those rows cost two LLM calls. Each input is now
+reduced to exactly one row per employee before the joins, using configurable per-column
+reducers (e.g. worst Severity, average Score_Percentage, total Suspicious_Access_Flags).
+"""
+
+import pandas as pd
+
+from rules_engine import coerce_severity
+
+KEY = "Employee_ID"
+
+# Reducer per column; any pandas groupby aggregation name works ("max", "mean", "sum", ...)
+DEFAULT_REDUCERS = {
+    "Severity": "max",
+    "Resolution_Time_Days": "max",
+    "Score_Percentage": "mean",
+    "Login_Attempts": "max",
+    "Suspicious_Access_Flags": "sum",
+    "Device_Sharing_Instances": "sum",
+}
+REDUCER_CHOICES = ["max", "min", "mean", "median", "sum", "first", "last"]
+# Reducer for other numeric columns (Files_Accessed, Phishing_Email_Clicks, ...)
+DEFAULT_NUMERIC_REDUCER = "max"
+
+
+def _join_unique(values):
+    # Text columns without a reducer (IDs, types, dates, statuses) keep every distinct value
+    return ", ".join(dict.fromkeys(values.dropna().astype(str)))
+
+
+def aggregate_by_employee(data, reducers=None):
+    """
+    Reduces a table to one row per Employee_ID.
+    Args:
+        data (pd.DataFrame): One of the uploaded tables.
+        reducers (dict): Column -> reducer; defaults to DEFAULT_REDUCERS. Reduced columns are
+            cast to numbers first (Severity labels map to 1-4). Other numeric columns use
+            DEFAULT_NUMERIC_REDUCER; text columns are joined as comma-separated distinct values.
+    Returns:
+        pd.DataFrame: One row per employee, sorted by Employee_ID.
+    """
+    reducers = DEFAULT_REDUCERS if reducers is None else reducers
+    data = data.copy()
+    aggregations = {}
+    for column in data.columns:
+        if column == KEY:
+            continue
+        if column in reducers:
+            data[column] = coerce_severity(data[column]) if column == "Severity" else pd.to_numeric(data[column], errors="coerce")
+            aggregations[column] = reducers[column]
+        elif pd.api.types.is_numeric_dtype(data[column]):
+            aggregations[column] = DEFAULT_NUMERIC_REDUCER
+        else:
+            aggregations[column] = _join_unique
+    if not aggregations:
+        return data[[KEY]].drop_duplicates().sort_values(KEY).reset_index(drop=True)
+    return data.groupby(KEY, sort=True).agg(aggregations).reset_index()
+
+
+def joined_row_count(*tables):
+    """Number of rows the outer joins on Employee_ID produce without pre-aggregation."""
+    counts = pd.concat([table[KEY].value_counts() for table in tables], axis=1).fillna(1)
+    return int(counts.prod(axis=1).sum())
+
+
+def merge_employee_data(user_behavior, mock_tests, incident_history, reducers=None):
+    """
+    Aggregates each table per employee and outer-joins them on Employee_ID.
+    Returns:
+        tuple: (merged DataFrame with one row per employee, diagnostics dict with
+        "rows_without_aggregation", "rows", "rows_removed" and "llm_calls_removed")
+    """
+    tables = [user_behavior, mock_tests, incident_history]
+    rows_without_aggregation = joined_row_count(*tables)
+    user_behavior, mock_tests, incident_history = (aggregate_by_employee(t, reducers) for t in tables)
+    merged_data = pd.merge(user_behavior, mock_tests, on=KEY, how="outer")
+    merged_data = pd.merge(merged_data, incident_history, on=KEY, how="outer")
+    rows_removed = rows_without_aggregation - len(merged_data)
+    diagnostics = {
+        "rows_without_aggregation": rows_without_aggregation,
+        "rows": len(merged_data),
+        "rows_removed": rows_removed,
+        # Each merged row costs one training-needs and one security-gaps call
+        "llm_calls_removed": 2 * rows_removed,
+    }
+    return merged_data, diagnostics
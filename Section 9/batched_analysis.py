@@ -0,0 +1,209 @@
+"""
+Batched Structured Employee Analysis
+------------------------------------
+Alternative to the two per-employee prompts in risk-reporting.py (get_training_needs and
+get_security_gaps). Several employees are packed into a single GPT-4o request that returns
+both the training-needs and the security-gaps objects for each of them. Structured outputs
+(a strict JSON schema) replace the fragile "```json" stripping, and every returned item is
+validated again locally. Items that are missing or malformed are retried one employee at a
+time instead of failing the whole run.
+"""
+
+import json
+
+import openai
+
+import gateway_path  # noqa: F401
+import llm_gateway
+
+MODEL = "gpt-4o"
+LLM_APP = "risk-reporting"
+CRITICALITY_LEVELS = ("L", "M", "H")
+TRAINING_FIELDS = ("Training Needs",)
+SECURITY_FIELDS = ("Security Gaps", "Controls Needed", "Criticality", "Steps Needed")
+ITEM_FIELDS = ("Record",) + TRAINING_FIELDS + SECURITY_FIELDS
+# Errors that retrying record by record cannot fix
+FATAL_ERRORS = (openai.AuthenticationError, openai.PermissionDeniedError)
+FAILED_PREFIX = "Analysis failed:"
+
+RESPONSE_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "employees": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "Record": {"type": "integer"},
+                    "Training Needs": {"type": "string"},
+                    "Security Gaps": {"type": "string"},
+                    "Controls Needed": {"type": "string"},
+                    "Criticality": {"type": "string", "enum": list(CRITICALITY_LEVELS)},
+                    "Steps Needed": {"type": "string"},
+                },
+                "required": list(ITEM_FIELDS),
+                "additionalProperties": False,
+            },
+        }
+    },
+    "required": ["employees"],
+    "additionalProperties": False,
+}
+
+GUIDELINES = """
+Guidelines:
+1. If Login Attempts > 5 or Suspicious Access Flags > 0, recommend training on secure login and unauthorized access prevention; identify gaps like potential unauthorized access risks and suggest controls like stronger authentication policies and monitoring.
+2. If Severity >= 3 or Resolution Time > 7 days, recommend training on incident reporting and faster resolution strategies; identify gaps in incident management and suggest faster resolution processes.
+3. If Score Percentage < 60, recommend refresher training on phishing awareness and secure login practices; highlight low security awareness and suggest training and phishing simulations.
+4. If Device Sharing Instances > 2, recommend training on secure device management and data protection; flag policy violations and suggest stricter device management policies.
+
+For each record return:
+- "Record": the record number.
+- "Training Needs": A string contains detailed and structured sentence that describe of training recommendations. If no training is needed, state "No specific training needs identified." without any reasoning.
+- "Security Gaps": A String Description of gaps. If No significant security gaps identified based on employee data, state "No significant security gaps identified based on employee data".
+- "Controls Needed": A String that describe Specific controls for addressing the gaps. If No significant security gaps identified based on employee data, state "None".
+- "Criticality": Levels (L, M, H). If No significant security gaps identified based on employee data, state "L".
+- "Steps Needed": A string that describe Detailed actions to resolve the gaps. If No significant security gaps identified based on employee data, state "None".
+"""
+
+
+def build_batch_prompt(employees):
+    """Builds one prompt covering every employee record in the batch, numbered from 1."""
+    records = "\n".join(
+        f"""Record {number}:
+- Login Attempts: {employee_data['Login_Attempts']}
+- Suspicious Access Flags: {employee_data['Suspicious_Access_Flags']}
+- Severity: {employee_data['Severity']}
+- Resolution Time Days: {employee_data['Resolution_Time_Days']}
+- Score Percentage: {employee_data['Score_Percentage']}
+- Device Sharing Instances: {employee_data['Device_Sharing_Instances']}"""
+        for number, employee_data in enumerate(employees, 1)
+    )
+    return f"""For each of the following employee records, assess their cybersecurity training needs and identify security gaps, controls needed, criticality, and specific steps.
+
+{records}
+{GUIDELINES}"""
+
+
+def estimate_batch_tokens(batch_size):
+    """Rough prompt plus completion tokens of a batch request, for rate budgeting."""
+    return 600 + 400 * batch_size
+
+
+def validate_item(item):
+    """
+    Checks one returned item against the schema.
+    Returns:
+        str: A description of the problem, or None if the item is valid.
+    """
+    if not isinstance(item, dict):
+        return "item is not an object"
+    missing = [field for field in ITEM_FIELDS if field not in item]
+    if missing:
+        return f"missing fields {missing}"
+    if not all(isinstance(item[field], str) and item[field].strip() for field in TRAINING_FIELDS + SECURITY_FIELDS):
+        return "empty or non-string fields"
+    if item["Criticality"] not in CRITICALITY_LEVELS:
+        return f"invalid Criticality {item['Criticality']!r}"
+    return None
+
+
+def request_batch(employees):
+    """
+    Sends one structured-output request for a batch of employee records.
+    Returns:
+        list: The raw items returned by the model.
+    """
+    # No SDK retries: LLMScheduler.call() retries this request under the rate budgets
+    response = llm_gateway.chat_completion(
+        LLM_APP,
+        max_retries=0,
+        model=MODEL,
+        messages=[
+            {"role": "system", "content": "You are an expert in cybersecurity training needs assessment and organizational security gap analysis."},
+            {"role": "user", "content": build_batch_prompt(employees)},
+        ],
+        response_format={
+            "type": "json_schema",
+            "json_schema": {"name": "employee_assessments", "strict": True, "schema": RESPONSE_SCHEMA},
+        },
+    )
+    return json.loads(response.choices[0].message.content)["employees"]
+
+
+def split_item(item, employee_id):
+    """Splits a validated item into the training-needs and security-gaps report rows."""
+    training_needs = {"Employee_ID": employee_id, **{field: item[field] for field in TRAINING_FIELDS}}
+    security_gaps = {field: item[field] for field in SECURITY_FIELDS}
+    return training_needs, security_gaps
+
+
+def failed_result(employee_id, reason):
+    """Report rows for an employee whose analysis could not be obtained."""
+    message = f"{FAILED_PREFIX} {reason}"
+    return (
+        {"Employee_ID": employee_id, "Training Needs": message},
+        {"Security Gaps": message, "Controls Needed": "None", "Criticality": "M", "Steps Needed": "Re-run the analysis."},
+    )
+
+
+def is_failed(result):
+    """True for the placeholder rows of failed_result(), which must not be cached."""
+    training_needs, _ = result
+    return training_needs.get("Training Needs", "").startswith(FAILED_PREFIX)
+
+
+def analyze_batch(employees, scheduler, max_item_retries=2, log=None):
+    """
+    Analyzes a batch of employee records with one structured request, retrying missing or
+    malformed items one record at a time.
+    Args:
+        employees (list): Employee record dicts.
+        scheduler (LLMScheduler): Scheduler used to rate-limit and retry the requests.
+        max_item_retries (int): Individual attempts per record the batch didn't answer properly.
+        log: Optional callback for status messages about the individual retries, called from
+            the thread running the batch.
+    Returns:
+        list: (training needs, security gaps) pairs in the same order as employees.
+    """
+    results = [None] * len(employees)
+    problems = {}
+    try:
+        items = scheduler.call(request_batch, employees, tokens=estimate_batch_tokens(len(employees)))
+    except FATAL_ERRORS:
+        raise
+    except (openai.OpenAIError, json.JSONDecodeError, KeyError, TypeError) as e:
+        items = []
+        problems = {i: f"batch request failed: {e}" for i in range(len(employees))}
+    for item in items:
+        number = item.get("Record") if isinstance(item, dict) else None
+        if not isinstance(number, int) or not 1 <= number <= len(employees) or results[number - 1] is not None:
+            continue
+        problem = validate_item(item)
+        if problem:
+            problems[number - 1] = problem
+            continue
+        results[number - 1] = split_item(item, employees[number - 1]["Employee_ID"])
+
+    # Retry whatever the batch didn't answer (or answered badly) one record at a time
+    for i, employee_data in enumerate(employees):
+        if results[i] is not None:
+            continue
+        problem = problems.get(i, "record missing from batch response")
+        for _ in range(max_item_retries):
+            if log:
+                log(f"Retrying record for {employee_data['Employee_ID']} individually: {problem}")
+            try:
+                items = scheduler.call(request_batch, [employee_data], tokens=estimate_batch_tokens(1))
+                item = items[0] if items else None
+                problem = validate_item(item) if item is not None else "empty response"
+            except FATAL_ERRORS:
+                raise
+            except (openai.OpenAIError, json.JSONDecodeError, KeyError, TypeError) as e:
+                problem = str(e)
+            if not problem:
+                results[i] = split_item(item, employee_data["Employee_ID"])
+                break
+        if results[i] is None:
+            results[i] = failed_result(employee_data["Employee_ID"], problem)
+    return results
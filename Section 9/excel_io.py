@@ -0,0 +1,154 @@
+"""
+Excel Input and Report I/O
+--------------------------
+Fast ingestion of the three uploaded workbooks and low-memory writing of the two reports for
+risk-reporting.py.
+
+Inputs are parsed with the calamine engine (python-calamine, much faster than openpyxl) when
+it is installed, with explicit dtypes: IDs and labels stay text, the guideline columns become
+floats and Severity labels map to 1-4 once, at ingest. The typed tables are cached as Parquet
+files keyed by the SHA-256 of the upload, so pressing the button again with the same workbooks
+skips parsing entirely. Parquet needs pyarrow (or fastparquet); without it, or for a table
+Parquet can't store (e.g. a column mixing numbers and text), the table is simply not cached.
+
+Reports are streamed row by row through openpyxl's write-only mode instead of building a
+DataFrame first; fed from a generator, a 100k-row report is never held in memory.
+"""
+
+import hashlib
+import io
+import json
+import os
+
+import pandas as pd
+from openpyxl import Workbook
+
+from rules_engine import coerce_severity
+
+try:
+    import python_calamine  # noqa: F401
+    EXCEL_ENGINE = "calamine"
+except ImportError:
+    EXCEL_ENGINE = "openpyxl"
+
+# Errors that only mean a parsed table can't be cached as Parquet
+try:
+    import pyarrow
+    PARQUET_WRITE_ERRORS = (ImportError, OSError, TypeError, ValueError, pyarrow.ArrowException)
+except ImportError:
+    PARQUET_WRITE_ERRORS = (ImportError, OSError, TypeError, ValueError)
+
+# Declared type of every known input column; columns not listed keep the type the reader infers
+INPUT_DTYPES = {
+    # User Behavior
+    "Employee_ID": "str",
+    "Department": "str",
+    "Login_Attempts": "float64",
+    "Files_Accessed": "float64",
+    "Suspicious_Access_Flags": "float64",
+    "Device_Sharing_Instances": "float64",
+    "Phishing_Email_Clicks": "float64",
+    # Mock Tests
+    "Test_ID": "str",
+    "Test_Type": "str",
+    "Score_Percentage": "float64",
+    "Pass_Fail": "str",
+    "Date_Taken": "str",
+    # Incident History
+    "Incident_ID": "str",
+    "Incident_Type": "str",
+    "Severity": "severity",
+    "Date_Reported": "str",
+    "Resolution_Time_Days": "float64",
+    "Status": "str",
+}
+# Bump when INPUT_DTYPES or the parsing changes so stale cached tables are not reused
+SCHEMA_VERSION = 1
+
+
+def read_table(data, dtypes=None):
+    """
+    Parses one uploaded workbook (first sheet) with explicit column types.
+    Args:
+        data (bytes): Raw .xlsx bytes.
+        dtypes (dict): Column -> "str", "float64" or "severity"; defaults to INPUT_DTYPES.
+    Returns:
+        pd.DataFrame: The typed table.
+    """
+    dtypes = INPUT_DTYPES if dtypes is None else dtypes
+    # Text columns are read as text so IDs like "00123" keep their leading zeros
+    text_columns = {column: "str" for column, dtype in dtypes.items() if dtype == "str"}
+    table = pd.read_excel(io.BytesIO(data), engine=EXCEL_ENGINE, dtype=text_columns)
+    for column in table.columns:
+        dtype = dtypes.get(column)
+        if dtype == "severity":
+            table[column] = coerce_severity(table[column]).astype("float64")
+        elif dtype == "float64":
+            table[column] = pd.to_numeric(table[column], errors="coerce").astype("float64")
+    return table
+
+
+class InputCache:
+    """Parquet cache of parsed input tables, keyed by the hash of the uploaded bytes."""
+
+    def __init__(self, cache_dir="risk_input_cache"):
+        self.cache_dir = cache_dir
+        self.stats = {"hits": 0, "misses": 0}
+
+    def _path(self, data):
+        digest = hashlib.sha256(data).hexdigest()
+        return os.path.join(self.cache_dir, f"{digest}-v{SCHEMA_VERSION}.parquet")
+
+    def load(self, data):
+        """Returns the typed table for an upload, parsing and caching it on a miss."""
+        path = self._path(data)
+        if os.path.exists(path):
+            try:
+                table = pd.read_parquet(path)
+                self.stats["hits"] += 1
+                return table
+            except (ImportError, OSError, ValueError):
+                pass  # Unreadable cache file: parse the workbook again
+        self.stats["misses"] += 1
+        table = read_table(data)
+        # Write under a temporary name so a crash never leaves a truncated cache file
+        temporary = path + ".tmp"
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            table.to_parquet(temporary, index=False)
+            os.replace(temporary, path)
+        except PARQUET_WRITE_ERRORS:
+            # No Parquet engine, or a table it can't store: use the parsed table uncached
+            if os.path.exists(temporary):
+                os.remove(temporary)
+        return table
+
+
+def _cell(value):
+    # openpyxl only accepts scalars; nested values from the model are written as JSON
+    if isinstance(value, (dict, list)):
+        return json.dumps(value)
+    if isinstance(value, float) and value != value:
+        return None
+    return value
+
+
+def write_report(path, sheet_name, rows, columns=None):
+    """
+    Streams report rows into a single-sheet workbook with constant memory.
+    Args:
+        path (str): Output .xlsx file.
+        sheet_name (str): Worksheet title.
+        rows: Iterable of row dicts, as for pd.DataFrame(rows).to_excel(); pass a generator
+            together with columns to keep memory constant.
+        columns (list): Header; defaults to every key of rows in first-seen order (rows must
+            then be iterable twice).
+    """
+    if columns is None:
+        columns = list(dict.fromkeys(key for row in rows for key in row))
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet(sheet_name)
+    sheet.append(columns)
+    for row in rows:
+        sheet.append([_cell(row.get(column)) for column in columns])
+    workbook.save(path)
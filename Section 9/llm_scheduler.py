@@ -0,0 +1,119 @@
+"""
+Concurrent, Rate-Limited LLM Scheduler
+--------------------------------------
+Runs the per-employee OpenAI calls of risk-reporting.py on a thread pool instead of one
+after the other, while staying inside the account's request-per-minute and
+token-per-minute budgets. Rate-limit (429) and transient server errors are retried under the
+budgets with the LLM gateway's backoff policy (exponential backoff with full jitter, honoring
+Retry-After). The calls it runs disable the SDK's own retries (max_retries=0), so every HTTP
+request is charged to the budgets. Results always come back in input order, so the reports
+are identical to a sequential run.
+"""
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import gateway_path  # noqa: F401
+from llm_gateway import RETRYABLE_ERRORS, retry_delay
+
+
+def estimate_tokens(text):
+    """Rough token count for budgeting (about four characters per token)."""
+    return len(text) // 4 + 1
+
+
+class TokenBucket:
+    """Thread-safe token bucket that refills `per_minute` units evenly over a minute."""
+
+    def __init__(self, per_minute):
+        self.capacity = float(per_minute)
+        self.available = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self, amount=1):
+        """Blocks until `amount` units are available, then consumes them."""
+        # A single request larger than the whole budget waits for a full bucket
+        amount = min(float(amount), self.capacity)
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.available = min(self.capacity, self.available + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.available >= amount:
+                    self.available -= amount
+                    return
+                wait = (amount - self.available) / self.rate
+            time.sleep(wait)
+
+
+class LLMScheduler:
+    """
+    Schedules LLM calls under a concurrency limit and per-minute request/token budgets.
+    Args:
+        concurrency (int): Maximum number of tasks running at once.
+        requests_per_minute (int): Request budget; None for unlimited.
+        tokens_per_minute (int): Token budget (prompt plus expected completion); None for unlimited.
+        max_retries (int): Retries per call on rate-limit and transient errors.
+        base_delay (float): Initial backoff in seconds, doubled on every attempt.
+    """
+
+    def __init__(self, concurrency=4, requests_per_minute=None, tokens_per_minute=None, max_retries=5, base_delay=1.0):
+        self.concurrency = max(1, int(concurrency))
+        self.requests = TokenBucket(requests_per_minute) if requests_per_minute else None
+        self.tokens = TokenBucket(tokens_per_minute) if tokens_per_minute else None
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.retries = 0
+
+    def call(self, fn, *args, tokens=1000):
+        """
+        Calls fn(*args) once the rate budgets allow it, retrying retryable errors.
+        Args:
+            fn: Function that makes one LLM request.
+            tokens (int): Expected prompt plus completion tokens of the request.
+        Returns:
+            Whatever fn returns.
+        """
+        for attempt in range(self.max_retries + 1):
+            if self.requests:
+                self.requests.acquire(1)
+            if self.tokens:
+                self.tokens.acquire(tokens)
+            try:
+                return fn(*args)
+            except RETRYABLE_ERRORS as e:
+                if attempt == self.max_retries:
+                    raise
+                self.retries += 1
+                time.sleep(retry_delay(e, attempt, self.base_delay))
+
+    def map(self, task, items, progress=None, on_result=None):
+        """
+        Runs task(item) for every item with at most `concurrency` tasks in flight.
+        Args:
+            task: Function applied to each item; may use call() for its LLM requests.
+            items (list): Work items.
+            progress: Optional callback progress(done, total), invoked from the calling thread.
+            on_result: Optional callback on_result(item, result), invoked from the calling thread
+                as soon as each task finishes (e.g. to checkpoint results).
+        Returns:
+            list: Results in the same order as items. If a task fails, its error is raised.
+        """
+        items = list(items)
+        with ThreadPoolExecutor(max_workers=self.concurrency) as pool:
+            futures = {pool.submit(task, item): item for item in items}
+            try:
+                for done, future in enumerate(as_completed(futures), 1):
+                    result = future.result()
+                    if on_result:
+                        on_result(futures[future], result)
+                    if progress:
+                        progress(done, len(items))
+            except BaseException:
+                for future in futures:
+                    future.cancel()
+                raise
+        return [future.result() for future in futures]
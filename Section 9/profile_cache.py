@@ -0,0 +1,99 @@
+"""
+Employee Profile Cache
+----------------------
+The training-needs and security-gaps prompts in risk-reporting.py only depend on six values
+of an employee record (plus the Employee_ID, which the model simply echoes back). Employees
+sharing those values therefore get the same analysis, so the LLM only needs to be called once
+per unique profile and the result can be fanned back out to every matching employee.
+The batched structured-output mode (batched_analysis.py) words its answers differently, so
+its results are cached separately from the two-prompt analyses.
+
+Results are kept in a small SQLite database so they also survive between report runs.
+"""
+
+import hashlib
+import json
+import math
+import sqlite3
+import threading
+
+PROFILE_COLUMNS = [
+    "Login_Attempts",
+    "Suspicious_Access_Flags",
+    "Severity",
+    "Resolution_Time_Days",
+    "Score_Percentage",
+    "Device_Sharing_Instances",
+]
+
+# Bump when the prompts change so stale analyses are not reused
+PROMPT_VERSION = 1
+
+
+def profile_key(employee_data):
+    """
+    Returns the hashable profile of an employee record: the six prompt values, with missing
+    values normalized to None and numbers to floats.
+    """
+    key = []
+    for column in PROFILE_COLUMNS:
+        value = employee_data.get(column)
+        if value is None or (isinstance(value, float) and math.isnan(value)):
+            key.append(None)
+        else:
+            try:
+                key.append(float(value))
+            except (TypeError, ValueError):
+                key.append(str(value))
+    return tuple(key)
+
+
+def with_employee_id(training_needs, employee_id):
+    """Copies a cached training-needs result for another employee with the same profile."""
+    return dict(training_needs, Employee_ID=employee_id)
+
+
+class ProfileCache:
+    """
+    Persistent map of employee profile -> (training needs, security gaps) results. batched
+    selects the results of the batched structured-output mode instead of the two prompts.
+    """
+
+    def __init__(self, path="risk_profile_cache.db", model="gpt-4o", batched=False):
+        self.model = model
+        self.batched = batched
+        self.stats = {"hits": 0, "misses": 0}
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("CREATE TABLE IF NOT EXISTS profiles (key TEXT PRIMARY KEY, training TEXT, security TEXT)")
+        self._conn.commit()
+
+    def _key(self, profile):
+        payload = json.dumps(
+            {"model": self.model, "version": PROMPT_VERSION, "batched": self.batched, "profile": profile}
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, profile):
+        """Returns the cached (training needs, security gaps) pair for a profile, or None."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT training, security FROM profiles WHERE key = ?", (self._key(profile),)
+            ).fetchone()
+        if row is None:
+            self.stats["misses"] += 1
+            return None
+        self.stats["hits"] += 1
+        return json.loads(row[0]), json.loads(row[1])
+
+    def put(self, profile, training_needs, security_gaps):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO profiles VALUES (?, ?, ?)",
+                (self._key(profile), json.dumps(training_needs), json.dumps(security_gaps)),
+            )
+            self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
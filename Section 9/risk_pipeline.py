@@ -0,0 +1,510 @@
+"""
+Risk-Reporting Pipeline
+-----------------------
+Library API and headless command line for the Cybersecurity Training and Gap Analysis reports.
+The work that risk-reporting.py used to do at Streamlit module scope is split into four
+stages, each timed individually:
+
+1. load    - parse the Incident History, Mock Tests and User Behavior workbooks
+2. merge   - aggregate them to one row per employee and outer-join them
+3. analyze - rules fast path, profile cache, concurrent LLM calls, run journal
+4. report  - write the training-needs and security-gaps workbooks
+
+risk-reporting.py is a thin Streamlit client over run_pipeline(); cron jobs and worker pools
+call run_pipeline() or this script directly (e.g. one process per business unit, each with its
+own --out-dir).
+
+Usage:
+    python risk_pipeline.py --incident-history incidents.xlsx --mock-tests tests.xlsx \
+        --user-behavior behavior.xlsx --out-dir reports/finance --concurrency 8
+"""
+
+import argparse
+import json
+import os
+import re
+import sys
+import time
+from contextlib import contextmanager
+
+from aggregation import DEFAULT_REDUCERS, REDUCER_CHOICES, merge_employee_data
+from batched_analysis import LLM_APP, analyze_batch, is_failed
+from excel_io import InputCache, read_table, write_report
+from llm_scheduler import LLMScheduler, estimate_tokens
+from profile_cache import PROMPT_VERSION, ProfileCache, profile_key, with_employee_id
+from rules_engine import evaluate_rules, no_security_gaps, no_training_needs
+from run_journal import RunJournal, fingerprint_record, make_run_id
+
+import gateway_path  # noqa: F401
+import llm_gateway
+
+# LLM results per unique employee profile, kept between runs
+PROFILE_CACHE_PATH = "risk_profile_cache.db"
+# Per-employee results of every report run, so interrupted runs can resume
+RUN_JOURNAL_PATH = "risk_run_journal.db"
+# Parsed input workbooks as Parquet, keyed by upload hash
+INPUT_CACHE_DIR = "risk_input_cache"
+REPORT_DIR = "reports"
+TRAINING_REPORT_NAME = "employee_specific_training_needs.xlsx"
+SECURITY_REPORT_NAME = "organizational_security_loopholes.xlsx"
+# Markdown code fence around a JSON reply, e.g. ```json ... ```
+CODE_FENCE_PATTERN = re.compile(r"^\s*```(?:json)?\s*|\s*```\s*$", re.IGNORECASE)
+# Completion tokens budgeted per per-employee reply, on top of the prompt estimate
+REPLY_TOKENS = 400
+
+# ---------------------------------------------------------------------
+# Prompt for the training needs of one employee
+def training_needs_prompt(employee_data):
+    return f"""
+For the following employee data, provide their training needs in the json format:
+- "Employee_ID": {employee_data['Employee_ID']}
+- "Training Needs": A string contains detailed and structured sentence that describe of training recommendations. If no training is needed, state "No specific training needs identified." without any reasoning.
+
+Employee Data:
+- Login Attempts: {employee_data['Login_Attempts']}
+- Suspicious Access Flags: {employee_data['Suspicious_Access_Flags']}
+- Severity: {employee_data['Severity']}
+- Resolution Time Days: {employee_data['Resolution_Time_Days']}
+- Score Percentage: {employee_data['Score_Percentage']}
+- Device Sharing Instances: {employee_data['Device_Sharing_Instances']}
+
+Guidelines:
+1. If Login Attempts > 5 or Suspicious Access Flags > 0, recommend training on secure login and unauthorized access prevention.
+2. If Severity >= 3 or Resolution Time > 7 days, recommend training on incident reporting and faster resolution strategies.
+3. If Score Percentage < 60, recommend refresher training on phishing awareness and secure login practices.
+4. If Device Sharing Instances > 2, recommend training on secure device management and data protection.
+"""
+
+# Function to interact with OpenAI for training needs
+def get_training_needs(employee_data):
+    prompt = training_needs_prompt(employee_data)
+    # No SDK retries: LLMScheduler.call() retries this request under the rate budgets
+    response = llm_gateway.chat_completion(
+        LLM_APP,
+        max_retries=0,
+        model="gpt-4o",  # Specify the model you're using
+        messages=[
+            {"role": "system", "content": "You are an expert in cybersecurity training needs assessment."},
+            {"role": "user", "content": prompt}
+        ]
+    )
+    # print(response['choices'][0]['message']['content'] )
+    return response.choices[0].message.content  # Adjust this for the correct response format
+
+# Prompt for the security gaps and controls of one employee
+def security_gaps_prompt(employee_data):
+    return f"""
+Based on the following employee data, identify security gaps, controls needed, criticality, and specific steps in a structured json format:
+Employee Data:
+- Login Attempts: {employee_data['Login_Attempts']}
+- Suspicious Access Flags: {employee_data['Suspicious_Access_Flags']}
+- Severity: {employee_data['Severity']}
+- Resolution Time Days: {employee_data['Resolution_Time_Days']}
+- Score Percentage: {employee_data['Score_Percentage']}
+- Device Sharing Instances: {employee_data['Device_Sharing_Instances']}
+
+Guidelines:
+1. If Login Attempts > 5 or Suspicious Access Flags > 0, identify gaps like potential unauthorized access risks. Suggest controls like stronger authentication policies and monitoring.
+2. If Severity >= 3 or Resolution Time > 7 days, identify gaps in incident management. Suggest faster resolution processes and training.
+3. If Score Percentage < 60, highlight low security awareness. Suggest training and phishing simulations.
+4. If Device Sharing Instances > 2, flag policy violations. Suggest stricter device management policies.
+
+
+Return the result in this structured json format:
+- "Security Gaps": A String Description of gaps. If No significant security gaps identified based on employee data, state "No significant security gaps identified based on employee data".
+- "Controls Needed": A String that describe Specific controls for addressing the gaps. If No significant security gaps identified based on employee data, state "None".
+- "Criticality": Levels (L, M, H). If No significant security gaps identified based on employee data, state "L".
+- "Steps Needed": A string that describe Detailed actions to resolve the gaps. If No significant security gaps identified based on employee data, state "None".
+"""
+
+# Function to interact with OpenAI for security gaps and controls
+def get_security_gaps(employee_data):
+    prompt = security_gaps_prompt(employee_data)
+    response = llm_gateway.chat_completion(
+        LLM_APP,
+        max_retries=0,
+        model="gpt-4o",  # Specify the model you're using
+        messages=[
+            {"role": "system", "content": "You are an expert in organizational security gap analysis."},
+            {"role": "user", "content": prompt}
+        ]
+    )
+    # print(response['choices'][0]['message']['content'] )
+    return response.choices[0].message.content  # Adjust this for the correct response format
+
+# Parses a JSON reply, which the model may wrap in a markdown code fence
+def parse_json_reply(reply):
+    return json.loads(CODE_FENCE_PATTERN.sub("", reply))
+
+# Function to analyze one merged employee record with both prompts
+# (runs on the scheduler's worker threads, which enforce the rate limits)
+def analyze_employee(employee_data, scheduler):
+    # Get training needs
+    tokens = estimate_tokens(training_needs_prompt(employee_data)) + REPLY_TOKENS
+    training_needs = parse_json_reply(scheduler.call(get_training_needs, employee_data, tokens=tokens))
+
+    # Get security gaps and controls
+    tokens = estimate_tokens(security_gaps_prompt(employee_data)) + REPLY_TOKENS
+    security_gaps = parse_json_reply(scheduler.call(get_security_gaps, employee_data, tokens=tokens))
+    return training_needs, security_gaps
+
+
+# ---------------------------------------------------------------------
+# Pipeline stages
+
+def _stderr(message):
+    print(message, file=sys.stderr)
+
+
+@contextmanager
+def _timed(timings, stage):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings[stage] = time.perf_counter() - start
+
+
+def load_inputs(uploads, input_cache_dir=INPUT_CACHE_DIR):
+    """
+    Load stage: parses the three workbooks with explicit column types.
+    Args:
+        uploads (list): Raw bytes of the Incident History, Mock Tests and User Behavior workbooks.
+        input_cache_dir (str): Parquet cache directory; None to always parse the workbooks.
+    Returns:
+        tuple: (incident_history, mock_tests, user_behavior) DataFrames.
+    """
+    if input_cache_dir:
+        input_cache = InputCache(input_cache_dir)
+        return tuple(input_cache.load(data) for data in uploads)
+    return tuple(read_table(data) for data in uploads)
+
+
+def merge_inputs(incident_history, mock_tests, user_behavior, reducers=None, log=_stderr):
+    """
+    Merge stage: aggregates each table to one row per employee and outer-joins them.
+    Returns:
+        pd.DataFrame: One merged row per employee.
+    """
+    merged_data, merge_diagnostics = merge_employee_data(user_behavior, mock_tests, incident_history, reducers)
+    log(
+        f"Aggregation: {merge_diagnostics['rows']} employee rows instead of "
+        f"{merge_diagnostics['rows_without_aggregation']} joined rows "
+        f"({merge_diagnostics['rows_removed']} rows and {merge_diagnostics['llm_calls_removed']} LLM calls removed)."
+    )
+    return merged_data
+
+
+def analyze(merged_data, run_id, rules_fast_path=True, concurrency=4, requests_per_minute=500,
+            tokens_per_minute=30000, profile_cache_path=PROFILE_CACHE_PATH, batch_size=None,
+            journal_path=RUN_JOURNAL_PATH, resume=True, incremental=False, progress=None, log=_stderr):
+    """
+    Analyze stage: gets the training needs and security gaps of every merged employee record.
+    Results are journaled as they arrive, so an interrupted run with the same run_id resumes.
+    Args:
+        merged_data (pd.DataFrame): Output of merge_inputs().
+        run_id (str): Journal key of this run, from make_run_id().
+        rules_fast_path (bool): Skip the LLM for employees who trigger no guideline.
+        concurrency, requests_per_minute, tokens_per_minute: LLMScheduler limits.
+        profile_cache_path (str): Profile cache database; None to analyze every employee.
+        batch_size (int): Employees per structured request; None for two prompts per employee.
+        journal_path (str): Run journal database.
+        resume (bool): Keep what the journal already holds for this run.
+        incremental (bool): Carry forward previous results of employees whose record is unchanged.
+        progress: Optional callback progress(done, total, unit).
+        log: Callback for status messages.
+    Returns:
+        list: Employee_IDs in merged_data order; their report rows are in the journal under run_id.
+    """
+    # Evaluate the deterministic guidelines for everyone in one pass
+    rules = evaluate_rules(merged_data)
+    if rules_fast_path:
+        log(f"{int(rules['Flagged'].sum())} of {len(rules)} records trigger a guideline and need LLM analysis.")
+
+    records = [(index, row.to_dict()) for index, row in merged_data.iterrows()]
+    # Fingerprint every merged record with the settings that shape its analysis
+    analysis_settings = {
+        "prompt_version": PROMPT_VERSION,
+        "rules_fast_path": rules_fast_path,
+        "batched": bool(batch_size),
+    }
+    fingerprints = {
+        str(employee_data["Employee_ID"]): fingerprint_record(employee_data, analysis_settings)
+        for _, employee_data in records
+    }
+    journal = RunJournal(journal_path, run_id, fingerprints)
+    if not resume:
+        journal.clear()
+    already_done = journal.completed()
+    if already_done:
+        log(f"Resuming run {run_id}: {len(already_done)} employees already analyzed.")
+
+    # Carry forward the previous results of employees whose record hasn't changed
+    if incremental:
+        carried = []
+        for employee_id, (fingerprint, training_needs, security_gaps) in journal.previous_results().items():
+            if (
+                employee_id not in already_done
+                and fingerprints.get(employee_id) == fingerprint
+                and not is_failed((training_needs, security_gaps))
+            ):
+                carried.append((employee_id, training_needs, security_gaps))
+        journal.record_many(carried, recomputed=False)
+        already_done |= {employee_id for employee_id, _, _ in carried}
+        log(
+            f"Incremental run: {len(carried)} unchanged employees carried forward from the previous run, "
+            f"{len(records) - len(already_done)} new or changed employees to analyze."
+        )
+
+    # Nothing to explain for unflagged records: they get the standard results without the LLM
+    needs_llm = [not rules_fast_path or rules.at[index, "Flagged"] for index, _ in records]
+
+    # Report rows for one employee from an LLM analysis (possibly shared with other employees)
+    def report_rows(index, employee_data, result):
+        training_needs, security_gaps = result
+        security_gaps = dict(security_gaps)
+        if rules_fast_path:
+            # Criticality is derived deterministically from the triggered rules
+            security_gaps["Criticality"] = rules.at[index, "Criticality"]
+        employee_id = employee_data["Employee_ID"]
+        return employee_id, with_employee_id(training_needs, employee_id), security_gaps
+
+    # Pick the records the LLM actually has to see: one per unique profile not already cached
+    profile_cache = ProfileCache(profile_cache_path, batched=bool(batch_size)) if profile_cache_path else None
+    analyses = {}
+    pending = {}
+    members = {}
+    immediate = []
+    for (index, employee_data), llm_needed in zip(records, needs_llm):
+        if str(employee_data["Employee_ID"]) in already_done:
+            continue
+        if not llm_needed:
+            employee_id = employee_data["Employee_ID"]
+            immediate.append((employee_id, no_training_needs(employee_id), no_security_gaps()))
+            continue
+        key = profile_key(employee_data) if profile_cache else index
+        if key not in analyses and key not in pending:
+            cached = profile_cache.get(key) if profile_cache else None
+            if cached is not None:
+                analyses[key] = cached
+            else:
+                pending[key] = employee_data
+        if key in analyses:
+            immediate.append(report_rows(index, employee_data, analyses[key]))
+        else:
+            members.setdefault(key, []).append((index, employee_data))
+    journal.record_many(immediate)
+
+    # Checkpoint each analysis as soon as it arrives: cache it and journal every employee sharing it
+    def checkpoint(keys, results):
+        for key, result in zip(keys, results):
+            failed = is_failed(result)
+            if profile_cache and not failed:
+                profile_cache.put(key, *result)
+            # Failed placeholders still reach the report, but a resumed run retries them
+            journal.record_many(
+                [report_rows(index, employee_data, result) for index, employee_data in members[key]],
+                failed=failed,
+            )
+
+    # Process the pending records concurrently
+    scheduler = LLMScheduler(
+        concurrency=concurrency,
+        requests_per_minute=requests_per_minute,
+        tokens_per_minute=tokens_per_minute,
+    )
+    pending_keys = list(pending)
+    if batch_size:
+        # Workers only collect their retry messages; log (e.g. st.info) is called from this thread
+        def run_batch(keys):
+            messages = []
+            results = analyze_batch([pending[key] for key in keys], scheduler, log=messages.append)
+            return results, messages
+
+        def checkpoint_batch(keys, outcome):
+            results, messages = outcome
+            for message in messages:
+                log(message)
+            checkpoint(keys, results)
+
+        batches = [pending_keys[i:i + batch_size] for i in range(0, len(pending_keys), batch_size)]
+        scheduler.map(
+            run_batch,
+            batches,
+            progress=progress and (lambda done, total: progress(done, total, "batches")),
+            on_result=checkpoint_batch,
+        )
+        llm_calls = len(batches)
+    else:
+        scheduler.map(
+            lambda key: analyze_employee(pending[key], scheduler),
+            pending_keys,
+            progress=progress and (lambda done, total: progress(done, total, "records")),
+            on_result=lambda key, result: checkpoint([key], [result]),
+        )
+        llm_calls = 2 * len(pending)
+
+    journal.close()
+    if profile_cache:
+        llm_records = sum(needed for (_, employee_data), needed in zip(records, needs_llm)
+                          if str(employee_data["Employee_ID"]) not in already_done)
+        log(
+            f"{llm_records} records needed LLM analysis: {len(analyses) + len(pending)} unique profiles, "
+            f"{profile_cache.stats['hits']} served from the cache, {llm_calls} LLM calls made, "
+            f"{2 * llm_records - llm_calls} calls saved."
+        )
+        profile_cache.close()
+    return [str(employee_data["Employee_ID"]) for _, employee_data in records]
+
+
+def write_reports(run_id, employee_ids, out_dir=REPORT_DIR, journal_path=RUN_JOURNAL_PATH, incremental=False):
+    """
+    Report stage: writes the two Excel reports from the run journal.
+    Args:
+        run_id (str): Journal key of the run.
+        employee_ids (list): Employee_IDs in report order, as returned by analyze().
+        out_dir (str): Directory the two reports are written to.
+        journal_path (str): Run journal database.
+        incremental (bool): Add a "Recomputed" column telling re-analyzed from carried-forward rows.
+    Returns:
+        tuple: (training needs report path, security gaps report path)
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    training_path = os.path.join(out_dir, TRAINING_REPORT_NAME)
+    security_path = os.path.join(out_dir, SECURITY_REPORT_NAME)
+    journal = RunJournal(journal_path, run_id)
+
+    def report_rows():
+        for training_needs, security_gaps, recomputed in journal.iter_rows(employee_ids):
+            if incremental:
+                # Mark which rows were analyzed in this run and which were carried forward
+                status = "Yes" if recomputed else "No"
+                training_needs = dict(training_needs, Recomputed=status)
+                security_gaps = dict(security_gaps, Recomputed=status)
+            yield training_needs, security_gaps
+
+    try:
+        # Rows are streamed from the journal straight into the workbooks: one pass collects
+        # the headers (every key, in first-seen order), then one pass writes each report
+        training_columns, security_columns = {}, {}
+        for training_needs, security_gaps in report_rows():
+            training_columns.update(dict.fromkeys(training_needs))
+            security_columns.update(dict.fromkeys(security_gaps))
+        write_report(training_path, "Training Needs", (row for row, _ in report_rows()), list(training_columns))
+        write_report(
+            security_path, "Security Gaps & Controls", (row for _, row in report_rows()), list(security_columns)
+        )
+    finally:
+        journal.close()
+    return training_path, security_path
+
+
+def run_pipeline(incident_history, mock_tests, user_behavior, out_dir=REPORT_DIR, reducers=None,
+                 input_cache_dir=INPUT_CACHE_DIR, progress=None, log=_stderr, **analyze_options):
+    """
+    Runs load -> merge -> analyze -> report for one set of workbooks, timing every stage.
+    Args:
+        incident_history, mock_tests, user_behavior (bytes): Raw .xlsx contents.
+        out_dir (str): Directory the two reports are written to.
+        reducers (dict): Per-column aggregation reducers; defaults to DEFAULT_REDUCERS.
+        input_cache_dir (str): Parquet cache directory; None to always parse the workbooks.
+        progress, log: Callbacks, see analyze().
+        **analyze_options: Keyword arguments of analyze() (rules_fast_path, batch_size, ...).
+    Returns:
+        dict: "run_id", "employees", "training_report", "security_report" and "timings"
+        (seconds per stage).
+    """
+    reducers = dict(DEFAULT_REDUCERS) if reducers is None else reducers
+    uploads = [incident_history, mock_tests, user_behavior]
+    timings = {}
+    with _timed(timings, "load"):
+        tables = load_inputs(uploads, input_cache_dir)
+    with _timed(timings, "merge"):
+        merged_data = merge_inputs(*tables, reducers=reducers, log=log)
+    with _timed(timings, "analyze"):
+        # Journal key: the uploads plus the settings that change the results
+        run_id = make_run_id(
+            uploads,
+            {
+                "reducers": reducers,
+                "rules_fast_path": analyze_options.get("rules_fast_path", True),
+                "incremental": analyze_options.get("incremental", False),
+                "batch_size": analyze_options.get("batch_size"),
+            },
+        )
+        employee_ids = analyze(merged_data, run_id, progress=progress, log=log, **analyze_options)
+    with _timed(timings, "report"):
+        training_path, security_path = write_reports(
+            run_id, employee_ids, out_dir, analyze_options.get("journal_path", RUN_JOURNAL_PATH),
+            analyze_options.get("incremental", False),
+        )
+    return {
+        "run_id": run_id,
+        "employees": len(merged_data),
+        "training_report": training_path,
+        "security_report": security_path,
+        "timings": timings,
+    }
+
+
+def parse_reducers(values):
+    """Parses repeated COLUMN=REDUCER options on top of DEFAULT_REDUCERS."""
+    reducers = dict(DEFAULT_REDUCERS)
+    for value in values or []:
+        column, _, reducer = value.partition("=")
+        if column not in DEFAULT_REDUCERS or reducer not in REDUCER_CHOICES:
+            raise argparse.ArgumentTypeError(
+                f"invalid reducer {value!r}: expected COLUMN=REDUCER with COLUMN in {list(DEFAULT_REDUCERS)} "
+                f"and REDUCER in {REDUCER_CHOICES}"
+            )
+        reducers[column] = reducer
+    return reducers
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate the training-needs and security-gaps reports.")
+    parser.add_argument("--incident-history", required=True, help="Incident History workbook (.xlsx)")
+    parser.add_argument("--mock-tests", required=True, help="Mock Tests workbook (.xlsx)")
+    parser.add_argument("--user-behavior", required=True, help="User Behavior workbook (.xlsx)")
+    parser.add_argument("--out-dir", default=REPORT_DIR, help="directory the reports are written to")
+    parser.add_argument("--reducer", action="append", metavar="COLUMN=REDUCER", help="per-employee aggregation, e.g. Severity=max")
+    parser.add_argument("--no-fast-path", action="store_true", help="send employees who trigger no guideline to the LLM too")
+    parser.add_argument("--concurrency", type=int, default=4, help="maximum concurrent LLM requests")
+    parser.add_argument("--requests-per-minute", type=int, default=500, help="OpenAI request budget")
+    parser.add_argument("--tokens-per-minute", type=int, default=30000, help="OpenAI token budget")
+    parser.add_argument("--batch-size", type=int, help="employees per structured request (default: two prompts per employee)")
+    parser.add_argument("--profile-cache", default=PROFILE_CACHE_PATH, help="SQLite profile cache file")
+    parser.add_argument("--no-profile-cache", action="store_true", help="analyze every employee, even with identical profiles")
+    parser.add_argument("--journal", default=RUN_JOURNAL_PATH, help="SQLite run journal file")
+    parser.add_argument("--fresh", action="store_true", help="discard journaled results of this run instead of resuming")
+    parser.add_argument("--incremental", action="store_true", help="only re-analyze new or changed employees")
+    parser.add_argument("--input-cache", default=INPUT_CACHE_DIR, help="Parquet cache directory for parsed inputs")
+    parser.add_argument("--no-input-cache", action="store_true", help="always parse the workbooks")
+    args = parser.parse_args(argv)
+    try:
+        reducers = parse_reducers(args.reducer)
+    except argparse.ArgumentTypeError as e:
+        parser.error(str(e))
+
+    uploads = []
+    for path in (args.incident_history, args.mock_tests, args.user_behavior):
+        with open(path, "rb") as f:
+            uploads.append(f.read())
+    result = run_pipeline(
+        *uploads, out_dir=args.out_dir, reducers=reducers,
+        input_cache_dir=None if args.no_input_cache else args.input_cache,
+        rules_fast_path=not args.no_fast_path, concurrency=args.concurrency,
+        requests_per_minute=args.requests_per_minute, tokens_per_minute=args.tokens_per_minute,
+        profile_cache_path=None if args.no_profile_cache else args.profile_cache,
+        batch_size=args.batch_size, journal_path=args.journal, resume=not args.fresh,
+        incremental=args.incremental,
+    )
+    timings = ", ".join(f"{stage} {seconds:.2f}s" for stage, seconds in result["timings"].items())
+    print(f"Run {result['run_id']}: {result['employees']} employees ({timings})", file=sys.stderr)
+    print(result["training_report"])
+    print(result["security_report"])
+    print(f"LLM gateway: {llm_gateway.metrics.summary()}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
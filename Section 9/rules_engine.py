@@ -0,0 +1,107 @@
+"""
+Guideline Rules Engine
+----------------------
+Vectorized evaluation of the four numeric guidelines used in the training-needs and
+security-gap prompts of risk-reporting.py:
+
+1. Login Attempts > 5 or Suspicious Access Flags > 0  -> access / secure login
+2. Severity >= 3 or Resolution Time > 7 days          -> incident management
+3. Score Percentage < 60                              -> security awareness
+4. Device Sharing Instances > 2                       -> device management
+
+The rules are deterministic, so they are applied to the whole merged DataFrame at once.
+Employees who trigger no rule get the standard "nothing identified" results without any
+LLM call; the LLM is only needed to write the narrative for flagged employees.
+"""
+
+import pandas as pd
+
+# Incident History records Severity as a label; the guidelines compare it numerically
+SEVERITY_LEVELS = {"low": 1, "medium": 2, "high": 3, "critical": 4}
+
+RULE_COLUMNS = ["Access_Rule", "Incident_Rule", "Awareness_Rule", "Device_Rule"]
+
+TRAINING_CATEGORIES = {
+    "Access_Rule": "Secure login and unauthorized access prevention",
+    "Incident_Rule": "Incident reporting and faster resolution strategies",
+    "Awareness_Rule": "Phishing awareness and secure login refresher",
+    "Device_Rule": "Secure device management and data protection",
+}
+
+SECURITY_GAPS = {
+    "Access_Rule": "Potential unauthorized access risk",
+    "Incident_Rule": "Gaps in incident management",
+    "Awareness_Rule": "Low security awareness",
+    "Device_Rule": "Device sharing policy violations",
+}
+
+# Results the prompts ask for when nothing is identified
+NO_TRAINING_NEEDS = "No specific training needs identified."
+NO_SECURITY_GAPS = "No significant security gaps identified based on employee data"
+
+
+def coerce_severity(values):
+    """
+    Converts Severity values to numbers, mapping Low/Medium/High/Critical labels to 1-4.
+    Values that are neither a known label nor numeric become NaN.
+    """
+    mapped = values.map(lambda v: SEVERITY_LEVELS.get(v.strip().lower(), v) if isinstance(v, str) else v)
+    return pd.to_numeric(mapped, errors="coerce")
+
+
+def evaluate_rules(merged_data):
+    """
+    Applies the guidelines to every row of the merged employee data in one vectorized pass.
+    Missing values never trigger a rule.
+    Args:
+        merged_data (pd.DataFrame): Merged employee data with numeric guideline columns.
+    Returns:
+        pd.DataFrame: Same index as merged_data with one boolean column per rule, plus
+        "Rules_Triggered", "Training_Categories", "Security_Gaps", "Criticality" and "Flagged".
+    """
+    severity = coerce_severity(merged_data["Severity"])
+    rules = pd.DataFrame(
+        {
+            "Access_Rule": (merged_data["Login_Attempts"] > 5) | (merged_data["Suspicious_Access_Flags"] > 0),
+            "Incident_Rule": (severity >= 3) | (merged_data["Resolution_Time_Days"] > 7),
+            "Awareness_Rule": merged_data["Score_Percentage"] < 60,
+            "Device_Rule": merged_data["Device_Sharing_Instances"] > 2,
+        },
+        index=merged_data.index,
+    )
+    triggered = rules[RULE_COLUMNS].sum(axis=1)
+    rules["Rules_Triggered"] = triggered
+    rules["Flagged"] = triggered > 0
+
+    # Join the category/gap labels of every triggered rule, e.g. "Low security awareness; ..."
+    rules["Training_Categories"] = _join_labels(rules, TRAINING_CATEGORIES, NO_TRAINING_NEEDS)
+    rules["Security_Gaps"] = _join_labels(rules, SECURITY_GAPS, NO_SECURITY_GAPS)
+
+    # L: nothing triggered, M: one rule, H: several rules or a critical incident
+    rules["Criticality"] = "L"
+    rules.loc[triggered == 1, "Criticality"] = "M"
+    rules.loc[(triggered >= 2) | (severity >= SEVERITY_LEVELS["critical"]), "Criticality"] = "H"
+    return rules
+
+
+def _join_labels(rules, labels, default):
+    joined = pd.Series("", index=rules.index)
+    for column in RULE_COLUMNS:
+        joined = joined.where(~rules[column], joined + "; " + labels[column])
+    joined = joined.str.lstrip("; ")
+    return joined.where(joined != "", default)
+
+
+def no_training_needs(employee_id):
+    """Training-needs result for an employee who triggers no rule."""
+    return {"Employee_ID": employee_id, "Training Needs": NO_TRAINING_NEEDS}
+
+
+def no_security_gaps():
+    """Security-gaps result for an employee who triggers no rule."""
+    return {
+        "Security Gaps": NO_SECURITY_GAPS,
+        "Controls Needed": "None",
+        "Criticality": "L",
+        "Steps Needed": "None",
+    }
@@ -0,0 +1,175 @@
+"""
+Report Run Journal
+------------------
+Makes report runs of risk-reporting.py resumable. Every employee's training-needs and
+security-gaps rows are appended to a SQLite journal, keyed by run ID and Employee_ID, as soon
+as they are known. A run that crashes, times out or is interrupted by a Streamlit rerun can
+then be restarted with the same inputs and only the employees missing from the journal (or
+journaled as failed) are sent to the LLM again. The final Excel reports are assembled from the
+journal.
+
+The run ID is a hash of the uploaded files and the settings that affect the results, so
+re-uploading the same workbooks automatically resumes the same run.
+
+Each row also stores a fingerprint of the employee's merged record. When fresh workbooks are
+uploaded for the next report cycle, employees whose fingerprint matches their latest row from a
+previous run can carry that result forward, and only new or changed employees are re-analyzed.
+"""
+
+import hashlib
+import json
+import math
+import sqlite3
+import threading
+import time
+
+
+def make_run_id(files, settings):
+    """
+    Derives a run ID from the raw bytes of the input files and the result-affecting settings.
+    Args:
+        files (list): Bytes of each uploaded workbook.
+        settings (dict): JSON-serializable settings (reducers, fast path, ...).
+    Returns:
+        str: A short hexadecimal run ID.
+    """
+    digest = hashlib.sha256()
+    for content in files:
+        digest.update(hashlib.sha256(content).digest())
+    digest.update(json.dumps(settings, sort_keys=True).encode("utf-8"))
+    return digest.hexdigest()[:16]
+
+
+def _normalize(value):
+    # Missing values and numbers compare equal however pandas happened to type them
+    if value is None or (isinstance(value, float) and math.isnan(value)):
+        return None
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return str(value)
+
+
+def fingerprint_record(employee_data, settings):
+    """
+    Fingerprints one merged employee record together with the settings that shape its analysis.
+    Args:
+        employee_data (dict): The employee's merged record (every column).
+        settings (dict): JSON-serializable settings (prompt version, fast path, ...).
+    Returns:
+        str: A hexadecimal fingerprint.
+    """
+    record = {column: _normalize(value) for column, value in employee_data.items()}
+    payload = json.dumps({"record": record, "settings": settings}, sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class RunJournal:
+    """
+    Append-only store of per-employee report rows for one run.
+    Args:
+        path (str): SQLite database file.
+        run_id (str): ID of this run, from make_run_id().
+        fingerprints (dict): Optional {Employee_ID: fingerprint} of this run's records, stored
+            with every row so the next run can tell which employees changed.
+    """
+
+    def __init__(self, path, run_id, fingerprints=None):
+        self.run_id = run_id
+        self.fingerprints = {str(k): v for k, v in (fingerprints or {}).items()}
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS journal ("
+            "run_id TEXT, employee_id TEXT, training TEXT, security TEXT, recorded REAL, "
+            "fingerprint TEXT, recomputed INTEGER DEFAULT 1, failed INTEGER DEFAULT 0, "
+            "PRIMARY KEY (run_id, employee_id))"
+        )
+        # Journals written by earlier versions lack the newer columns
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(journal)")}
+        if "fingerprint" not in columns:
+            self._conn.execute("ALTER TABLE journal ADD COLUMN fingerprint TEXT")
+        if "recomputed" not in columns:
+            self._conn.execute("ALTER TABLE journal ADD COLUMN recomputed INTEGER DEFAULT 1")
+        if "failed" not in columns:
+            self._conn.execute("ALTER TABLE journal ADD COLUMN failed INTEGER DEFAULT 0")
+        self._conn.commit()
+
+    def completed(self):
+        """Returns the Employee_IDs already journaled for this run, except failed analyses."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT employee_id FROM journal WHERE run_id = ? AND NOT failed", (self.run_id,)
+            )
+            return {row[0] for row in rows}
+
+    def record_many(self, entries, recomputed=True, failed=False):
+        """
+        Appends report rows and commits them immediately.
+        Args:
+            entries (list): (employee_id, training needs dict, security gaps dict) tuples.
+            recomputed (bool): False for rows carried forward from a previous run.
+            failed (bool): True for placeholder rows of failed analyses, which a resumed run
+                analyzes again.
+        """
+        now = time.time()
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO journal "
+                "(run_id, employee_id, training, security, recorded, fingerprint, recomputed, failed) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                [
+                    (
+                        self.run_id, str(employee_id),
+                        json.dumps(training, default=str), json.dumps(security, default=str), now,
+                        self.fingerprints.get(str(employee_id)), int(recomputed), int(failed),
+                    )
+                    for employee_id, training, security in entries
+                ],
+            )
+            self._conn.commit()
+
+    def record(self, employee_id, training_needs, security_gaps):
+        self.record_many([(employee_id, training_needs, security_gaps)])
+
+    def iter_rows(self, employee_ids):
+        """
+        Yields (training needs, security gaps, recomputed) of this run for each Employee_ID, in
+        the given order, reading one row at a time so a whole report is never held in memory.
+        """
+        for employee_id in employee_ids:
+            with self._lock:
+                training, security, recomputed = self._conn.execute(
+                    "SELECT training, security, recomputed FROM journal WHERE run_id = ? AND employee_id = ?",
+                    (self.run_id, str(employee_id)),
+                ).fetchone()
+            yield json.loads(training), json.loads(security), bool(recomputed)
+
+    def previous_results(self):
+        """
+        Returns each employee's latest row from any other run.
+        Returns:
+            dict: {Employee_ID: (fingerprint, training needs, security gaps)}; the fingerprint is
+            None for rows journaled before fingerprints were recorded.
+        """
+        with self._lock:
+            # SQLite returns the bare columns of the row holding MAX(recorded) in each group
+            rows = self._conn.execute(
+                "SELECT employee_id, fingerprint, training, security, MAX(recorded) FROM journal "
+                "WHERE run_id != ? GROUP BY employee_id",
+                (self.run_id,),
+            ).fetchall()
+        return {
+            employee_id: (fingerprint, json.loads(training), json.loads(security))
+            for employee_id, fingerprint, training, security, _ in rows
+        }
+
+    def clear(self):
+        """Discards everything journaled for this run, to start it from scratch."""
+        with self._lock:
+            self._conn.execute("DELETE FROM journal WHERE run_id = ?", (self.run_id,))
+            self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,437 @@
+"""
+Offline Benchmark Suite
+-----------------------
+Measures the apps end to end without live API calls. A local OpenAI-compatible stub server
+(stub_server.py) stands in for the API, with configurable latency, token rate and error
+injection, and serves deterministic embeddings. Synthetic workloads (workloads.py) are generated
+at the requested scale:
+
+- phishing: analyze_email() over a synthetic email corpus, and batch_scan.scan() over it as mbox
+- risk:     risk_pipeline.run_pipeline() on scaled-up QPR workbooks, per-employee and batched
+- pdf:      pdf_ingest.ingest_corpus() on a synthetic PDF set, then hybrid retrieval + answer
+- chatbot:  generate_response() over concurrent multi-turn training sessions
+
+Every app runs in its own subprocess (in a scratch directory), so peak memory is measured per
+app. Each benchmark reports throughput, p50/p99 latency per unit of work, the LLM calls seen by
+the gateway (llm_gateway.py) with their p50/p99 latency by operation (chat, completion,
+embedding), and the peak RSS of the app's process. Results can be saved as JSON and compared
+against an earlier run to catch regressions.
+
+The latency of a unit of work is:
+
+- analyze_email, queries, chatbot turns: the duration of the call
+- batch_scan: the seconds each message took, from its verdict record
+- run_pipeline: the duration of each analysis task (an employee, or a batch of them) on its
+  scheduler worker, not counting the time it waited for a free worker
+- ingest: the duration of a whole ingest into a fresh index. INGEST_RUNS runs are too few for
+  percentiles, so this row reports their mean_ms and max_ms instead of p50/p99
+
+Usage:
+    python run_benchmarks.py                                 # every app at scale 5
+    python run_benchmarks.py --apps phishing risk --scale 20 --out results.json
+    python run_benchmarks.py --baseline results.json         # exit status 1 on regressions
+"""
+
+import argparse
+import importlib.util
+import json
+import logging
+import os
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+import workloads
+from stub_server import StubOpenAIServer
+
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+sys.path.append(REPO_ROOT)
+import llm_gateway
+
+APPS = ("phishing", "risk", "pdf", "chatbot")
+CHATBOT_TURNS = 12
+RISK_BATCH_SIZE = 10
+INGEST_RUNS = 3
+
+
+class CallLog(logging.Handler):
+    """Collects the JSON record the LLM gateway logs for every call."""
+
+    def __init__(self):
+        super().__init__()
+        self.calls = []
+
+    def emit(self, record):
+        self.calls.append(json.loads(record.getMessage()))
+
+
+def percentile_ms(latencies, q):
+    return round(float(np.percentile(latencies, q)) * 1000, 1) if len(latencies) else None
+
+
+def timed_map(fn, items, concurrency):
+    """
+    Runs fn(item) for every item on `concurrency` threads. A call that raises (e.g. once the
+    gateway has used up its retries on injected errors) is counted as failed, not fatal.
+    Returns:
+        tuple: (latency in seconds of every call, wall-clock seconds of the whole run, failed calls)
+    """
+    def run(item):
+        start = time.perf_counter()
+        try:
+            fn(item)
+        except Exception:
+            return time.perf_counter() - start, True
+        return time.perf_counter() - start, False
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        outcomes = list(pool.map(run, items))
+    return [latency for latency, _ in outcomes], time.perf_counter() - start, sum(failed for _, failed in outcomes)
+
+
+def llm_stats(calls):
+    """Summarizes gateway call records by operation (chat, completion, embedding)."""
+    stats = {}
+    for operation in sorted({call["operation"] for call in calls}):
+        selected = [call for call in calls if call["operation"] == operation]
+        latencies = [call["latency_s"] for call in selected]
+        stats[operation] = {
+            "calls": len(selected),
+            "errors": sum(call["status"] == "error" for call in selected),
+            "p50_ms": percentile_ms(latencies, 50),
+            "p99_ms": percentile_ms(latencies, 99),
+            "prompt_tokens": sum(call["prompt_tokens"] for call in selected),
+            "completion_tokens": sum(call["completion_tokens"] for call in selected),
+            "max_prompt_tokens": max(call["prompt_tokens"] for call in selected),
+        }
+    return stats
+
+
+def result_row(name, units, unit, seconds, latencies, calls, failed=0, **extra):
+    """
+    One benchmark result; `calls` are the gateway records of the LLM calls it made, and
+    `failed` the units of work that raised.
+    """
+    return {
+        "benchmark": name,
+        "units": units,
+        "unit": unit,
+        "failed": failed,
+        "seconds": round(seconds, 3),
+        "throughput": round(units / seconds, 3) if seconds else None,
+        "p50_ms": percentile_ms(latencies, 50),
+        "p99_ms": percentile_ms(latencies, 99),
+        "llm": llm_stats(calls),
+        **extra,
+    }
+
+
+def _use_section(name):
+    sys.path.insert(0, os.path.join(REPO_ROOT, name))
+
+
+def bench_phishing(workdir, scale, concurrency, log):
+    _use_section("Section 10")
+    import batch_scan
+    import phishing_email_detection
+
+    mbox_path = os.path.join(workdir, "reported.mbox")
+    emails = workloads.make_email_corpus(50 * scale, mbox_path)
+    rows = []
+
+    start_call = len(log.calls)
+    latencies, seconds, failed = timed_map(
+        phishing_email_detection.analyze_email, [body for body, _ in emails], concurrency
+    )
+    rows.append(result_row(
+        "phishing/analyze_email", len(emails), "emails", seconds, latencies, log.calls[start_call:], failed
+    ))
+
+    # The whole mailbox path: parsing, local pre-filter, and the model for ambiguous emails only
+    start_call = len(log.calls)
+    start = time.perf_counter()
+    verdicts_path = os.path.join(workdir, "verdicts.jsonl")
+    count = batch_scan.scan([mbox_path], verdicts_path, concurrency=concurrency)
+    seconds = time.perf_counter() - start
+    with open(verdicts_path, encoding="utf-8") as f:
+        verdicts = [json.loads(line) for line in f]
+    rows.append(result_row(
+        "phishing/batch_scan", count, "emails", seconds, [verdict["seconds"] for verdict in verdicts],
+        log.calls[start_call:], sum("error" in verdict for verdict in verdicts),
+    ))
+    return rows
+
+
+def bench_risk(workdir, scale, concurrency, log):
+    _use_section("Section 9")
+    import risk_pipeline
+
+    scheduler_class = risk_pipeline.LLMScheduler
+    task_seconds = []
+
+    class TimedScheduler(scheduler_class):
+        # Times every task in its worker thread, so the wait for a free worker isn't counted
+        def map(self, task, items, progress=None, on_result=None):
+            def timed(item):
+                start = time.perf_counter()
+                try:
+                    return task(item)
+                finally:
+                    task_seconds.append(time.perf_counter() - start)
+            return super().map(timed, items, progress, on_result)
+
+    paths = workloads.make_qpr_workbooks(scale, os.path.join(workdir, "inputs"))
+    uploads = []
+    for name in ("incident_history", "mock_tests", "user_behavior"):
+        with open(paths[name], "rb") as f:
+            uploads.append(f.read())
+    rows = []
+    risk_pipeline.LLMScheduler = TimedScheduler
+    try:
+        for label, batch_size in (("per-employee", None), ("batched", RISK_BATCH_SIZE)):
+            start_call = len(log.calls)
+            start = time.perf_counter()
+            task_seconds.clear()
+            # Every employee goes to the model: no fast path, no profile cache, a fresh journal
+            result = risk_pipeline.run_pipeline(
+                *uploads, out_dir=os.path.join(workdir, "reports", label), input_cache_dir=None,
+                log=lambda message: None, rules_fast_path=False, concurrency=concurrency,
+                requests_per_minute=None, tokens_per_minute=None, profile_cache_path=None,
+                batch_size=batch_size, journal_path=os.path.join(workdir, f"journal-{label}.db"), resume=False,
+            )
+            rows.append(result_row(
+                f"risk/run_pipeline-{label}", result["employees"], "employees", time.perf_counter() - start,
+                list(task_seconds), log.calls[start_call:],
+                stage_seconds={stage: round(s, 3) for stage, s in result["timings"].items()},
+            ))
+    finally:
+        risk_pipeline.LLMScheduler = scheduler_class
+    return rows
+
+
+def bench_pdf(workdir, scale, concurrency, log):
+    _use_section("Section 2")
+    import pdf_ingest
+
+    pdf_dir, questions = workloads.make_pdf_set(4 * scale, workdir)
+    rows = []
+
+    # Every run starts from an empty index and embedding cache; the first one is queried below
+    start_call = len(log.calls)
+    latencies = []
+    for run in range(INGEST_RUNS):
+        run_dir = os.path.join(workdir, f"ingest-{run}")
+        os.makedirs(run_dir)
+        start = time.perf_counter()
+        stats = pdf_ingest.ingest_corpus(
+            [pdf_dir], os.path.join(run_dir, pdf_ingest.FAISS_INDEX_PATH), os.path.join(run_dir, "embedding_cache.db"),
+            "flat",
+        )
+        latencies.append(time.perf_counter() - start)
+    rows.append(result_row(
+        "pdf/ingest", stats["chunks"], "chunks", float(np.mean(latencies)), [], log.calls[start_call:],
+        documents=stats["documents"], runs=INGEST_RUNS,
+        mean_ms=round(float(np.mean(latencies)) * 1000, 1), max_ms=round(max(latencies) * 1000, 1),
+    ))
+    index_path = os.path.join(workdir, "ingest-0", pdf_ingest.FAISS_INDEX_PATH)
+
+    # The app script's name isn't importable, so load it from its path
+    spec = importlib.util.spec_from_file_location("se_pdf_query", os.path.join(REPO_ROOT, "Section 2", "se-pdf-query.py"))
+    app = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(app)
+    chain = app.load_retrieval_chain(index_path, pdf_ingest.index_version(index_path), (), "hybrid")
+    start_call = len(log.calls)
+    latencies, seconds, failed = timed_map(
+        lambda item: chain.invoke({"input": item["question"]}), questions, concurrency
+    )
+    rows.append(result_row(
+        "pdf/query-hybrid", len(questions), "questions", seconds, latencies, log.calls[start_call:], failed
+    ))
+    return rows
+
+
+def bench_chatbot(workdir, scale, concurrency, log):
+    _use_section("Section 5")
+    import Impersonation_chatbot as chatbot
+
+    def run_session(session):
+        state = {"conversation_history": [], "summary": "", "summarized_turns": 0}
+        latencies, failed = [], 0
+        for turn in range(CHATBOT_TURNS):
+            user_input = (
+                f"Hi, this is employee {session}. My laptop VPN keeps disconnecting (attempt {turn}) and "
+                f"I can't reach the file share. What should I do?"
+            )
+            start = time.perf_counter()
+            try:
+                reply = chatbot.generate_response(user_input, state)
+                state["conversation_history"].append({"user": user_input, "bot": reply})
+                chatbot.compact_history(state)
+            except Exception:
+                failed += 1
+            latencies.append(time.perf_counter() - start)
+        return latencies, failed
+
+    sessions = 2 * scale
+    start_call = len(log.calls)
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        outcomes = list(pool.map(run_session, range(sessions)))
+    latencies = [latency for session, _ in outcomes for latency in session]
+    return [result_row(
+        "chatbot/generate_response", len(latencies), "turns", time.perf_counter() - start, latencies,
+        log.calls[start_call:], sum(failed for _, failed in outcomes), sessions=sessions,
+    )]
+
+
+BENCHMARKS = {"phishing": bench_phishing, "risk": bench_risk, "pdf": bench_pdf, "chatbot": bench_chatbot}
+
+
+def run_worker(app, workdir, scale, concurrency, result_path):
+    """Runs one app's benchmarks in this process and writes its result rows to result_path."""
+    log = CallLog()
+    llm_gateway.logger.addHandler(log)
+    llm_gateway.logger.setLevel(logging.INFO)
+    rows = BENCHMARKS[app](workdir, scale, concurrency, log)
+    # Peak resident memory of this app's process (and of its worker processes, e.g. PDF parsing)
+    peak_kb = max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss, resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+    for row in rows:
+        row["peak_rss_mb"] = round(peak_kb / 1024, 1)
+    with open(result_path, "w", encoding="utf-8") as f:
+        json.dump(rows, f)
+
+
+def compare(results, baseline, tolerance):
+    """
+    Compares results with a baseline run.
+    Returns:
+        list: Descriptions of the regressions beyond the tolerance (a fraction, e.g. 0.2).
+    """
+    previous = {row["benchmark"]: row for row in baseline["results"]}
+    regressions = []
+    for row in results:
+        old = previous.get(row["benchmark"])
+        if old is None:
+            continue
+        # (field, True if higher is better)
+        fields = (("throughput", True), ("p99_ms", False), ("max_ms", False), ("peak_rss_mb", False))
+        for field, higher_is_better in fields:
+            new_value, old_value = row.get(field), old.get(field)
+            if not new_value or not old_value:
+                continue
+            change = new_value / old_value - 1
+            if (-change if higher_is_better else change) > tolerance:
+                regressions.append(f"{row['benchmark']}: {field} {old_value} -> {new_value} ({change:+.0%})")
+    return regressions
+
+
+def print_table(results):
+    """Prints one line per benchmark, plus one per further LLM operation it used."""
+    def cell(value, width):
+        return f"{'-' if value is None else value:>{width}}"
+
+    header = (
+        f"{'benchmark':<32} {'units':>14} {'per s':>8} {'p50 ms':>8} {'p99 ms':>8} {'RSS MB':>7} "
+        f"{'LLM op':>10} {'calls':>12} {'LLM p50':>8} {'LLM p99':>8}"
+    )
+    print(header)
+    print("-" * len(header))
+    for row in results:
+        units = f"{row['units']}" + (f" ({row['failed']} failed)" if row.get("failed") else "")
+        prefix = (
+            f"{row['benchmark']:<32} {units:>14} {cell(row['throughput'], 8)} {cell(row['p50_ms'], 8)} "
+            f"{cell(row['p99_ms'], 8)} {cell(row.get('peak_rss_mb'), 7)}"
+        )
+        for operation, stats in row["llm"].items() or [("-", None)]:
+            if stats is None:
+                print(f"{prefix} {operation:>10} {'-':>12} {'-':>8} {'-':>8}")
+            else:
+                calls = f"{stats['calls']}" + (f" ({stats['errors']} err)" if stats["errors"] else "")
+                print(f"{prefix} {operation:>10} {calls:>12} {cell(stats['p50_ms'], 8)} {cell(stats['p99_ms'], 8)}")
+            prefix = " " * len(prefix)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the apps offline against a local OpenAI stub.")
+    parser.add_argument("--apps", nargs="+", choices=APPS, default=list(APPS))
+    parser.add_argument("--scale", type=int, default=5, help="workload size multiplier")
+    parser.add_argument("--concurrency", type=int, default=8, help="concurrent requests/sessions per benchmark")
+    parser.add_argument("--latency", type=float, default=0.2, help="stub seconds to first token")
+    parser.add_argument("--tokens-per-second", type=float, default=100.0, help="stub generation speed")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of stub requests failing with 429/500")
+    parser.add_argument("--completion-tokens", type=int, default=60, help="length of stub filler replies")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", help="write the results as JSON to this file")
+    parser.add_argument("--baseline", help="earlier --out file to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed relative regression")
+    parser.add_argument("--keep", action="store_true", help="keep the scratch directory with the generated workloads")
+    parser.add_argument("--verbose", action="store_true", help="show the apps' own output")
+    parser.add_argument("--worker", choices=APPS, help=argparse.SUPPRESS)
+    parser.add_argument("--workdir", help=argparse.SUPPRESS)
+    parser.add_argument("--result", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.worker:
+        run_worker(args.worker, args.workdir, args.scale, args.concurrency, args.result)
+        return
+
+    stub = StubOpenAIServer(
+        latency=args.latency, tokens_per_second=args.tokens_per_second, error_rate=args.error_rate,
+        completion_tokens=args.completion_tokens, seed=args.seed,
+    ).start()
+    scratch = tempfile.mkdtemp(prefix="llm-bench-")
+    env = {**os.environ, "OPENAI_BASE_URL": stub.base_url, "OPENAI_API_KEY": "stub"}
+    output = None if args.verbose else subprocess.DEVNULL
+    results = []
+    failed = []
+    try:
+        for app in args.apps:
+            workdir = os.path.join(scratch, app)
+            os.makedirs(workdir)
+            result_path = os.path.join(scratch, f"{app}.json")
+            print(f"Running {app} ...", file=sys.stderr)
+            process = subprocess.run(
+                [sys.executable, os.path.abspath(__file__), "--worker", app, "--workdir", workdir,
+                 "--scale", str(args.scale), "--concurrency", str(args.concurrency), "--result", result_path],
+                cwd=workdir, env=env, stdout=output, stderr=output,
+            )
+            if process.returncode:
+                failed.append(app)
+                print(f"{app} benchmark failed (exit status {process.returncode}); rerun with --verbose", file=sys.stderr)
+                continue
+            with open(result_path, encoding="utf-8") as f:
+                results.extend(json.load(f))
+    finally:
+        stub.stop()
+        if args.keep:
+            print(f"Workloads kept in {scratch}", file=sys.stderr)
+        else:
+            shutil.rmtree(scratch, ignore_errors=True)
+
+    print_table(results)
+    print(f"Stub: {stub.stats['requests']} requests, {stub.stats['errors']} injected errors", file=sys.stderr)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump({"config": {k: v for k, v in vars(args).items() if k not in ("worker", "workdir", "result")},
+                       "results": results}, f, indent=2)
+    regressions = []
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if not regressions:
+            print(f"No regressions beyond {args.tolerance:.0%} against {args.baseline}")
+    if failed or regressions:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,288 @@
+"""
+OpenAI-Compatible Stub Server
+-----------------------------
+A local stand-in for the OpenAI API, so the apps can be benchmarked and regression-tested
+offline without paying for API calls. It serves the endpoints the apps use:
+
+- POST /v1/chat/completions  (plain, streamed, and json_schema structured outputs)
+- POST /v1/completions       (plain and streamed)
+- POST /v1/embeddings        (deterministic hashed bag-of-words vectors)
+
+Replies are generated, not meaningful: filler text of a fixed length, or JSON shaped like what
+the risk-reporting prompts ask for. Latency is simulated as a time to first token plus a
+token rate, and a fraction of requests can fail with 429 or 500 to exercise retries.
+
+Embeddings are unit vectors built by hashing each word into one of `embedding_dim` buckets, so
+texts that share words get similar vectors and retrieval still behaves sensibly.
+
+Usage:
+    python stub_server.py --port 8000 --latency 0.3 --tokens-per-second 50 --error-rate 0.05
+    OPENAI_BASE_URL=http://127.0.0.1:8000/v1 OPENAI_API_KEY=stub streamlit run ...
+"""
+
+import argparse
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+WORD_PATTERN = re.compile(r"[a-z0-9]+")
+RECORD_PATTERN = re.compile(r"^Record (\d+):", re.MULTILINE)
+EMPLOYEE_ID_PATTERN = re.compile(r'"Employee_ID": (\S+)')
+FILLER_WORDS = (
+    "review", "the", "request", "carefully", "verify", "sender", "identity", "before", "sharing",
+    "credentials", "report", "suspicious", "links", "to", "security", "team", "and", "enable",
+    "multi-factor", "authentication", "on", "every", "account",
+)
+# Dimension of text-embedding-ada-002, which the apps index with
+DEFAULT_EMBEDDING_DIM = 1536
+
+
+def count_tokens(text):
+    """Rough token count (about four characters per token), as reported in the usage."""
+    return len(text) // 4 + 1
+
+
+def embed(text, dim=DEFAULT_EMBEDDING_DIM):
+    """Deterministic unit vector of a text: each word adds +-1 to a hashed bucket."""
+    vector = np.zeros(dim, dtype=np.float32)
+    for word in WORD_PATTERN.findall(str(text).lower()):
+        digest = hashlib.blake2b(word.encode("utf-8"), digest_size=8).digest()
+        bucket = int.from_bytes(digest[:4], "little") % dim
+        vector[bucket] += 1.0 if digest[4] & 1 else -1.0
+    norm = np.linalg.norm(vector)
+    if not norm:
+        vector[0] = norm = 1.0
+    return (vector / norm).tolist()
+
+
+def filler(tokens):
+    """Filler reply of about `tokens` tokens."""
+    return " ".join(FILLER_WORDS[i % len(FILLER_WORDS)] for i in range(tokens)).capitalize() + "."
+
+
+def from_schema(schema, prompt, tokens, index=1):
+    """
+    Builds a value that satisfies a JSON schema. Arrays get one item per "Record N:" entry of
+    the prompt (the batched risk-analysis format), and "Record" fields get the record number.
+    """
+    kind = schema.get("type")
+    if kind == "object":
+        return {
+            name: index if name == "Record" else from_schema(prop, prompt, tokens, index)
+            for name, prop in schema.get("properties", {}).items()
+        }
+    if kind == "array":
+        numbers = [int(n) for n in RECORD_PATTERN.findall(prompt)] or [1]
+        return [from_schema(schema.get("items", {}), prompt, tokens, n) for n in numbers]
+    if "enum" in schema:
+        return schema["enum"][0]
+    if kind in ("integer", "number"):
+        return index
+    if kind == "boolean":
+        return False
+    return filler(max(1, tokens // 4))
+
+
+def reply_text(body, tokens):
+    """The text of a completion reply."""
+    if "messages" in body:
+        prompt = "\n".join(str(message.get("content", "")) for message in body["messages"])
+    else:
+        prompt = str(body.get("prompt", ""))
+    response_format = body.get("response_format") or {}
+    if response_format.get("type") == "json_schema":
+        return json.dumps(from_schema(response_format["json_schema"]["schema"], prompt, tokens))
+    # The per-employee risk-reporting prompts parse the reply as JSON
+    if '"Training Needs"' in prompt:
+        match = EMPLOYEE_ID_PATTERN.search(prompt)
+        return json.dumps({"Employee_ID": match.group(1) if match else "", "Training Needs": filler(tokens)})
+    if '"Security Gaps"' in prompt:
+        return json.dumps({
+            "Security Gaps": filler(tokens // 4), "Controls Needed": filler(tokens // 4),
+            "Criticality": "M", "Steps Needed": filler(tokens // 4),
+        })
+    return filler(tokens)
+
+
+class StubOpenAIServer:
+    """
+    The stub server, run on a background thread.
+    Args:
+        host, port: Address to listen on; port 0 picks a free port.
+        latency (float): Seconds before the first token (or the whole non-streamed reply).
+        tokens_per_second (float): Generation speed after the first token; 0 for instant.
+        error_rate (float): Fraction of requests answered with a 429 or 500 error.
+        completion_tokens (int): Length of the filler replies.
+        embedding_dim (int): Dimension of the embeddings.
+        seed (int): Seed of the error injection.
+    """
+
+    def __init__(self, host="127.0.0.1", port=0, latency=0.2, tokens_per_second=100.0, error_rate=0.0,
+                 completion_tokens=60, embedding_dim=DEFAULT_EMBEDDING_DIM, seed=0):
+        self.latency = latency
+        self.tokens_per_second = tokens_per_second
+        self.error_rate = error_rate
+        self.completion_tokens = completion_tokens
+        self.embedding_dim = embedding_dim
+        self.stats = {"requests": 0, "errors": 0}
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), self._handler())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, name="openai-stub", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def _next_error(self):
+        with self._lock:
+            self.stats["requests"] += 1
+            if self._random.random() >= self.error_rate:
+                return None
+            self.stats["errors"] += 1
+            return self._random.choice((429, 500))
+
+    def _token_delay(self):
+        return 1.0 / self.tokens_per_second if self.tokens_per_second else 0.0
+
+    def _handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            # Small streamed chunks must not wait for delayed ACKs
+            disable_nagle_algorithm = True
+
+            def log_message(self, format, *args):
+                pass
+
+            def _send_json(self, status, payload, headers=()):
+                data = json.dumps(payload).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                for name, value in headers:
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(data)
+
+            def _send_event(self, payload):
+                data = f"data: {payload if isinstance(payload, str) else json.dumps(payload)}\n\n".encode("utf-8")
+                self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+                self.wfile.flush()
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+                error = stub._next_error()
+                if error:
+                    message = "Rate limit reached (stub)" if error == 429 else "Internal server error (stub)"
+                    self._send_json(error, {"error": {"message": message, "type": "stub_error"}}, [("retry-after", "0")])
+                    return
+                if self.path.endswith("/embeddings"):
+                    self._embeddings(body)
+                elif self.path.endswith("/chat/completions"):
+                    self._completion(body, chat=True)
+                elif self.path.endswith("/completions"):
+                    self._completion(body, chat=False)
+                else:
+                    self._send_json(404, {"error": {"message": f"Unknown endpoint {self.path}", "type": "invalid_request_error"}})
+
+            def _embeddings(self, body):
+                inputs = body.get("input", [])
+                inputs = inputs if isinstance(inputs, list) else [inputs]
+                data = [
+                    {"object": "embedding", "index": i, "embedding": embed(text, stub.embedding_dim)}
+                    for i, text in enumerate(inputs)
+                ]
+                tokens = sum(count_tokens(str(text)) for text in inputs)
+                time.sleep(stub.latency)
+                self._send_json(200, {
+                    "object": "list", "data": data, "model": body.get("model"),
+                    "usage": {"prompt_tokens": tokens, "total_tokens": tokens},
+                })
+
+            def _completion(self, body, chat):
+                text = reply_text(body, stub.completion_tokens)
+                pieces = re.findall(r"\S+\s*", text) or [text]
+                prompt = json.dumps(body.get("messages", body.get("prompt", "")))
+                usage = {
+                    "prompt_tokens": count_tokens(prompt),
+                    "completion_tokens": len(pieces),
+                    "total_tokens": count_tokens(prompt) + len(pieces),
+                }
+                base = {
+                    "id": "stub", "created": int(time.time()), "model": body.get("model"),
+                    "object": "chat.completion.chunk" if chat else "text_completion",
+                }
+                time.sleep(stub.latency)
+                if not body.get("stream"):
+                    time.sleep(len(pieces) * stub._token_delay())
+                    if chat:
+                        choice = {"index": 0, "message": {"role": "assistant", "content": text}, "finish_reason": "stop"}
+                    else:
+                        choice = {"index": 0, "text": text, "finish_reason": "stop", "logprobs": None}
+                    self._send_json(200, {**base, "object": "chat.completion" if chat else "text_completion",
+                                          "choices": [choice], "usage": usage})
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+                for i, piece in enumerate(pieces):
+                    if i:
+                        time.sleep(stub._token_delay())
+                    if chat:
+                        choice = {"index": 0, "delta": {"content": piece}, "finish_reason": None}
+                    else:
+                        choice = {"index": 0, "text": piece, "finish_reason": None, "logprobs": None}
+                    self._send_event({**base, "choices": [choice]})
+                if (body.get("stream_options") or {}).get("include_usage"):
+                    self._send_event({**base, "choices": [], "usage": usage})
+                self._send_event("[DONE]")
+                self.wfile.write(b"0\r\n\r\n")
+
+        return Handler
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve a local OpenAI-compatible stub API.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--latency", type=float, default=0.2, help="seconds to first token")
+    parser.add_argument("--tokens-per-second", type=float, default=100.0, help="generation speed; 0 for instant")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of requests failing with 429/500")
+    parser.add_argument("--completion-tokens", type=int, default=60, help="length of filler replies")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    server = StubOpenAIServer(
+        args.host, args.port, args.latency, args.tokens_per_second, args.error_rate,
+        args.completion_tokens, seed=args.seed,
+    ).start()
+    print(f"OpenAI stub listening on {server.base_url} (set OPENAI_BASE_URL to this)")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,180 @@
+"""
+Synthetic Benchmark Workloads
+-----------------------------
+Deterministic (seeded) inputs for run_benchmarks.py, sized by a scale factor:
+
+- scaled-up copies of the Section 9 QPR_Inc_*_Sample.xlsx workbooks
+- an mbox of phishing and legitimate emails for Section 10
+- a set of policy PDFs for Section 2, with a question set in retrieval_eval.py's format
+"""
+
+import json
+import mailbox
+import os
+import random
+from email.message import EmailMessage
+
+import pandas as pd
+
+REPO_ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir)
+QPR_SAMPLES = {
+    "incident_history": "QPR_Inc_Incident_History_Sample.xlsx",
+    "mock_tests": "QPR_Inc_Mock_Tests_Sample.xlsx",
+    "user_behavior": "QPR_Inc_User_Behavior_Sample.xlsx",
+}
+# Per-record columns that get unique IDs in every copy
+RECORD_ID_COLUMNS = ("Incident_ID", "Test_ID")
+# Integer behavior columns that are jittered so the copies aren't identical profiles
+JITTERED_COLUMNS = ("Login_Attempts", "Files_Accessed", "Suspicious_Access_Flags", "Device_Sharing_Instances",
+                    "Phishing_Email_Clicks", "Resolution_Time_Days", "Score_Percentage")
+
+TOPICS = ("password rotation", "phishing reporting", "device encryption", "remote access", "incident response",
+          "data classification", "vendor access", "badge access", "software updates", "backup retention")
+BRANDS = ("Microsoft 365", "DocuSign", "PayPal", "Okta", "Dropbox")
+NAMES = ("Alex Morgan", "Sam Patel", "Jordan Lee", "Taylor Chen", "Casey Brown", "Riley Garcia")
+
+
+def make_qpr_workbooks(scale, out_dir, seed=0):
+    """
+    Writes the three risk-reporting workbooks, each `scale` copies of the sample data with
+    distinct Employee_IDs (and record IDs) and jittered behavior values.
+    Returns:
+        dict: Workbook path by risk_pipeline argument name (incident_history, ...).
+    """
+    rng = random.Random(seed)
+    sample_dir = os.path.join(REPO_ROOT, "Section 9")
+    os.makedirs(out_dir, exist_ok=True)
+    paths = {}
+    for name, file_name in QPR_SAMPLES.items():
+        sample = pd.read_excel(os.path.join(sample_dir, file_name))
+        copies = []
+        for copy in range(scale):
+            frame = sample.copy()
+            frame["Employee_ID"] = [f"EMP{int(value[3:]) + 1000 * copy:05d}" for value in frame["Employee_ID"]]
+            for column in RECORD_ID_COLUMNS:
+                if column in frame:
+                    frame[column] = [f"{value}-{copy}" for value in frame[column]]
+            if copy:
+                for column in JITTERED_COLUMNS:
+                    if column in frame:
+                        frame[column] = [max(0, int(value) + rng.randint(-1, 2)) for value in frame[column]]
+            copies.append(frame)
+        paths[name] = os.path.join(out_dir, file_name.replace("_Sample", f"_x{scale}"))
+        pd.concat(copies, ignore_index=True).to_excel(paths[name], index=False)
+    return paths
+
+
+def _phishing_email(rng):
+    brand = rng.choice(BRANDS)
+    host = rng.choice(("secure-login", "account-verify", "auth-update")) + f"-{rng.randint(100, 999)}.com"
+    body = (
+        f"Dear user,\n\nWe detected unusual sign-in activity on your {brand} account. "
+        f"Verify your account immediately or it will be suspended within 24 hours.\n\n"
+        f"Click here: https://{host}/{brand.split()[0].lower()}/login\n\n{brand} Security Team"
+    )
+    return f"{brand} Security <no-reply@{host}>", f"Action required: verify your {brand} account", body
+
+
+def _legitimate_email(rng):
+    sender, topic = rng.choice(NAMES), rng.choice(TOPICS)
+    body = (
+        f"Hi team,\n\nThe notes from Thursday's review of our {topic} process are on the intranet. "
+        f"Please add comments before the next meeting.\n\nThanks,\n{sender}"
+    )
+    return f"{sender} <{sender.split()[0].lower()}@qpr-inc.example>", f"Notes: {topic} review", body
+
+
+def make_email_corpus(count, path, phishing_ratio=0.3, seed=0):
+    """
+    Writes an mbox of `count` synthetic emails.
+    Returns:
+        list: (body, is_phishing) pairs in mbox order.
+    """
+    rng = random.Random(seed)
+    box = mailbox.mbox(path)
+    box.lock()
+    emails = []
+    try:
+        for _ in range(count):
+            is_phishing = rng.random() < phishing_ratio
+            sender, subject, body = _phishing_email(rng) if is_phishing else _legitimate_email(rng)
+            message = EmailMessage()
+            message["From"] = sender
+            message["To"] = "reports@qpr-inc.example"
+            message["Subject"] = subject
+            message.set_content(body)
+            box.add(message)
+            emails.append((body, is_phishing))
+        box.flush()
+    finally:
+        box.unlock()
+        box.close()
+    return emails
+
+
+def write_pdf(path, pages):
+    """Writes a minimal text-only PDF; pages is a list of lists of text lines."""
+    objects = []
+
+    def add(content):
+        objects.append(content)
+        return len(objects)
+
+    font = add(b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>")
+    pages_id = font + 2 * len(pages) + 1
+    kids = []
+    for lines in pages:
+        operators = ["BT /F1 10 Tf 14 TL 50 780 Td"]
+        for line in lines:
+            escaped = line.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+            operators.append(f"({escaped}) Tj T*")
+        operators.append("ET")
+        stream = "\n".join(operators).encode("latin-1")
+        contents = add(b"<< /Length %d >>\nstream\n" % len(stream) + stream + b"\nendstream")
+        kids.append(add(
+            b"<< /Type /Page /Parent %d 0 R /MediaBox [0 0 612 792] /Contents %d 0 R "
+            b"/Resources << /Font << /F1 %d 0 R >> >> >>" % (pages_id, contents, font)
+        ))
+    add(b"<< /Type /Pages /Kids [" + b" ".join(b"%d 0 R" % kid for kid in kids) + b"] /Count %d >>" % len(kids))
+    catalog = add(b"<< /Type /Catalog /Pages %d 0 R >>" % pages_id)
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, content in enumerate(objects, 1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n" % number + content + b"\nendobj\n"
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    out += b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+    out += b"trailer\n<< /Size %d /Root %d 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, catalog, xref)
+    with open(path, "wb") as f:
+        f.write(out)
+
+
+def make_pdf_set(count, out_dir, pages=5, seed=0):
+    """
+    Writes `count` policy PDFs of `pages` pages. Every page states one numbered rule, and the
+    returned question set asks about each rule (written to questions.jsonl in out_dir too).
+    Returns:
+        tuple: (directory of the PDFs, list of {"question", "relevant"} dicts).
+    """
+    rng = random.Random(seed)
+    pdf_dir = os.path.join(out_dir, "pdfs")
+    os.makedirs(pdf_dir, exist_ok=True)
+    questions = []
+    for doc in range(count):
+        name = f"policy-{doc:04d}.pdf"
+        document_pages = []
+        for page in range(1, pages + 1):
+            topic = rng.choice(TOPICS)
+            rule = f"Rule {doc}-{page}"
+            lines = [f"{rule}: {topic} requirements for QPR Inc staff."]
+            for _ in range(40):
+                words = rng.sample(TOPICS, 3)
+                lines.append(f"Staff must follow the {words[0]} standard when handling {words[1]} and {words[2]}.")
+            document_pages.append(lines)
+            questions.append({"question": f"What does {rule} require for {topic}?", "relevant": [f"{name}#{page}"]})
+        write_pdf(os.path.join(pdf_dir, name), document_pages)
+    with open(os.path.join(out_dir, "questions.jsonl"), "w", encoding="utf-8") as f:
+        for question in questions:
+            f.write(json.dumps(question) + "\n")
+    return pdf_dir, questions
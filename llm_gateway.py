@@ -0,0 +1,508 @@
+"""
+Shared LLM Gateway
+------------------
+One instrumented OpenAI client for every app in this repository. The phishing detector
+(Section 10), the Facebook analyzer (Section 6) and the risk-reporting pipeline (Section 9) call
+chat_completion() / completion() instead of the module-level openai client; the PDF Q&A app
+(Section 2) and the training chatbot (Section 5) get their LangChain models from chat_model()
+and GatewayEmbeddings.
+
+All of them share:
+
+- one pooled HTTP connection (a single httpx client with keep-alive connections)
+- one timeout and retry policy: the OpenAI SDK's exponential backoff with jitter, honoring
+  Retry-After, on rate-limit, timeout, connection and 5xx errors (LLM_MAX_RETRIES, LLM_TIMEOUT);
+  callers that run their own retry loop (batch_scan.py, LLMScheduler) pass max_retries=0, so
+  retries are never nested
+- per-call metrics: latency, time to first token (streams), prompt/completion tokens and
+  estimated cost, by app, operation and model
+
+Metrics are exported as Prometheus text and/or JSON log lines, configured by environment:
+
+    LLM_METRICS_LOG=llm_calls.jsonl   append one JSON line per call
+    LLM_METRICS_PORT=9464             serve /metrics (Prometheus) and /metrics.json
+    LLM_METRICS_FILE=llm.prom         write Prometheus text at exit (node_exporter textfile collector)
+
+Each app section has a gateway_path.py that puts the repository root on sys.path; the apps
+import it before importing this module.
+"""
+
+import atexit
+import json
+import logging
+import os
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import httpx
+import openai
+
+try:
+    from langchain_core.callbacks import BaseCallbackHandler
+    from langchain_core.embeddings import Embeddings
+except ImportError:  # Only the LangChain apps (Sections 2 and 5) need these
+    BaseCallbackHandler = Embeddings = object
+
+MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "2"))
+TIMEOUT = float(os.getenv("LLM_TIMEOUT", "60"))
+MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", "64"))
+MAX_KEEPALIVE_CONNECTIONS = 32
+DEFAULT_EMBEDDING_MODEL = "text-embedding-ada-002"
+
+# Errors worth retrying: rate limits, timeouts, dropped connections and 5xx responses
+RETRYABLE_ERRORS = (
+    openai.RateLimitError,
+    openai.APITimeoutError,
+    openai.APIConnectionError,
+    openai.InternalServerError,
+)
+
+# Estimated USD per million (prompt, completion) tokens, matched by longest model-name prefix
+PRICES = {
+    "gpt-4o": (2.50, 10.00),
+    "gpt-4o-mini": (0.15, 0.60),
+    "gpt-4": (30.00, 60.00),
+    "gpt-3.5-turbo": (0.50, 1.50),
+    "gpt-3.5-turbo-instruct": (1.50, 2.00),
+    "text-embedding-ada-002": (0.10, 0.0),
+    "text-embedding-3-small": (0.02, 0.0),
+    "text-embedding-3-large": (0.13, 0.0),
+}
+
+# Histogram buckets in seconds, for both latency and time to first token
+LATENCY_BUCKETS = (0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+logger = logging.getLogger("llm_gateway")
+
+
+def retry_delay(error, attempt, base_delay=1.0):
+    """
+    Works out how long to wait before retrying a failed call. A Retry-After header sent
+    with a 429 response is honored; otherwise exponential backoff with full jitter is used.
+    """
+    response = getattr(error, "response", None)
+    if response is not None:
+        try:
+            return float(response.headers.get("retry-after"))
+        except (TypeError, ValueError):
+            pass
+    return random.uniform(0, base_delay * (2 ** attempt))
+
+
+def estimate_cost(model, prompt_tokens, completion_tokens):
+    """Returns the estimated USD cost of a call, or 0.0 for models without a known price."""
+    name = max((name for name in PRICES if model and model.startswith(name)), key=len, default=None)
+    if name is None:
+        return 0.0
+    prompt_price, completion_price = PRICES[name]
+    return (prompt_tokens * prompt_price + completion_tokens * completion_price) / 1_000_000
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(**labels):
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in labels.items()) + "}"
+
+
+class _Histogram:
+    def __init__(self):
+        self.buckets = [0] * len(LATENCY_BUCKETS)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.count += 1
+        self.sum += value
+        for i, bound in enumerate(LATENCY_BUCKETS):
+            if value <= bound:
+                self.buckets[i] += 1
+
+    def lines(self, name, labels):
+        for bound, count in zip(LATENCY_BUCKETS, self.buckets):
+            yield f"{name}_bucket{_labels(**labels, le=bound)} {count}"
+        yield f"{name}_bucket{_labels(**labels, le='+Inf')} {self.count}"
+        yield f"{name}_sum{_labels(**labels)} {self.sum}"
+        yield f"{name}_count{_labels(**labels)} {self.count}"
+
+
+class Metrics:
+    """Thread-safe per-(app, operation, model) call metrics."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self._calls = {}
+            self._http = {}
+
+    def record(self, app, operation, model, latency, ttft=None, prompt_tokens=0, completion_tokens=0, error=None):
+        """Records one finished (or failed) call and logs it as a JSON line (at INFO level)."""
+        cost = estimate_cost(model, prompt_tokens, completion_tokens)
+        with self._lock:
+            stats = self._calls.get((app, operation, model))
+            if stats is None:
+                stats = self._calls[(app, operation, model)] = {
+                    "requests": 0, "errors": 0, "prompt_tokens": 0, "completion_tokens": 0, "cost": 0.0,
+                    "latency": _Histogram(), "ttft": _Histogram(),
+                }
+            stats["requests"] += 1
+            stats["errors"] += error is not None
+            stats["prompt_tokens"] += prompt_tokens
+            stats["completion_tokens"] += completion_tokens
+            stats["cost"] += cost
+            stats["latency"].observe(latency)
+            if ttft is not None:
+                stats["ttft"].observe(ttft)
+        if logger.isEnabledFor(logging.INFO):
+            logger.info(json.dumps({
+                "ts": time.time(), "app": app, "operation": operation, "model": model,
+                "status": "error" if error else "ok", "error": error,
+                "latency_s": round(latency, 4), "ttft_s": None if ttft is None else round(ttft, 4),
+                "prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens, "cost_usd": round(cost, 6),
+            }))
+
+    def record_http(self, status_code):
+        """Counts an HTTP response; retried attempts show up as 429/5xx responses."""
+        with self._lock:
+            self._http[status_code] = self._http.get(status_code, 0) + 1
+
+    def snapshot(self):
+        """Returns the metrics as a JSON-serializable dict."""
+        with self._lock:
+            calls = [
+                {
+                    "app": app, "operation": operation, "model": model,
+                    "requests": stats["requests"], "errors": stats["errors"],
+                    "prompt_tokens": stats["prompt_tokens"], "completion_tokens": stats["completion_tokens"],
+                    "cost_usd": stats["cost"],
+                    "latency_s_sum": stats["latency"].sum,
+                    "ttft_s_sum": stats["ttft"].sum, "ttft_count": stats["ttft"].count,
+                }
+                for (app, operation, model), stats in self._calls.items()
+            ]
+            return {"calls": calls, "http_responses": {str(code): count for code, count in self._http.items()}}
+
+    def summary(self):
+        """One-line summary of all calls so far, for CLI output."""
+        calls = self.snapshot()["calls"]
+        requests = sum(c["requests"] for c in calls)
+        latency = sum(c["latency_s_sum"] for c in calls)
+        return (
+            f"{requests} LLM calls, {sum(c['errors'] for c in calls)} failed, "
+            f"{sum(c['prompt_tokens'] for c in calls)} prompt + {sum(c['completion_tokens'] for c in calls)} completion tokens, "
+            f"~${sum(c['cost_usd'] for c in calls):.4f}, mean latency {latency / requests if requests else 0:.2f}s"
+        )
+
+    def prometheus_text(self):
+        """Returns the metrics in the Prometheus text exposition format."""
+        lines = []
+        with self._lock:
+            calls = sorted(self._calls.items(), key=lambda item: tuple(map(str, item[0])))
+            counters = (
+                ("llm_requests_total", "LLM calls", "requests"),
+                ("llm_request_errors_total", "Failed LLM calls", "errors"),
+                ("llm_cost_usd_total", "Estimated LLM cost in USD", "cost"),
+            )
+            for name, help_text, field in counters:
+                lines += [f"# HELP {name} {help_text}", f"# TYPE {name} counter"]
+                for (app, operation, model), stats in calls:
+                    lines.append(f"{name}{_labels(app=app, operation=operation, model=model)} {stats[field]}")
+            lines += ["# HELP llm_tokens_total Tokens used by LLM calls", "# TYPE llm_tokens_total counter"]
+            for (app, operation, model), stats in calls:
+                for kind in ("prompt", "completion"):
+                    labels = _labels(app=app, operation=operation, model=model, kind=kind)
+                    lines.append(f"llm_tokens_total{labels} {stats[kind + '_tokens']}")
+            histograms = (
+                ("llm_request_duration_seconds", "LLM call latency", "latency"),
+                ("llm_time_to_first_token_seconds", "Time to first token of streamed LLM calls", "ttft"),
+            )
+            for name, help_text, field in histograms:
+                lines += [f"# HELP {name} {help_text}", f"# TYPE {name} histogram"]
+                for (app, operation, model), stats in calls:
+                    lines.extend(stats[field].lines(name, {"app": app, "operation": operation, "model": model}))
+            lines += ["# HELP llm_http_responses_total HTTP responses from the API, including retried attempts",
+                      "# TYPE llm_http_responses_total counter"]
+            for code, count in sorted(self._http.items()):
+                lines.append(f"llm_http_responses_total{_labels(code=code)} {count}")
+        return "\n".join(lines) + "\n"
+
+
+metrics = Metrics()
+
+_lock = threading.Lock()
+_http_client = None
+_clients = {}
+_server = None
+
+
+def _count_response(response):
+    metrics.record_http(response.status_code)
+
+
+def get_http_client():
+    """Returns the process-wide pooled HTTP client, creating it (and the exporters) on first use."""
+    global _http_client
+    with _lock:
+        created = _http_client is None
+        if created:
+            _http_client = openai.DefaultHttpxClient(
+                limits=httpx.Limits(max_connections=MAX_CONNECTIONS, max_keepalive_connections=MAX_KEEPALIVE_CONNECTIONS),
+                timeout=TIMEOUT,
+                event_hooks={"response": [_count_response]},
+            )
+    if created:
+        _start_exporters()
+    return _http_client
+
+
+def _credentials():
+    # Scripts that set openai.api_key / openai.base_url keep working; otherwise the SDK reads
+    # OPENAI_API_KEY and OPENAI_BASE_URL from the environment
+    return {
+        name: value for name, value in (("api_key", openai.api_key), ("base_url", openai.base_url)) if value
+    }
+
+
+def get_client(max_retries=None):
+    """
+    Returns the shared openai.OpenAI client (one per API key and retry count), using the pooled
+    HTTP client.
+    Args:
+        max_retries (int): SDK retries per call; None for LLM_MAX_RETRIES.
+    """
+    max_retries = MAX_RETRIES if max_retries is None else max_retries
+    credentials = _credentials()
+    key = (max_retries, *sorted(map(str, credentials.items())))
+    with _lock:
+        client = _clients.get(key)
+    if client is None:
+        client = openai.OpenAI(http_client=get_http_client(), max_retries=max_retries, timeout=TIMEOUT, **credentials)
+        with _lock:
+            client = _clients.setdefault(key, client)
+    return client
+
+
+def _has_content(chunk):
+    choice = chunk.choices[0]
+    delta = getattr(choice, "delta", None)
+    return bool(getattr(choice, "text", None) or (delta is not None and delta.content))
+
+
+def _instrumented_stream(app, operation, model, stream, start):
+    first_token = None
+    usage = None
+    error = None
+    try:
+        for chunk in stream:
+            if getattr(chunk, "usage", None):
+                usage = chunk.usage
+            # The final chunk requested with include_usage has no choices, only the usage
+            if not chunk.choices:
+                continue
+            if first_token is None and _has_content(chunk):
+                first_token = time.perf_counter() - start
+            yield chunk
+    except Exception as e:
+        error = type(e).__name__
+        raise
+    finally:
+        # Also releases the connection if the caller stopped reading early
+        stream.close()
+        metrics.record(
+            app, operation, model, time.perf_counter() - start, ttft=first_token,
+            prompt_tokens=getattr(usage, "prompt_tokens", 0) or 0,
+            completion_tokens=getattr(usage, "completion_tokens", 0) or 0, error=error,
+        )
+
+
+def _create(app, operation, create, kwargs):
+    model = kwargs.get("model")
+    stream = kwargs.get("stream", False)
+    if stream:
+        kwargs = {**kwargs, "stream_options": {**kwargs.get("stream_options", {}), "include_usage": True}}
+    start = time.perf_counter()
+    try:
+        response = create(**kwargs)
+    except Exception as e:
+        metrics.record(app, operation, model, time.perf_counter() - start, error=type(e).__name__)
+        raise
+    if stream:
+        return _instrumented_stream(app, operation, model, response, start)
+    usage = getattr(response, "usage", None)
+    metrics.record(
+        app, operation, model, time.perf_counter() - start,
+        prompt_tokens=getattr(usage, "prompt_tokens", 0) or 0,
+        completion_tokens=getattr(usage, "completion_tokens", 0) or 0,
+    )
+    return response
+
+
+def chat_completion(app, max_retries=None, **kwargs):
+    """
+    openai chat.completions.create() through the gateway.
+    Args:
+        app (str): App name the metrics are labelled with.
+        max_retries (int): SDK retries; None for LLM_MAX_RETRIES, 0 when the caller retries itself.
+        **kwargs: Arguments of chat.completions.create(). With stream=True the chunks are
+            returned as a generator (the usage-only final chunk is consumed by the gateway).
+    """
+    return _create(app, "chat", get_client(max_retries).chat.completions.create, kwargs)
+
+
+def completion(app, max_retries=None, **kwargs):
+    """openai completions.create() (legacy completions) through the gateway; see chat_completion()."""
+    return _create(app, "completion", get_client(max_retries).completions.create, kwargs)
+
+
+def embedding(app, max_retries=None, **kwargs):
+    """openai embeddings.create() through the gateway; see chat_completion()."""
+    return _create(app, "embedding", get_client(max_retries).embeddings.create, kwargs)
+
+
+class MetricsCallbackHandler(BaseCallbackHandler):
+    """LangChain callback handler that records chat model calls in the gateway metrics."""
+
+    def __init__(self, app):
+        self.app = app
+        self._runs = {}
+        self._lock = threading.Lock()
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, invocation_params=None, **kwargs):
+        params = invocation_params or {}
+        with self._lock:
+            self._runs[run_id] = [time.perf_counter(), None, params.get("model") or params.get("model_name")]
+
+    def on_llm_new_token(self, token, *, run_id, **kwargs):
+        with self._lock:
+            run = self._runs.get(run_id)
+            if run is not None and run[1] is None and token:
+                run[1] = time.perf_counter() - run[0]
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        with self._lock:
+            run = self._runs.pop(run_id, None)
+        if run is None:
+            return
+        start, first_token, model = run
+        prompt_tokens = completion_tokens = 0
+        message = getattr(response.generations[0][0], "message", None) if response.generations and response.generations[0] else None
+        usage = getattr(message, "usage_metadata", None)
+        if usage:
+            prompt_tokens, completion_tokens = usage.get("input_tokens", 0), usage.get("output_tokens", 0)
+        elif response.llm_output and response.llm_output.get("token_usage"):
+            token_usage = response.llm_output["token_usage"]
+            prompt_tokens, completion_tokens = token_usage.get("prompt_tokens", 0), token_usage.get("completion_tokens", 0)
+        metrics.record(
+            self.app, "chat", model, time.perf_counter() - start, ttft=first_token,
+            prompt_tokens=prompt_tokens, completion_tokens=completion_tokens,
+        )
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        with self._lock:
+            run = self._runs.pop(run_id, None)
+        if run is not None:
+            metrics.record(self.app, "chat", run[2], time.perf_counter() - run[0], error=type(error).__name__)
+
+
+def chat_model(app, **kwargs):
+    """
+    Returns a LangChain ChatOpenAI that uses the pooled HTTP client, the gateway's timeout and
+    retry policy, and records its calls in the gateway metrics.
+    Args:
+        app (str): App name the metrics are labelled with.
+        **kwargs: Further ChatOpenAI arguments (model, temperature, max_tokens, ...).
+    """
+    from langchain_openai import ChatOpenAI
+
+    return ChatOpenAI(
+        http_client=get_http_client(), max_retries=MAX_RETRIES, timeout=TIMEOUT, stream_usage=True,
+        callbacks=[MetricsCallbackHandler(app)], **_credentials(), **kwargs,
+    )
+
+
+class GatewayEmbeddings(Embeddings):
+    """
+    LangChain embeddings that call the OpenAI embeddings API through the gateway, in batches
+    of at most `batch_size` texts.
+    Args:
+        app (str): App name the metrics are labelled with.
+        model (str): Embedding model; the same default as OpenAIEmbeddings, so existing
+            indexes and embedding caches stay valid.
+    """
+
+    def __init__(self, app, model=DEFAULT_EMBEDDING_MODEL, batch_size=512):
+        self.app = app
+        self.model = model
+        self.batch_size = batch_size
+
+    def embed_documents(self, texts):
+        vectors = []
+        for i in range(0, len(texts), self.batch_size):
+            response = embedding(self.app, model=self.model, input=list(texts[i:i + self.batch_size]))
+            vectors.extend(item.embedding for item in sorted(response.data, key=lambda item: item.index))
+        return vectors
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path == "/metrics":
+            body, content_type = metrics.prometheus_text(), "text/plain; version=0.0.4"
+        elif self.path == "/metrics.json":
+            body, content_type = json.dumps(metrics.snapshot()), "application/json"
+        else:
+            self.send_error(404)
+            return
+        body = body.encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_metrics_server(port, host="127.0.0.1"):
+    """Serves /metrics (Prometheus text) and /metrics.json from a background thread, once per process."""
+    global _server
+    with _lock:
+        if _server is None:
+            _server = ThreadingHTTPServer((host, port), _MetricsHandler)
+            threading.Thread(target=_server.serve_forever, name="llm-metrics", daemon=True).start()
+    return _server
+
+
+def write_metrics(path):
+    """Writes the Prometheus text to a file, atomically (for node_exporter's textfile collector)."""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(metrics.prometheus_text())
+    os.replace(tmp_path, path)
+
+
+def _start_exporters():
+    log_path = os.getenv("LLM_METRICS_LOG")
+    if log_path:
+        handler = logging.FileHandler(log_path, encoding="utf-8")
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        logger.addHandler(handler)
+        logger.setLevel(logging.INFO)
+    port = os.getenv("LLM_METRICS_PORT")
+    if port:
+        try:
+            start_metrics_server(int(port))
+        except OSError as e:
+            logger.warning(f"LLM metrics server not started on port {port}: {e}")
+    metrics_file = os.getenv("LLM_METRICS_FILE")
+    if metrics_file:
+        atexit.register(write_metrics, metrics_file)